@@ -0,0 +1,44 @@
+-- SQL commands to coordinate sharded batch workers
+-- Run these commands in your Supabase SQL editor
+
+-- One row per subscriber id range of a coordinated run, claimed by the batch scripts (app/scripts/work_leases.py)
+CREATE TABLE IF NOT EXISTS batch_work_leases (
+  run TEXT NOT NULL,
+  range_index INTEGER NOT NULL,
+  state TEXT NOT NULL DEFAULT 'pending',
+  worker TEXT,
+  expires_at TIMESTAMPTZ,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (run, range_index)
+);
+
+-- Add comments to document the table
+COMMENT ON TABLE batch_work_leases IS 'Subscriber id ranges of coordinated batch runs (--leases api); range k covers ids (k * range_size, (k + 1) * range_size]';
+COMMENT ON COLUMN batch_work_leases.state IS 'pending, leased (until expires_at) or done';
+COMMENT ON COLUMN batch_work_leases.attempts IS 'Times the range was claimed; more than 1 means a worker crashed or released it';
+
+-- Claim the lowest pending or expired range of a run. SKIP LOCKED lets concurrent
+-- workers claim different ranges without waiting on each other.
+CREATE OR REPLACE FUNCTION claim_batch_work_lease(p_run TEXT, p_worker TEXT, p_lease_seconds INTEGER)
+RETURNS TABLE (range_index INTEGER, attempts INTEGER)
+LANGUAGE sql
+AS $$
+  UPDATE batch_work_leases AS lease
+  SET state = 'leased',
+      worker = p_worker,
+      expires_at = NOW() + make_interval(secs => p_lease_seconds),
+      attempts = lease.attempts + 1,
+      updated_at = NOW()
+  WHERE lease.run = p_run
+    AND lease.range_index = (
+      SELECT candidate.range_index
+      FROM batch_work_leases AS candidate
+      WHERE candidate.run = p_run
+        AND (candidate.state = 'pending' OR (candidate.state = 'leased' AND candidate.expires_at < NOW()))
+      ORDER BY candidate.range_index
+      LIMIT 1
+      FOR UPDATE SKIP LOCKED
+    )
+  RETURNING lease.range_index, lease.attempts;
+$$;
@@ -0,0 +1,22 @@
+-- SQL commands for bulk embedding write-back
+-- Run these commands in your Supabase SQL editor
+
+-- Update embedding_metadata for many subscribers in one statement. Used by
+-- RepositoryEmbeddingWriter (app/lib/github-embeddings.ts) when the batch endpoint
+-- flushes a chunk; p_rows is a JSON array of {"id": <subscriber id>, "metadata": {...}}.
+-- Without this function the writer falls back to one update per subscriber.
+CREATE OR REPLACE FUNCTION store_embedding_metadata(p_rows JSONB)
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+  WITH updated AS (
+    UPDATE subscribers AS subscriber
+    SET embedding_metadata = item.metadata
+    FROM jsonb_to_recordset(p_rows) AS item(id BIGINT, metadata JSONB)
+    WHERE subscriber.id = item.id
+    RETURNING subscriber.id
+  )
+  SELECT COUNT(*)::INTEGER FROM updated;
+$$;
+
+COMMENT ON FUNCTION store_embedding_metadata(JSONB) IS 'Bulk embedding_metadata update for the batch write-back; returns the number of subscribers updated';
@@ -0,0 +1,12 @@
+-- SQL commands to add content hashes to github_repository_embeddings
+-- Run these commands in your Supabase SQL editor
+
+-- Add content_hash field (sha256 of the repository inputs used to build the embedding text)
+ALTER TABLE github_repository_embeddings 
+ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- Add comments to document the new field
+COMMENT ON COLUMN github_repository_embeddings.content_hash IS 'Hash of the repository group (name, contribution type, file paths and contents) the embedding was built from; lets batch_github_embeddings.py --incremental skip unchanged repositories';
+
+-- Optional: Index lookups by subscriber for the incremental hash check
+CREATE INDEX IF NOT EXISTS idx_github_repository_embeddings_subscriber_id ON github_repository_embeddings (subscriber_id);
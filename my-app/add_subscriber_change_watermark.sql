@@ -0,0 +1,48 @@
+-- SQL commands to track GitHub-relevant subscriber changes for the follow-mode pipeline
+-- Run these commands in your Supabase SQL editor
+
+-- Add github_url_changed_at (set by the trigger below whenever a field the analysis reads changes)
+ALTER TABLE subscribers
+ADD COLUMN IF NOT EXISTS github_url_changed_at TIMESTAMPTZ;
+
+-- Add comments to document the new field
+COMMENT ON COLUMN subscribers.github_url_changed_at IS 'Last insert or change of github_url, first_name or last_name; github_pipeline.py --follow polls subscribers past its (github_url_changed_at, id) watermark';
+
+-- Only the inputs of the GitHub analysis bump the column, so the pipeline's own writes
+-- (github_url_data, github_vector_embeddings) never feed back into the change feed.
+-- clock_timestamp() stamps the time of the write rather than of the transaction start, which
+-- narrows but does not close the gap: the row only becomes visible when its transaction
+-- commits, so it can still land behind changes the follower has already read. The follower
+-- re-reads the last --follow-overlap-seconds before the newest change it has seen and skips
+-- (id, github_url_changed_at) pairs it already handled; a write that commits later than that is missed.
+CREATE OR REPLACE FUNCTION touch_github_url_changed_at()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  IF TG_OP = 'INSERT'
+     OR NEW.github_url IS DISTINCT FROM OLD.github_url
+     OR NEW.first_name IS DISTINCT FROM OLD.first_name
+     OR NEW.last_name IS DISTINCT FROM OLD.last_name THEN
+    NEW.github_url_changed_at := clock_timestamp();
+  END IF;
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS subscribers_github_url_changed_at ON subscribers;
+CREATE TRIGGER subscribers_github_url_changed_at
+  BEFORE INSERT OR UPDATE OF github_url, first_name, last_name ON subscribers
+  FOR EACH ROW EXECUTE FUNCTION touch_github_url_changed_at();
+
+-- Backfill existing rows so `--follow-from start` covers them (ordered like their ids)
+UPDATE subscribers
+SET github_url_changed_at = TIMESTAMPTZ 'epoch' + make_interval(secs => id)
+WHERE github_url_changed_at IS NULL
+  AND github_url IS NOT NULL;
+
+-- Index the keyset the change feed pages through: one index range scan per poll,
+-- so an idle poll costs the same however large the table grows
+CREATE INDEX IF NOT EXISTS idx_subscribers_github_url_changed_at ON subscribers (github_url_changed_at, id);
+
+COMMENT ON FUNCTION touch_github_url_changed_at() IS 'Keeps subscribers.github_url_changed_at current for github_pipeline.py --follow';
@@ -0,0 +1,49 @@
+-- SQL commands to store precomputed GitHub similarity neighbours
+-- Run these commands in your Supabase SQL editor
+
+-- Top-k most similar subscribers per subscriber, written by app/scripts/similarity_engine.py
+CREATE TABLE IF NOT EXISTS subscriber_github_neighbours (
+  subscriber_id BIGINT NOT NULL,
+  rank INTEGER NOT NULL,
+  neighbour_id BIGINT NOT NULL,
+  score REAL NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (subscriber_id, rank)
+);
+
+-- Add comments to document the table
+COMMENT ON TABLE subscriber_github_neighbours IS 'Precomputed GitHub similarity neighbours (cosine over mean repository embeddings); refreshed in bulk by similarity_engine.py neighbours --write-back';
+COMMENT ON COLUMN subscriber_github_neighbours.rank IS '1 = most similar';
+
+-- Optional: Index reverse lookups ("who lists this subscriber as a neighbour")
+CREATE INDEX IF NOT EXISTS idx_subscriber_github_neighbours_neighbour_id ON subscriber_github_neighbours (neighbour_id);
+
+-- Replace neighbour lists in one statement. Used by /api/store_subscriber_neighbours;
+-- p_rows is a JSON array of {"subscriber_id", "rank", "neighbour_id", "score"}. A subscriber's
+-- rows above the highest rank sent for it are deleted, so a smaller --top-k or a shorter
+-- candidate list leaves no stale ranks behind. similarity_engine.py sends batches in order,
+-- so a list split across two batches loses its tail in the first and gets it back in the second.
+CREATE OR REPLACE FUNCTION replace_subscriber_neighbours(p_rows JSONB)
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+  WITH incoming AS (
+    SELECT * FROM jsonb_to_recordset(p_rows) AS item(subscriber_id BIGINT, rank INTEGER, neighbour_id BIGINT, score REAL)
+  ),
+  trimmed AS (
+    DELETE FROM subscriber_github_neighbours AS neighbour
+    USING (SELECT subscriber_id, MAX(rank) AS max_rank FROM incoming GROUP BY subscriber_id) AS latest
+    WHERE neighbour.subscriber_id = latest.subscriber_id
+      AND neighbour.rank > latest.max_rank
+  ),
+  stored AS (
+    INSERT INTO subscriber_github_neighbours (subscriber_id, rank, neighbour_id, score, updated_at)
+    SELECT subscriber_id, rank, neighbour_id, score, NOW() FROM incoming
+    ON CONFLICT (subscriber_id, rank) DO UPDATE
+    SET neighbour_id = EXCLUDED.neighbour_id, score = EXCLUDED.score, updated_at = EXCLUDED.updated_at
+    RETURNING 1
+  )
+  SELECT COUNT(*)::INTEGER FROM stored;
+$$;
+
+COMMENT ON FUNCTION replace_subscriber_neighbours(JSONB) IS 'Bulk neighbour write-back for similarity_engine.py; trims ranks past each subscriber''s new list and returns the number of rows stored';
@@ -2,42 +2,17 @@ import { NextRequest, NextResponse } from 'next/server';
 import { createRouteHandlerClient } from '@supabase/auth-helpers-nextjs';
 import { cookies } from 'next/headers';
 import GitHubProfileAnalyzer from '@/app/lib/github-profile-analyzer';
-import type { GitHubProfileAnalysis } from '@/app/types/github-analysis';
-
-// JSON-like type used for sanitized analysis payloads
-type JSONPrimitive = string | number | boolean | null;
-type JSONArray = JSONValue[];
-type JSONObject = { [key: string]: JSONValue };
-type JSONValue = JSONPrimitive | JSONArray | JSONObject | GitHubProfileAnalysis;
-
-// Helper function to sanitize data by removing null bytes and problematic characters
-function sanitizeAnalysisData(obj: JSONValue): JSONValue {
-  if (typeof obj === 'string') {
-    // Remove null bytes and other problematic Unicode characters
-    return obj
-      .replace(/\u0000/g, '')
-      .replace(/[\u0001-\u0008\u000B\u000C\u000E-\u001F\u007F]/g, '');
-  }
-
-  if (Array.isArray(obj)) {
-    return (obj as JSONArray).map(sanitizeAnalysisData);
-  }
-
-  if (obj !== null && typeof obj === 'object') {
-    const cleaned: JSONObject = {};
-    for (const [key, value] of Object.entries(obj as JSONObject)) {
-      cleaned[key] = sanitizeAnalysisData(value);
-    }
-    return cleaned;
-  }
-
-  return obj;
-}
+import { sanitizeAnalysisData } from '@/app/lib/sanitize-analysis';
+import { ServerTiming } from '@/app/lib/server-timing';
 
 export async function POST(request: NextRequest) {
   try {
     const body = await request.json();
     const { username, store_to_user, id, first_name, last_name } = body;
+    // Pipelined batch runs embed in their own stage and need the stored analysis back instead
+    const skipEmbedding = body.skip_embedding === true;
+    // Other subscribers with the same GitHub handle (batch username precheck); they get the same analysis
+    const sharedIds: number[] = Array.isArray(body.shared_ids) ? body.shared_ids.filter((sharedId: unknown) => typeof sharedId === 'number') : [];
 
     // Validate required fields
     if (!username || typeof username !== 'string') {
@@ -105,32 +80,37 @@ export async function POST(request: NextRequest) {
     }
 
     // Perform the analysis with user's real name for better commit verification
-    const analysis = await analyzer.analyzeProfile(username, userRealName);
+    const timing = new ServerTiming();
+    const analysis = await timing.time('github', () => analyzer.analyzeProfile(username, userRealName));
 
     // Clean the analysis data to remove null bytes and other problematic characters
     const cleanedAnalysis = sanitizeAnalysisData(analysis);
 
     // Track if embeddings were generated during this analysis
     let embeddingGenerated = false;
+    // Per shared subscriber: whether their copy of the embeddings was stored
+    const sharedEmbeddingsGenerated: Record<number, boolean> = Object.fromEntries(sharedIds.map(sharedId => [sharedId, false]));
 
     // Store to Supabase if requested and we have a supabase client
     if (store_to_user && supabase && id) {
       try {
         
         // Update the subscribers table with github_url_data
-        const { error: updateError } = await supabase
+        const update = supabase
           .from('subscribers')
           .update({ 
             github_url_data: cleanedAnalysis 
           })
-          .eq('id', id);
+          .in('id', [id, ...sharedIds]);
+        const { error: updateError } = await timing.time('supabase', () => update);
 
         if (updateError) {
           console.error('Error storing GitHub analysis:', updateError);
           // Don't fail the request, just log the error
-        } else {
+        } else if (!skipEmbedding) {
           
-          // Generate embeddings after successfully storing analysis data
+          // Generate embeddings after successfully storing analysis data; the leader's outcome
+          // is kept apart from the sharers', so a failing sharer never hides a stored leader
           let embeddingSuccess = false;
           try {
             const embeddingHeaders: Record<string, string> = { 'Content-Type': 'application/json' };
@@ -141,23 +121,36 @@ export async function POST(request: NextRequest) {
               embeddingHeaders['authorization'] = requestAuthHeader;
             }
             
-            const embeddingResponse = await fetch(`${process.env.NEXT_PUBLIC_SITE_URL || 'http://localhost:3000'}/api/github_embedding`, {
-              method: 'POST',
-              headers: embeddingHeaders,
-              body: JSON.stringify({
-                data: cleanedAnalysis,
-                subscriberId: id
-              })
-            });
-
-            if (!embeddingResponse.ok) {
-              console.error('Failed to generate GitHub embeddings:', await embeddingResponse.text());
-            } else {
+            // The first call computes the embeddings; subscribers sharing the handle reuse them
+            let precomputed: unknown = undefined;
+            for (const [index, subscriberId] of [id, ...sharedIds].entries()) {
+              const isLeader = index === 0;
+              const embeddingResponse = await timing.time('embedding', () => fetch(`${process.env.NEXT_PUBLIC_SITE_URL || 'http://localhost:3000'}/api/github_embedding`, {
+                method: 'POST',
+                headers: embeddingHeaders,
+                body: JSON.stringify({
+                  data: cleanedAnalysis,
+                  subscriberId,
+                  ...(sharedIds.length > 0 ? { precomputed, returnComputed: precomputed === undefined } : {})
+                })
+              }));
+
+              if (!embeddingResponse.ok) {
+                console.error(`Failed to generate GitHub embeddings for subscriber ${subscriberId}:`, await embeddingResponse.text());
+                // Sharers reuse the leader's embeddings; without them there is nothing to share
+                if (isLeader) break;
+                continue;
+              }
               const embeddingResult = await embeddingResponse.json();
-              
+              precomputed = precomputed ?? embeddingResult.computed;
+
               // Signal that embeddings were generated for similarity recalculation
-              if (embeddingResult.embeddingGenerated) {
-                embeddingSuccess = true;
+              const generated = !!embeddingResult.embeddingGenerated;
+              if (isLeader) {
+                embeddingSuccess = generated;
+                if (!generated) break;
+              } else {
+                sharedEmbeddingsGenerated[subscriberId] = generated;
               }
             }
           } catch (embeddingError) {
@@ -197,17 +190,20 @@ export async function POST(request: NextRequest) {
       success: true,
       data: cleanAnalysis,
       stored: store_to_user && !!supabase,
-      embeddingGenerated // Signal to frontend that embeddings are now available
-    });
+      embeddingGenerated, // Signal to frontend that embeddings are now available
+      ...(sharedIds.length > 0 ? { sharedEmbeddingsGenerated } : {}),
+      ...(skipEmbedding ? { analysisData: cleanedAnalysis } : {})
+    }, { headers: timing.headers() });
 
   } catch (error) {
     console.error('Error analyzing GitHub profile:', error);
     
     if (error instanceof Error && error.message.includes('rate limit')) {
+      // Retry-After lets batch clients back off instead of treating this as a hard failure
       return NextResponse.json({ 
         error: 'GitHub API rate limit exceeded. Please try again later.',
         details: error.message
-      }, { status: 429 });
+      }, { status: 429, headers: { 'Retry-After': '60' } });
     }
 
     if (error instanceof Error && error.message.includes('not found')) {
@@ -232,7 +228,9 @@ export async function GET() {
       method: 'POST',
       body: {
         username: 'GitHub username to analyze (e.g., "octocat")',
-        store_to_user: 'boolean (optional) - whether to store analysis in user\'s Supabase profile'
+        store_to_user: 'boolean (optional) - whether to store analysis in user\'s Supabase profile',
+        skip_embedding: 'boolean (optional) - store the analysis but leave embedding to the caller; returns analysisData',
+        shared_ids: 'number[] (optional) - other subscriber ids with the same GitHub handle; the analysis and embeddings are stored for them too'
       },
       examples: {
         basic: { username: 'torvalds' },
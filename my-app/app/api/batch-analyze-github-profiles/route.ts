@@ -1,5 +1,19 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { createClient } from '@supabase/supabase-js';
+import { createClient, type SupabaseClient } from '@supabase/supabase-js';
+import GitHubProfileAnalyzer from '@/app/lib/github-profile-analyzer';
+import { sanitizeAnalysisData } from '@/app/lib/sanitize-analysis';
+import {
+  buildRepositoryEmbeddings,
+  collectComputedResults,
+  createRepositoryEmbeddingText,
+  resolveEmbeddings,
+  RepositoryEmbeddingWriter,
+  DEFAULT_WRITE_BATCH_ROWS,
+  DEFAULT_WRITE_FLUSH_MS,
+  type EmbeddingWriterOptions,
+  type GitHubEmbeddingData,
+  type PrecomputedResults
+} from '@/app/lib/github-embeddings';
 
 interface BatchAnalysisResult {
   subscriberId: number;
@@ -24,6 +38,250 @@ interface BatchAnalysisResponse {
   };
 }
 
+// Helper function to extract GitHub username from URL
+const extractGitHubUsername = (githubUrl: string): string | null => {
+  if (!githubUrl) return null;
+
+  const patterns = [
+    /https?:\/\/github\.com\/([^\/\?]+)/i,
+    /github\.com\/([^\/\?]+)/i,
+    /^([^\/\?]+)$/  // Just username
+  ];
+
+  for (const pattern of patterns) {
+    const match = githubUrl.match(pattern);
+    if (match) {
+      const username = match[1].trim();
+      // Filter out common non-username paths
+      if (!['orgs', 'organizations', 'explore', 'settings', 'notifications'].includes(username.toLowerCase())) {
+        return username;
+      }
+    }
+  }
+
+  return null;
+};
+
+interface ChunkSubscriber {
+  id: number;
+  github_url?: string | null;
+  username?: string | null;
+  first_name?: string | null;
+  last_name?: string | null;
+  data?: GitHubEmbeddingData | null; // github_url_data, for mode 'embed'
+  unchangedRepositoryCount?: number; // repos an incremental run left out because their hash matched
+  precomputed?: PrecomputedResults; // cached embeddings/analyses from the batch tooling
+  sharedWith?: number[]; // other subscribers with the same GitHub handle; stored alongside, reported under id
+}
+
+// retryAfter (seconds) mirrors the Retry-After header /api/analyze-github-profile sends with a 429
+type ChunkResult = BatchAnalysisResult & { httpStatus?: number; retryAfter?: number; computed?: PrecomputedResults };
+
+// Map analyzer failures onto the status codes /api/analyze-github-profile would return
+function analysisErrorStatus(error: unknown): number {
+  const message = error instanceof Error ? error.message : String(error);
+  if (message.includes('rate limit')) return 429;
+  if (message.includes('not found')) return 404;
+  return 500;
+}
+
+// Process an explicit chunk of subscribers in-process: one Supabase client, one analyzer,
+// and Voyage embeddings for every repository in the chunk requested together.
+// Results are streamed back as NDJSON, one line per subscriber, as they complete.
+function streamChunk(
+  supabase: SupabaseClient,
+  subscribers: ChunkSubscriber[],
+  mode: 'analyze' | 'embed',
+  dryRun: boolean,
+  returnComputed = false,
+  writeOptions: EmbeddingWriterOptions = {}
+): Response {
+  const encoder = new TextEncoder();
+
+  const stream = new ReadableStream({
+    async start(controller) {
+      // One line per subscriber; once the stream has closed, late results are dropped
+      const reported = new Set<number>();
+      let closed = false;
+      const emit = (result: ChunkResult) => {
+        if (closed || reported.has(result.subscriberId)) return;
+        reported.add(result.subscriberId);
+        controller.enqueue(encoder.encode(JSON.stringify(result) + '\n'));
+      };
+
+      try {
+        const voyageApiKey = process.env.VOYAGE_API_KEY;
+        const geminiApiKey = process.env.NEXT_PUBLIC_GEMENI_API_KEY;
+        const githubAppId = process.env.GITHUB_APP_ID;
+        const githubPrivateKey = process.env.GITHUB_PRIVATE_KEY;
+
+        const configError = !voyageApiKey || !geminiApiKey
+          ? 'Voyage/Gemini API keys not configured'
+          : mode === 'analyze' && (!githubAppId || !githubPrivateKey)
+            ? 'GitHub App not configured'
+            : null;
+
+        // Stage 1: get github_url_data for every subscriber in the chunk
+        const analyzer = mode === 'analyze' && !configError && !dryRun
+          ? new GitHubProfileAnalyzer(githubAppId, githubPrivateKey, geminiApiKey)
+          : null;
+
+        const analyzed = await Promise.all(subscribers.map(async (subscriber) => {
+          const username = mode === 'analyze'
+            ? (subscriber.username || extractGitHubUsername(subscriber.github_url || ''))
+            : (subscriber.data?.username || subscriber.username || 'Unknown');
+
+          if (!username) {
+            emit({ subscriberId: subscriber.id, username: 'N/A', status: 'skipped', error: 'No valid GitHub username found' });
+            return null;
+          }
+          if (mode === 'embed' && !subscriber.data) {
+            emit({ subscriberId: subscriber.id, username, status: 'skipped', error: 'No GitHub analysis data found' });
+            return null;
+          }
+          if (configError) {
+            emit({ subscriberId: subscriber.id, username, status: 'error', httpStatus: 500, error: configError });
+            return null;
+          }
+          if (dryRun) {
+            emit({ subscriberId: subscriber.id, username, status: 'success', repositoriesAnalyzed: 0, embeddingGenerated: false });
+            return null;
+          }
+          if (mode === 'embed') {
+            return { subscriber, username, data: subscriber.data as GitHubEmbeddingData };
+          }
+
+          try {
+            const userRealName = [subscriber.first_name, subscriber.last_name].filter(Boolean).join(' ') || undefined;
+            const analysis = await analyzer!.analyzeProfile(username, userRealName);
+            const cleanedAnalysis = sanitizeAnalysisData(analysis);
+
+            const { error: updateError } = await supabase
+              .from('subscribers')
+              .update({ github_url_data: cleanedAnalysis })
+              .in('id', [subscriber.id, ...(subscriber.sharedWith || [])]);
+            if (updateError) {
+              console.error('Error storing GitHub analysis:', updateError);
+            }
+
+            return { subscriber, username, data: cleanedAnalysis as GitHubEmbeddingData };
+          } catch (error) {
+            const httpStatus = analysisErrorStatus(error);
+            emit({
+              subscriberId: subscriber.id,
+              username,
+              status: 'error',
+              httpStatus,
+              ...(httpStatus === 429 ? { retryAfter: 60 } : {}),
+              error: error instanceof Error ? error.message : String(error)
+            });
+            return null;
+          }
+        }));
+
+        const ready = analyzed.filter((item): item is NonNullable<typeof item> => item !== null);
+
+        // Stage 2: one Voyage request for every uncached repository in the chunk
+        const chunkPrecomputed: PrecomputedResults = { embeddings: {} };
+        for (const item of ready) {
+          Object.assign(chunkPrecomputed.embeddings!, item.subscriber.precomputed?.embeddings);
+        }
+        const texts: string[] = [];
+        const offsets = ready.map(item => {
+          const start = texts.length;
+          for (const repoGroup of item.data.repositoryGroups || []) {
+            texts.push(createRepositoryEmbeddingText(repoGroup));
+          }
+          return start;
+        });
+        const embeddings = texts.length > 0 ? await resolveEmbeddings(texts, voyageApiKey!, chunkPrecomputed) : [];
+
+        // Stage 3: technology analysis per subscriber; the embeddings are written back in
+        // multi-row batches and each subscriber is streamed back once its batch is stored
+        const writer = new RepositoryEmbeddingWriter(supabase, writeOptions);
+        const storing: Promise<void>[] = [];
+        for (let i = 0; i < ready.length; i++) {
+          const { subscriber, username, data } = ready[i];
+          const repoGroups = data.repositoryGroups || [];
+          const start = offsets[i];
+
+          if (repoGroups.length === 0) {
+            emit({ subscriberId: subscriber.id, username, status: 'error', httpStatus: 422, error: 'No repository data available for embedding generation' });
+            continue;
+          }
+
+          try {
+            const repositoryEmbeddings = await buildRepositoryEmbeddings(
+              repoGroups,
+              texts.slice(start, start + repoGroups.length),
+              embeddings.slice(start, start + repoGroups.length),
+              geminiApiKey!,
+              subscriber.precomputed
+            );
+
+            if (repositoryEmbeddings.length === 0) {
+              emit({ subscriberId: subscriber.id, username, status: 'error', httpStatus: 502, error: 'Failed to generate any repository embeddings' });
+              continue;
+            }
+
+            const stored = Promise.all([subscriber.id, ...(subscriber.sharedWith || [])].map(subscriberId =>
+              writer.add(subscriberId, data, repositoryEmbeddings, subscriber.unchangedRepositoryCount || 0)));
+            storing.push(stored.then(() => emit({
+              subscriberId: subscriber.id,
+              username,
+              status: 'success',
+              repositoriesAnalyzed: repoGroups.length,
+              embeddingGenerated: true,
+              repositoryEmbeddingsGenerated: repositoryEmbeddings.length,
+              ...(returnComputed ? { computed: collectComputedResults(repositoryEmbeddings, subscriber.precomputed) } : {})
+            }), (error) => emit({
+              subscriberId: subscriber.id,
+              username,
+              status: 'error',
+              httpStatus: 503, // the write-back failed after its retries; worth resending
+              error: error instanceof Error ? error.message : String(error)
+            })));
+          } catch (error) {
+            emit({
+              subscriberId: subscriber.id,
+              username,
+              status: 'error',
+              httpStatus: 500,
+              error: error instanceof Error ? error.message : String(error)
+            });
+          }
+        }
+
+        await writer.flush();
+        await Promise.all(storing);
+        if (writer.stats.batches > 0 || writer.stats.failedBatches > 0) {
+          console.log(`Chunk write-back: ${writer.stats.rows} rows in ${writer.stats.batches} upserts` +
+            ` (${writer.stats.retries} retries, ${writer.stats.failedBatches} failed batches)`);
+        }
+      } catch (error) {
+        console.error('Error in chunked GitHub batch processing:', error);
+        // Every subscriber still waiting gets a line, with a status the scripts resend
+        for (const subscriber of subscribers) {
+          emit({
+            subscriberId: subscriber.id,
+            username: subscriber.username || 'N/A',
+            status: 'error',
+            httpStatus: 503,
+            error: `Chunk processing failed: ${error instanceof Error ? error.message : String(error)}`
+          });
+        }
+      } finally {
+        closed = true;
+        controller.close();
+      }
+    }
+  });
+
+  return new Response(stream, {
+    headers: { 'Content-Type': 'application/x-ndjson' }
+  });
+}
+
 export async function POST(request: NextRequest) {
   try {
     // Check for service role key in authorization header
@@ -57,9 +315,22 @@ export async function POST(request: NextRequest) {
       limit = null, 
       skipExisting = false, 
       maxConcurrent = 5,
-      dryRun = false 
+      dryRun = false,
+      subscribers: chunk = null,
+      mode = 'analyze',
+      returnComputed = false,
+      writeBatchRows = DEFAULT_WRITE_BATCH_ROWS,
+      writeFlushMs = DEFAULT_WRITE_FLUSH_MS
     } = body;
 
+    // Chunk mode: the caller sends the subscribers to process and reads results as NDJSON
+    if (Array.isArray(chunk)) {
+      return streamChunk(supabase, chunk, mode === 'embed' ? 'embed' : 'analyze', dryRun, returnComputed, {
+        maxRows: writeBatchRows,
+        maxWaitMs: writeFlushMs
+      });
+    }
+
     // Get subscribers with GitHub URLs
     let query = supabase
       .from('subscribers')
@@ -120,30 +391,6 @@ export async function POST(request: NextRequest) {
     let totalRepositoryEmbeddings = 0;
     let embeddingsGenerated = 0;
 
-    // Helper function to extract GitHub username from URL
-    const extractGitHubUsername = (githubUrl: string): string | null => {
-      if (!githubUrl) return null;
-      
-      const patterns = [
-        /https?:\/\/github\.com\/([^\/\?]+)/i,
-        /github\.com\/([^\/\?]+)/i,
-        /^([^\/\?]+)$/  // Just username
-      ];
-      
-      for (const pattern of patterns) {
-        const match = githubUrl.match(pattern);
-        if (match) {
-          const username = match[1].trim();
-          // Filter out common non-username paths
-          if (!['orgs', 'organizations', 'explore', 'settings', 'notifications'].includes(username.toLowerCase())) {
-            return username;
-          }
-        }
-      }
-      
-      return null;
-    };
-
     // Process with semaphore for concurrency control
     let activeRequests = 0;
     const maxConcurrentRequests = maxConcurrent;
@@ -306,12 +553,16 @@ export async function GET() {
         limit: 'number (optional) - max subscribers to process',
         skipExisting: 'boolean (optional) - skip users with existing repository embeddings',
         maxConcurrent: 'number (optional) - max concurrent API calls (default: 5)',
-        dryRun: 'boolean (optional) - preview without making changes'
+        dryRun: 'boolean (optional) - preview without making changes',
+        subscribers: 'array (optional) - explicit chunk of { id, github_url, first_name, last_name } (or { id, data } with mode "embed"); results stream back as NDJSON',
+        mode: '"analyze" (default) or "embed" - embed skips GitHub analysis and uses the supplied github_url_data',
+        returnComputed: 'boolean (optional, chunk mode) - include newly computed embeddings/analyses per subscriber so the caller can cache them; pass them back as subscribers[].precomputed'
       },
       examples: {
         basic: { limit: 10, skipExisting: true },
         dryRun: { limit: 5, dryRun: true },
-        production: { skipExisting: true, maxConcurrent: 3 }
+        production: { skipExisting: true, maxConcurrent: 3 },
+        chunk: { subscribers: [{ id: 123, github_url: 'https://github.com/octocat' }] }
       }
     }
   }, { status: 405 });
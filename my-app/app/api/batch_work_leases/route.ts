@@ -0,0 +1,165 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { createClient, SupabaseClient } from '@supabase/supabase-js';
+
+// Ranges are created and read back in batches of this size
+const PLAN_BATCH_SIZE = 1000;
+
+type LeaseAction = 'plan' | 'claim' | 'renew' | 'complete' | 'release' | 'status' | 'reset';
+
+interface LeaseRequest {
+  action: LeaseAction;
+  run: string;
+  worker?: string;
+  range_index?: number;
+  range_count?: number;
+  lease_seconds?: number;
+}
+
+// Update a range only while this worker still holds its lease; returns whether it did
+async function updateHeld(supabase: SupabaseClient, body: LeaseRequest, changes: Record<string, unknown>) {
+  const { data, error } = await supabase
+    .from('batch_work_leases')
+    .update({ ...changes, updated_at: new Date().toISOString() })
+    .eq('run', body.run)
+    .eq('range_index', body.range_index)
+    .eq('worker', body.worker)
+    .eq('state', 'leased')
+    .select('range_index');
+  if (error) throw new Error(error.message);
+  return (data || []).length === 1;
+}
+
+// Lease coordination for sharded batch workers (app/scripts/work_leases.py, --leases api)
+export async function POST(request: NextRequest) {
+  try {
+    // Check for service role key in authorization header
+    const authHeader = request.headers.get('authorization');
+    if (!authHeader || !authHeader.startsWith('Bearer ')) {
+      return NextResponse.json({
+        error: 'Service role authentication required'
+      }, { status: 401 });
+    }
+
+    const supabase = createClient(
+      process.env.NEXT_PUBLIC_SUPABASE_URL!,
+      authHeader.replace('Bearer ', '')
+    );
+
+    const body = await request.json() as LeaseRequest;
+    if (!body.run) {
+      return NextResponse.json({ error: 'run is required' }, { status: 400 });
+    }
+    const needsLease = ['claim', 'renew', 'complete', 'release'].includes(body.action);
+    if (needsLease && !body.worker) {
+      return NextResponse.json({ error: 'worker is required' }, { status: 400 });
+    }
+    if (['renew', 'complete', 'release'].includes(body.action) && typeof body.range_index !== 'number') {
+      return NextResponse.json({ error: 'range_index is required' }, { status: 400 });
+    }
+
+    const leaseSeconds = Math.max(1, Math.round(body.lease_seconds ?? 300));
+
+    switch (body.action) {
+      case 'plan': {
+        const rangeCount = Math.max(0, Math.floor(body.range_count ?? 0));
+        for (let start = 0; start < rangeCount; start += PLAN_BATCH_SIZE) {
+          const rows = [];
+          for (let index = start; index < Math.min(start + PLAN_BATCH_SIZE, rangeCount); index++) {
+            rows.push({ run: body.run, range_index: index });
+          }
+          // Existing ranges keep their state, so every worker can plan the same run
+          const { error } = await supabase
+            .from('batch_work_leases')
+            .upsert(rows, { onConflict: 'run,range_index', ignoreDuplicates: true });
+          if (error) throw new Error(error.message);
+        }
+        return NextResponse.json({ success: true, range_count: rangeCount });
+      }
+
+      case 'claim': {
+        const { data, error } = await supabase.rpc('claim_batch_work_lease', {
+          p_run: body.run,
+          p_worker: body.worker,
+          p_lease_seconds: leaseSeconds
+        });
+        if (error) throw new Error(error.message);
+        const claimed = (data || [])[0] as { range_index: number; attempts: number } | undefined;
+        return NextResponse.json({
+          success: true,
+          range_index: claimed ? claimed.range_index : null,
+          attempts: claimed ? claimed.attempts : null
+        });
+      }
+
+      case 'renew': {
+        const held = await updateHeld(supabase, body, {
+          expires_at: new Date(Date.now() + leaseSeconds * 1000).toISOString()
+        });
+        return NextResponse.json({ success: true, held });
+      }
+
+      case 'complete': {
+        const held = await updateHeld(supabase, body, { state: 'done', expires_at: null });
+        return NextResponse.json({ success: true, held });
+      }
+
+      case 'release': {
+        const held = await updateHeld(supabase, body, { state: 'pending', worker: null, expires_at: null });
+        return NextResponse.json({ success: true, held });
+      }
+
+      case 'status': {
+        type LeaseRow = { state: string; worker: string | null; expires_at: string | null };
+        const rows: LeaseRow[] = [];
+        // PostgREST caps each response, so read the run in pages
+        for (let start = 0; ; start += PLAN_BATCH_SIZE) {
+          const { data, error } = await supabase
+            .from('batch_work_leases')
+            .select('state, worker, expires_at')
+            .eq('run', body.run)
+            .order('range_index', { ascending: true })
+            .range(start, start + PLAN_BATCH_SIZE - 1);
+          if (error) throw new Error(error.message);
+          rows.push(...((data || []) as LeaseRow[]));
+          if (!data || data.length < PLAN_BATCH_SIZE) break;
+        }
+
+        const now = Date.now();
+        const status = { pending: 0, leased: 0, expired: 0, done: 0, workers: {} as Record<string, number> };
+        for (const row of rows) {
+          if (row.state === 'leased' && row.expires_at && new Date(row.expires_at).getTime() < now) {
+            status.expired++;
+          } else if (row.state === 'leased') {
+            status.leased++;
+            status.workers[row.worker || 'unknown'] = (status.workers[row.worker || 'unknown'] || 0) + 1;
+          } else if (row.state === 'done') {
+            status.done++;
+          } else {
+            status.pending++;
+          }
+        }
+        return NextResponse.json({ success: true, status });
+      }
+
+      case 'reset': {
+        const { data, error } = await supabase
+          .from('batch_work_leases')
+          .delete()
+          .eq('run', body.run)
+          .select('range_index');
+        if (error) throw new Error(error.message);
+        return NextResponse.json({ success: true, deleted: (data || []).length });
+      }
+
+      default:
+        return NextResponse.json({ error: `Unknown action: ${body.action}` }, { status: 400 });
+    }
+
+  } catch (error) {
+    console.error('Error in batch_work_leases:', error);
+    return NextResponse.json({
+      error: 'Internal server error',
+      details: error instanceof Error ? error.message : String(error)
+    }, { status: 500 });
+  }
+}
@@ -0,0 +1,63 @@
+import { timingSafeEqual } from 'crypto';
+import { NextRequest, NextResponse } from 'next/server';
+import GitHubAPI from '@/app/lib/github-api';
+import { ServerTiming } from '@/app/lib/server-timing';
+
+// Logins accepted per request; the batch scripts send one window of subscribers at a time
+const MAX_USERNAMES = 1000;
+
+// Constant-time comparison, so response timing doesn't reveal how much of a guessed key matched
+function sameKey(given: string, expected: string): boolean {
+  const givenBytes = Buffer.from(given);
+  const expectedBytes = Buffer.from(expected);
+  return givenBytes.length === expectedBytes.length && timingSafeEqual(givenBytes, expectedBytes);
+}
+
+// Bulk existence check for the batch scripts' username precheck (app/scripts/username_precheck.py).
+// Answers { users: { <login>: { login, type } | null } } so dead or renamed accounts are
+// dropped before anyone pays for /api/analyze-github-profile.
+export async function POST(request: NextRequest) {
+  try {
+    // Check for service role key in authorization header. Unlike the database routes nothing
+    // downstream would reject a bad key, and every call spends the GitHub App's GraphQL quota
+    const serviceRoleKey = process.env.SUPABASE_SERVICE_ROLE_KEY;
+    if (!serviceRoleKey) {
+      return NextResponse.json({ error: 'SUPABASE_SERVICE_ROLE_KEY is not configured' }, { status: 500 });
+    }
+    const authHeader = request.headers.get('authorization');
+    if (!authHeader || !authHeader.startsWith('Bearer ') || !sameKey(authHeader.slice('Bearer '.length), serviceRoleKey)) {
+      return NextResponse.json({
+        error: 'Service role authentication required'
+      }, { status: 401 });
+    }
+
+    const body = await request.json();
+    const usernames: unknown = body.usernames;
+    if (!Array.isArray(usernames) || usernames.some(username => typeof username !== 'string')) {
+      return NextResponse.json({ error: 'usernames must be an array of strings' }, { status: 400 });
+    }
+    if (usernames.length > MAX_USERNAMES) {
+      return NextResponse.json({ error: `At most ${MAX_USERNAMES} usernames per request` }, { status: 400 });
+    }
+
+    if (!process.env.GITHUB_APP_ID || !process.env.GITHUB_PRIVATE_KEY || !process.env.GITHUB_INSTALLATION_ID) {
+      return NextResponse.json({
+        error: 'GitHub App not configured. Please set GITHUB_APP_ID, GITHUB_PRIVATE_KEY, and GITHUB_INSTALLATION_ID environment variables.'
+      }, { status: 500 });
+    }
+
+    const timing = new ServerTiming();
+    const github = new GitHubAPI();
+    const users = await timing.time('github', () => github.lookupLogins([...new Set(usernames as string[])]));
+
+    return NextResponse.json({ success: true, users }, { headers: timing.headers() });
+
+  } catch (error) {
+    console.error('Error checking GitHub usernames:', error);
+    const message = error instanceof Error ? error.message : String(error);
+    return NextResponse.json({
+      error: 'Internal server error',
+      details: message
+    }, { status: message.includes('rate limit') ? 429 : 500 });
+  }
+}
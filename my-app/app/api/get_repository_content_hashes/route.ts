@@ -0,0 +1,95 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { createRouteHandlerClient } from '@supabase/auth-helpers-nextjs';
+import { cookies } from 'next/headers';
+
+// Supabase caps rows per request, so large lookups are read in ranges
+const ROWS_PER_REQUEST = 1000;
+const MAX_SUBSCRIBER_IDS = 500;
+
+export async function GET(request: NextRequest) {
+  try {
+    const url = new URL(request.url);
+    const subscriberIdsParam = url.searchParams.get('subscriber_ids') || '';
+    const subscriberIds = subscriberIdsParam
+      .split(',')
+      .map(id => parseInt(id, 10))
+      .filter(id => !isNaN(id));
+
+    if (subscriberIds.length === 0) {
+      return NextResponse.json({ error: 'subscriber_ids is required' }, { status: 400 });
+    }
+
+    if (subscriberIds.length > MAX_SUBSCRIBER_IDS) {
+      return NextResponse.json({ 
+        error: `At most ${MAX_SUBSCRIBER_IDS} subscriber_ids per request` 
+      }, { status: 400 });
+    }
+
+    // Check for service role key in authorization header
+    const authHeader = request.headers.get('authorization');
+    let supabase;
+    
+    if (authHeader && authHeader.startsWith('Bearer ')) {
+      const serviceKey = authHeader.replace('Bearer ', '');
+      
+      // Use service role client (bypasses RLS)
+      const { createClient } = await import('@supabase/supabase-js');
+      supabase = createClient(
+        process.env.NEXT_PUBLIC_SUPABASE_URL!,
+        serviceKey
+      );
+    } else {
+      // Fallback to regular authenticated client
+      const cookieStore = cookies();
+      supabase = createRouteHandlerClient({ cookies: () => cookieStore });
+      
+      // Get authenticated user
+      const { data: { user }, error: userError } = await supabase.auth.getUser();
+      if (userError || !user) {
+        return NextResponse.json({ 
+          error: 'Authentication required' 
+        }, { status: 401 });
+      }
+    }
+
+    // subscriber_id -> repository_name -> content_hash
+    const hashes: Record<string, Record<string, string | null>> = {};
+    for (let offset = 0; ; offset += ROWS_PER_REQUEST) {
+      const { data: rows, error } = await supabase
+        .from('github_repository_embeddings')
+        .select('subscriber_id, repository_name, content_hash')
+        .in('subscriber_id', subscriberIds)
+        .order('subscriber_id', { ascending: true })
+        .order('repository_name', { ascending: true })
+        .range(offset, offset + ROWS_PER_REQUEST - 1);
+
+      if (error) {
+        console.error('Error fetching repository content hashes:', error);
+        return NextResponse.json({
+          error: 'Failed to fetch repository content hashes',
+          details: error.message
+        }, { status: 500 });
+      }
+
+      for (const row of rows || []) {
+        const key = String(row.subscriber_id);
+        hashes[key] = hashes[key] || {};
+        hashes[key][row.repository_name] = row.content_hash;
+      }
+
+      if (!rows || rows.length < ROWS_PER_REQUEST) break;
+    }
+
+    return NextResponse.json({
+      success: true,
+      hashes
+    });
+
+  } catch (error) {
+    console.error('Error in get_repository_content_hashes:', error);
+    return NextResponse.json({
+      error: 'Internal server error',
+      details: error instanceof Error ? error.message : String(error)
+    }, { status: 500 });
+  }
+}
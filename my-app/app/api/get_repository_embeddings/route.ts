@@ -0,0 +1,123 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { createRouteHandlerClient } from '@supabase/auth-helpers-nextjs';
+import { cookies } from 'next/headers';
+
+// Supabase caps rows per request, so large lookups are read in ranges.
+// Vectors are large, so fewer subscribers per call than the content hash lookup.
+const ROWS_PER_REQUEST = 1000;
+const MAX_SUBSCRIBER_IDS = 200;
+
+type EmbeddingRow = { subscriber_id: number; repository_name: string; embedding: number[] | string | null };
+
+// int8 scalar quantization with one scale per vector (scale = max|x| / 127), sent as
+// base64. Several times smaller than a JSON float array; decoded by
+// parse_quantized_vector in app/scripts/similarity_engine.py.
+function quantizeEmbedding(row: EmbeddingRow) {
+  const values: number[] = typeof row.embedding === 'string' ? JSON.parse(row.embedding) : row.embedding || [];
+  let maxAbs = 0;
+  for (const value of values) maxAbs = Math.max(maxAbs, Math.abs(value));
+  const scale = maxAbs / 127;
+  const codes = new Int8Array(values.length);
+  if (scale > 0) {
+    values.forEach((value, index) => {
+      codes[index] = Math.max(-127, Math.min(127, Math.round(value / scale)));
+    });
+  }
+  return {
+    subscriber_id: row.subscriber_id,
+    repository_name: row.repository_name,
+    embedding_q8: Buffer.from(codes.buffer).toString('base64'),
+    scale
+  };
+}
+
+export async function GET(request: NextRequest) {
+  try {
+    const url = new URL(request.url);
+    const subscriberIdsParam = url.searchParams.get('subscriber_ids') || '';
+    const subscriberIds = subscriberIdsParam
+      .split(',')
+      .map(id => parseInt(id, 10))
+      .filter(id => !isNaN(id));
+    const format = url.searchParams.get('format') || 'json';
+
+    if (format !== 'json' && format !== 'int8') {
+      return NextResponse.json({ error: 'format must be json or int8' }, { status: 400 });
+    }
+
+    if (subscriberIds.length === 0) {
+      return NextResponse.json({ error: 'subscriber_ids is required' }, { status: 400 });
+    }
+
+    if (subscriberIds.length > MAX_SUBSCRIBER_IDS) {
+      return NextResponse.json({ 
+        error: `At most ${MAX_SUBSCRIBER_IDS} subscriber_ids per request` 
+      }, { status: 400 });
+    }
+
+    // Check for service role key in authorization header
+    const authHeader = request.headers.get('authorization');
+    let supabase;
+    
+    if (authHeader && authHeader.startsWith('Bearer ')) {
+      const serviceKey = authHeader.replace('Bearer ', '');
+      
+      // Use service role client (bypasses RLS)
+      const { createClient } = await import('@supabase/supabase-js');
+      supabase = createClient(
+        process.env.NEXT_PUBLIC_SUPABASE_URL!,
+        serviceKey
+      );
+    } else {
+      // Fallback to regular authenticated client
+      const cookieStore = cookies();
+      supabase = createRouteHandlerClient({ cookies: () => cookieStore });
+      
+      // Get authenticated user
+      const { data: { user }, error: userError } = await supabase.auth.getUser();
+      if (userError || !user) {
+        return NextResponse.json({ 
+          error: 'Authentication required' 
+        }, { status: 401 });
+      }
+    }
+
+    // Repository vectors for the similarity engine export (app/scripts/similarity_engine.py)
+    const embeddings: EmbeddingRow[] = [];
+    for (let offset = 0; ; offset += ROWS_PER_REQUEST) {
+      const { data: rows, error } = await supabase
+        .from('github_repository_embeddings')
+        .select('subscriber_id, repository_name, embedding')
+        .in('subscriber_id', subscriberIds)
+        .not('embedding', 'is', null)
+        .order('subscriber_id', { ascending: true })
+        .order('repository_name', { ascending: true })
+        .range(offset, offset + ROWS_PER_REQUEST - 1);
+
+      if (error) {
+        console.error('Error fetching repository embeddings:', error);
+        return NextResponse.json({
+          error: 'Failed to fetch repository embeddings',
+          details: error.message
+        }, { status: 500 });
+      }
+
+      embeddings.push(...(rows || []));
+
+      if (!rows || rows.length < ROWS_PER_REQUEST) break;
+    }
+
+    return NextResponse.json({
+      success: true,
+      format,
+      embeddings: format === 'int8' ? embeddings.map(quantizeEmbedding) : embeddings
+    });
+
+  } catch (error) {
+    console.error('Error in get_repository_embeddings:', error);
+    return NextResponse.json({
+      error: 'Internal server error',
+      details: error instanceof Error ? error.message : String(error)
+    }, { status: 500 });
+  }
+}
@@ -1,6 +1,7 @@
 import { createRouteHandlerClient } from '@supabase/auth-helpers-nextjs';
 import { cookies } from 'next/headers';
 import { NextRequest, NextResponse } from 'next/server';
+import { ServerTiming } from '@/app/lib/server-timing';
 
 export async function GET(request: NextRequest) {
   try {
@@ -27,14 +28,33 @@ export async function GET(request: NextRequest) {
     const { searchParams } = new URL(request.url);
     const limitParam = searchParams.get('limit');
     const skipExistingParam = searchParams.get('skip_existing');
+    const afterIdParam = searchParams.get('after_id');
+    const pageSizeParam = searchParams.get('page_size');
+    const maxIdParam = searchParams.get('max_id');
     
     const limit = limitParam ? parseInt(limitParam) : null;
     const skipExisting = skipExistingParam === 'true';
+    // Leave out github_url_data / github_vector_embeddings unless asked for them
+    const includeHeavy = searchParams.get('include_heavy') !== 'false';
+    const afterId = afterIdParam ? parseInt(afterIdParam) : null;
+    const pageSize = pageSizeParam ? parseInt(pageSizeParam) : null;
+    const paginated = pageSize !== null && !isNaN(pageSize) && pageSize > 0;
+    // Sharded batch workers fetch one id range at a time and find its end with order=desc&page_size=1
+    const maxId = maxIdParam ? parseInt(maxIdParam) : null;
+    const descending = searchParams.get('order') === 'desc';
+    // github_pipeline.py --follow pages through recent changes by (github_url_changed_at, id)
+    // instead of by id; changed_since + after_id is the watermark it has already seen
+    const byChange = searchParams.get('sort') === 'changed';
+    const changedSince = searchParams.get('changed_since');
+    
+    const columns = (includeHeavy
+      ? 'id, email, first_name, last_name, github_url, github_url_data, github_vector_embeddings'
+      : 'id, email, first_name, last_name, github_url') + (byChange ? ', github_url_changed_at' : '');
     
     // Build the query to find subscribers with GitHub URLs
     let query = supabase
       .from('subscribers')
-      .select('id, email, first_name, last_name, github_url, github_url_data, github_vector_embeddings')
+      .select(columns)
       .not('github_url', 'is', null)
       .neq('github_url', '');
     
@@ -43,12 +63,35 @@ export async function GET(request: NextRequest) {
       query = query.is('github_vector_embeddings', null);
     }
     
-    // Apply limit if specified
-    if (limit) {
+    // Keyset pagination over idx_subscribers_github_url_changed_at (add_subscriber_change_watermark.sql)
+    if (byChange && paginated) {
+      query = query
+        .not('github_url_changed_at', 'is', null)
+        .order('github_url_changed_at', { ascending: !descending })
+        .order('id', { ascending: !descending });
+      if (changedSince) {
+        const since = `"${changedSince}"`;
+        const lastId = afterId !== null && !isNaN(afterId) ? afterId : 0;
+        query = query.or(`github_url_changed_at.gt.${since},and(github_url_changed_at.eq.${since},id.gt.${lastId})`);
+      }
+      query = query.limit(pageSize);
+    } else if (paginated) {
+      // Keyset pagination: page through by id so each page is an index range scan
+      query = query.order('id', { ascending: !descending });
+      if (afterId !== null && !isNaN(afterId)) {
+        query = descending ? query.lt('id', afterId) : query.gt('id', afterId);
+      }
+      if (maxId !== null && !isNaN(maxId)) {
+        query = query.lte('id', maxId);
+      }
+      query = query.limit(limit ? Math.min(limit, pageSize) : pageSize);
+    } else if (limit) {
+      // Apply limit if specified
       query = query.limit(limit);
     }
     
-    const { data: subscribers, error } = await query;
+    const timing = new ServerTiming();
+    const { data: subscribers, error } = await timing.time('supabase', () => query);
     
     if (error) {
       console.error('Error fetching subscribers with GitHub URLs:', error);
@@ -58,25 +101,39 @@ export async function GET(request: NextRequest) {
       }, { status: 500 });
     }
     
-    const enrichedSubscribers = (subscribers || []).map(subscriber => ({
+    const rows = (subscribers || []) as Array<{ id: number; github_url_data?: unknown; github_vector_embeddings?: unknown }>;
+    const enrichedSubscribers = rows.map(subscriber => (includeHeavy ? {
       ...subscriber,
       has_github_data: !!subscriber.github_url_data,
       has_embeddings: !!subscriber.github_vector_embeddings
-    }));
+    } : subscriber));
+    
+    // A full page means there may be more rows after the last id
+    const nextCursor = paginated && enrichedSubscribers.length === pageSize
+      ? enrichedSubscribers[enrichedSubscribers.length - 1].id
+      : null;
     
     return NextResponse.json({
       success: true,
       subscribers: enrichedSubscribers,
+      next_cursor: nextCursor,
       metadata: {
         total_found: enrichedSubscribers.length,
-        with_existing_data: enrichedSubscribers.filter(s => s.has_github_data).length,
-        with_existing_embeddings: enrichedSubscribers.filter(s => s.has_embeddings).length,
+        with_existing_data: rows.filter(s => !!s.github_url_data).length,
+        with_existing_embeddings: rows.filter(s => !!s.github_vector_embeddings).length,
         query_params: {
           limit,
-          skip_existing: skipExisting
+          skip_existing: skipExisting,
+          after_id: afterId,
+          page_size: pageSize,
+          max_id: maxId,
+          order: descending ? 'desc' : 'asc',
+          sort: byChange ? 'changed' : 'id',
+          changed_since: changedSince,
+          include_heavy: includeHeavy
         }
       }
-    });
+    }, { headers: timing.headers() });
     
   } catch (error) {
     console.error('Unexpected error in get_subscribers_with_github:', error);
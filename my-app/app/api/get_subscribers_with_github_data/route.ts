@@ -1,12 +1,24 @@
 import { NextRequest, NextResponse } from 'next/server';
 import { createRouteHandlerClient } from '@supabase/auth-helpers-nextjs';
 import { cookies } from 'next/headers';
+import { ServerTiming } from '@/app/lib/server-timing';
 
 export async function GET(request: NextRequest) {
   try {
     const url = new URL(request.url);
     const limit = url.searchParams.get('limit');
     const skipExisting = url.searchParams.get('skip_existing') === 'true';
+    // github_url_data is the payload callers need; the vector column is optional
+    const includeHeavy = url.searchParams.get('include_heavy') !== 'false';
+    const afterIdParam = url.searchParams.get('after_id');
+    const pageSizeParam = url.searchParams.get('page_size');
+    const afterId = afterIdParam ? parseInt(afterIdParam, 10) : null;
+    const pageSize = pageSizeParam ? parseInt(pageSizeParam, 10) : null;
+    const paginated = pageSize !== null && !isNaN(pageSize) && pageSize > 0;
+    // Sharded batch workers fetch one id range at a time and find its end with order=desc&page_size=1
+    const maxIdParam = url.searchParams.get('max_id');
+    const maxId = maxIdParam ? parseInt(maxIdParam, 10) : null;
+    const descending = url.searchParams.get('order') === 'desc';
     
     // Check for service role key in authorization header
     const authHeader = request.headers.get('authorization');
@@ -36,9 +48,12 @@ export async function GET(request: NextRequest) {
     }
 
     // Build query to get subscribers with github_url_data
+    const columns = includeHeavy
+      ? 'id, first_name, last_name, github_url, github_url_data, github_vector_embeddings'
+      : 'id, first_name, last_name, github_url, github_url_data';
     let query = supabase
       .from('subscribers')
-      .select('id, first_name, last_name, github_url, github_url_data, github_vector_embeddings')
+      .select(columns)
       .not('github_url_data', 'is', null);
     
     // Skip those who already have embeddings if requested
@@ -46,15 +61,26 @@ export async function GET(request: NextRequest) {
       query = query.is('github_vector_embeddings', null);
     }
     
-    // Add limit if specified
-    if (limit) {
-      const limitNum = parseInt(limit, 10);
-      if (!isNaN(limitNum) && limitNum > 0) {
-        query = query.limit(limitNum);
+    const limitNum = limit ? parseInt(limit, 10) : NaN;
+    const hasLimit = !isNaN(limitNum) && limitNum > 0;
+
+    // Keyset pagination: page through by id so each page is an index range scan
+    if (paginated) {
+      query = query.order('id', { ascending: !descending });
+      if (afterId !== null && !isNaN(afterId)) {
+        query = descending ? query.lt('id', afterId) : query.gt('id', afterId);
+      }
+      if (maxId !== null && !isNaN(maxId)) {
+        query = query.lte('id', maxId);
       }
+      query = query.limit(hasLimit ? Math.min(limitNum, pageSize) : pageSize);
+    } else if (hasLimit) {
+      // Add limit if specified
+      query = query.limit(limitNum);
     }
 
-    const { data: subscribers, error } = await query;
+    const timing = new ServerTiming();
+    const { data: subscribers, error } = await timing.time('supabase', () => query);
 
     if (error) {
       console.error('Error fetching subscribers with GitHub data:', error);
@@ -64,11 +90,19 @@ export async function GET(request: NextRequest) {
       }, { status: 500 });
     }
 
+    const rows = (subscribers || []) as Array<{ id: number }>;
+
+    // A full page means there may be more rows after the last id
+    const nextCursor = paginated && rows.length === pageSize
+      ? rows[rows.length - 1].id
+      : null;
+
     return NextResponse.json({
       success: true,
-      subscribers: subscribers || [],
-      total: subscribers?.length || 0
-    });
+      subscribers: rows,
+      total: rows.length,
+      next_cursor: nextCursor
+    }, { headers: timing.headers() });
 
   } catch (error) {
     console.error('Error in get_subscribers_with_github_data:', error);
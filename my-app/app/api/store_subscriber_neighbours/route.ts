@@ -0,0 +1,106 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { createClient, PostgrestError, SupabaseClient } from '@supabase/supabase-js';
+
+// One replace per request; the similarity engine sends neighbour lists in batches of this size
+const MAX_ROWS_PER_REQUEST = 5000;
+
+interface NeighbourRow {
+  subscriber_id: number;
+  rank: number;
+  neighbour_id: number;
+  score: number;
+}
+
+// Deletes each subscriber's ranks past the highest one in `rows`, then upserts `rows`
+async function trimAndUpsert(supabase: SupabaseClient, rows: NeighbourRow[]): Promise<PostgrestError | null> {
+  const maxRank = new Map<number, number>();
+  for (const row of rows) {
+    maxRank.set(row.subscriber_id, Math.max(row.rank, maxRank.get(row.subscriber_id) ?? 0));
+  }
+  // Usually every subscriber in a batch has the same k: one delete per distinct k
+  const byRank = new Map<number, number[]>();
+  for (const [subscriberId, rank] of maxRank) {
+    byRank.set(rank, [...(byRank.get(rank) ?? []), subscriberId]);
+  }
+  for (const [rank, subscriberIds] of byRank) {
+    const { error } = await supabase
+      .from('subscriber_github_neighbours')
+      .delete()
+      .in('subscriber_id', subscriberIds)
+      .gt('rank', rank);
+    if (error) return error;
+  }
+
+  const updatedAt = new Date().toISOString();
+  const { error } = await supabase
+    .from('subscriber_github_neighbours')
+    .upsert(rows.map(row => ({ ...row, updated_at: updatedAt })), { onConflict: 'subscriber_id,rank' });
+  return error;
+}
+
+// Bulk write-back for app/scripts/similarity_engine.py: replaces each subscriber's
+// precomputed top-k GitHub neighbours in subscriber_github_neighbours. Ranks past the
+// highest one sent for a subscriber are deleted, so a smaller k leaves nothing stale
+// (replace_subscriber_neighbours, see add_subscriber_github_neighbours.sql)
+export async function POST(request: NextRequest) {
+  try {
+    // Check for service role key in authorization header
+    const authHeader = request.headers.get('authorization');
+    if (!authHeader || !authHeader.startsWith('Bearer ')) {
+      return NextResponse.json({
+        error: 'Service role authentication required'
+      }, { status: 401 });
+    }
+
+    const supabase = createClient(
+      process.env.NEXT_PUBLIC_SUPABASE_URL!,
+      authHeader.replace('Bearer ', '')
+    );
+
+    const { neighbours } = await request.json();
+
+    if (!Array.isArray(neighbours) || neighbours.length === 0) {
+      return NextResponse.json({ error: 'neighbours must be a non-empty array' }, { status: 400 });
+    }
+
+    if (neighbours.length > MAX_ROWS_PER_REQUEST) {
+      return NextResponse.json({
+        error: `At most ${MAX_ROWS_PER_REQUEST} neighbour rows per request`
+      }, { status: 400 });
+    }
+
+    const rows = (neighbours as NeighbourRow[]).map(row => ({
+      subscriber_id: row.subscriber_id,
+      rank: row.rank,
+      neighbour_id: row.neighbour_id,
+      score: row.score
+    }));
+
+    let { error } = await supabase.rpc('replace_subscriber_neighbours', { p_rows: rows });
+    if (error?.code === 'PGRST202') {
+      // The function isn't deployed yet; trim and upsert as two statements instead
+      console.warn('replace_subscriber_neighbours not found, run add_subscriber_github_neighbours.sql');
+      error = await trimAndUpsert(supabase, rows);
+    }
+
+    if (error) {
+      console.error('Error storing subscriber neighbours:', error);
+      return NextResponse.json({
+        error: 'Failed to store subscriber neighbours',
+        details: error.message
+      }, { status: 500 });
+    }
+
+    return NextResponse.json({
+      success: true,
+      stored: rows.length
+    });
+
+  } catch (error) {
+    console.error('Error in store_subscriber_neighbours:', error);
+    return NextResponse.json({
+      error: 'Internal server error',
+      details: error instanceof Error ? error.message : String(error)
+    }, { status: 500 });
+  }
+}
@@ -5,6 +5,14 @@ interface OctokitInstance {
   request: <T>(route: string, params?: Record<string, string | number | undefined>) => Promise<{ data: T }>;
 }
 
+// repositoryOwner lookups per GraphQL query; each one costs a single rate-limit point
+const LOGIN_LOOKUP_BATCH = 100;
+
+export interface GitHubOwner {
+  login: string; // canonical casing
+  type: 'User' | 'Organization';
+}
+
 export class GitHubAPI {
   private app: App;
   private octokit: OctokitInstance | null;
@@ -347,6 +355,37 @@ export class GitHubAPI {
       return [];
     }
   }
+
+  /**
+   * Check which logins exist, 100 per GraphQL request instead of one REST call each.
+   * Maps every requested login to its owner, or null when no account has that login
+   * (deleted, renamed or never existed).
+   */
+  async lookupLogins(logins: string[]): Promise<Record<string, GitHubOwner | null>> {
+    const octokit = await this.getOctokit();
+    const owners: Record<string, GitHubOwner | null> = {};
+
+    for (let start = 0; start < logins.length; start += LOGIN_LOOKUP_BATCH) {
+      const batch = logins.slice(start, start + LOGIN_LOOKUP_BATCH);
+      const fields = batch.map((login, index) =>
+        `u${index}: repositoryOwner(login: ${JSON.stringify(login)}) { login __typename }`);
+      // Unknown logins come back as null fields plus NOT_FOUND errors, not as a failed request
+      const response = await octokit.request<{ data?: Record<string, { login: string; __typename: GitHubOwner['type'] } | null> }>(
+        'POST /graphql',
+        { query: `query { ${fields.join(' ')} }` }
+      );
+      const data = response.data.data;
+      if (!data) {
+        throw new Error('GitHub login lookup returned no data');
+      }
+      batch.forEach((login, index) => {
+        const owner = data[`u${index}`];
+        owners[login] = owner ? { login: owner.login, type: owner.__typename } : null;
+      });
+    }
+
+    return owners;
+  }
 }
 
-export default GitHubAPI;
\ No newline at end of file
+export default GitHubAPI;
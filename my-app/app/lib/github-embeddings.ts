@@ -0,0 +1,612 @@
+import { createHash } from 'crypto';
+import type { SupabaseClient } from '@supabase/supabase-js';
+
+// Shared GitHub repository embedding pipeline used by /api/github_embedding and
+// /api/batch-analyze-github-profiles
+
+export interface RepositoryGroupInput {
+  repositoryName: string;
+  repositoryFullName: string;
+  fileCount: number;
+  contributionType: string;
+  primaryLanguage?: string;
+  files: Array<{
+    filename: string;
+    content: string;
+    path: string;
+    size: number;
+  }>;
+}
+
+export interface RepositoryEmbedding {
+  repositoryName: string;
+  repositoryFullName: string;
+  contributionType: string;
+  fileCount: number;
+  embedding: number[];
+  embeddingText: string;
+  contentHash: string;
+  technologies: unknown;
+  assessment: unknown;
+  summary: string;
+}
+
+export interface GitHubEmbeddingData {
+  username?: string;
+  totalRepositories?: number;
+  analysisDate?: string;
+  contributionSummary?: unknown;
+  lastAnalyzedCommit?: string;
+  repositoryGroups?: RepositoryGroupInput[];
+}
+
+export interface TechAnalysis {
+  technologies: unknown;
+  assessment: unknown;
+  summary: string;
+}
+
+// Results a batch client has cached from earlier runs, keyed by embeddingCacheKey /
+// analysisCacheKey of the embedding text. Also the shape of `computed` in responses.
+export interface PrecomputedResults {
+  embeddings?: Record<string, number[]>;
+  analyses?: Record<string, TechAnalysis>;
+}
+
+export const EMBEDDING_MODEL = 'voyage-code-3';
+
+// Bump when the analyzeTechnologies prompt or model list changes, so cached analyses are not reused.
+// Must match TECH_ANALYSIS_PROMPT_VERSION in app/scripts/embedding_cache.py.
+export const TECH_ANALYSIS_PROMPT_VERSION = 'v1';
+
+const TECH_ANALYSIS_FALLBACK_SUMMARY = 'Unable to analyze technologies';
+
+// voyage-code-3 accepts up to 1000 inputs and 120K tokens per request
+const VOYAGE_MAX_BATCH_INPUTS = 1000;
+const VOYAGE_MAX_BATCH_TOKENS = 100000; // Headroom under the 120K limit
+const APPROX_CHARS_PER_TOKEN = 3; // Code tokenizes denser than prose
+
+// NUL-framed sha256, shared by the content hash and the cache keys
+function sha256Parts(...parts: string[]): string {
+  const hash = createHash('sha256');
+  for (const part of parts) {
+    hash.update(part, 'utf8');
+    hash.update('\0');
+  }
+  return hash.digest('hex');
+}
+
+// Bump when the inputs to createRepositoryEmbeddingText change, so every repo re-embeds
+const CONTENT_HASH_VERSION = 'v1';
+
+// Stable hash of the inputs createRepositoryEmbeddingText consumes. Must stay in sync with
+// repository_content_hash in app/scripts/content_hash.py (used by --incremental runs).
+export function repositoryContentHash(repoGroup: RepositoryGroupInput): string {
+  const field = (value: unknown) => (value === null || value === undefined ? '' : String(value));
+  const parts = [
+    CONTENT_HASH_VERSION,
+    field(repoGroup.repositoryFullName),
+    field(repoGroup.contributionType),
+    field(repoGroup.fileCount)
+  ];
+  for (const file of repoGroup.files || []) {
+    parts.push(field(file.path), field(file.content));
+  }
+
+  return sha256Parts(...parts);
+}
+
+// Content-addressed cache keys for an embedding text; must match embedding_cache.py
+export function embeddingCacheKey(embeddingText: string): string {
+  return sha256Parts(EMBEDDING_MODEL, embeddingText);
+}
+
+export function analysisCacheKey(embeddingText: string): string {
+  return sha256Parts(TECH_ANALYSIS_PROMPT_VERSION, embeddingText);
+}
+
+// Create embedding text from repository files with adaptive budgeting
+export function createRepositoryEmbeddingText(repoGroup: RepositoryGroupInput): string {
+  // Adaptive budget based on repository size
+  let repoBaseBudget;
+  if (repoGroup.fileCount <= 3) {
+    repoBaseBudget = Math.min(20000, repoGroup.fileCount * 8000); // Small repos: proportional, max 20KB
+  } else if (repoGroup.fileCount <= 10) {
+    repoBaseBudget = 50000; // Medium repos: 50KB
+  } else {
+    repoBaseBudget = 75000; // Large repos: 75KB
+  }
+  
+  // Distribute budget per file, but cap individual files
+  const budgetPerFile = Math.min(
+    Math.floor(repoBaseBudget / repoGroup.fileCount),
+    25000 // Max 25KB per individual file
+  );
+  
+
+  const embeddingParts = [
+    `Repository: ${repoGroup.repositoryFullName}`,
+    `Contribution Type: ${repoGroup.contributionType}`,
+    `Files Contributed: ${repoGroup.fileCount}`,
+    ''
+  ];
+
+  // Include actual code content from files they contributed to
+  repoGroup.files.forEach(file => {
+    embeddingParts.push(`--- File: ${file.path} ---`);
+    
+    // Apply per-file budget with smart truncation
+    let fileContent = file.content;
+    if (fileContent.length > budgetPerFile) {
+      const beginningChars = Math.floor(budgetPerFile * 0.7);
+      const endingChars = budgetPerFile - beginningChars - 50;
+      
+      fileContent = fileContent.substring(0, beginningChars) + 
+                   '\n\n... [content truncated] ...\n\n' + 
+                   fileContent.substring(fileContent.length - endingChars);
+    }
+    
+    embeddingParts.push(fileContent);
+    embeddingParts.push(''); // Separator between files
+  });
+
+  return embeddingParts.join('\n');
+}
+
+// Analyze technologies using Gemini with model cycling and rate limit handling
+export async function analyzeTechnologies(embeddingText: string, geminiApiKey: string): Promise<TechAnalysis> {
+  const modelNames = [
+    'gemini-2.5-pro',
+    'gemini-2.5-flash', 
+    'gemini-2.0-flash-001',
+    'gemini-2.5-flash-lite'
+  ];
+
+  const prompt = `Analyze this code repository content and identify:
+- Programming languages used
+- Frameworks/libraries imported 
+- Database technologies
+- Architectural patterns
+- Key packages/dependencies
+- Programming interests (what domains/problems they're solving)
+- Skill level assessment (beginner/intermediate/advanced based on code complexity, patterns used)
+- Background indicators (academic projects, professional work, personal experiments, open source contributions)
+
+Return ONLY valid JSON:
+{
+  "technologies": {
+    "languages": [],
+    "frameworks": [], 
+    "databases": [],
+    "packages": [],
+    "patterns": []
+  },
+  "assessment": {
+    "interests": [],
+    "skill_level": "",
+    "background": ""
+  },
+  "summary": ""
+}
+
+Repository content:
+${embeddingText}`;
+
+  // Try each model in sequence
+  for (const modelName of modelNames) {
+    try {
+      const response = await fetch(`https://generativelanguage.googleapis.com/v1beta/models/${modelName}:generateContent?key=${geminiApiKey}`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          contents: [{ parts: [{ text: prompt }] }],
+          generationConfig: { temperature: 0.1, maxOutputTokens: 1000 }
+        })
+      });
+
+      if (response.status === 429) continue; // Try next model
+      if (!response.ok) continue;
+
+      const result = await response.json();
+      const text = result.candidates?.[0]?.content?.parts?.[0]?.text;
+      const jsonMatch = text?.match(/\{[\s\S]*\}/);
+      
+      if (jsonMatch) {
+        return JSON.parse(jsonMatch[0]);
+      }
+    } catch {
+      continue; // Try next model
+    }
+  }
+
+  // All models failed - wait and retry once
+  await new Promise(resolve => setTimeout(resolve, 60000));
+  
+  // One final attempt
+  try {
+    const response = await fetch(`https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key=${geminiApiKey}`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        contents: [{ parts: [{ text: prompt }] }],
+        generationConfig: { temperature: 0.1, maxOutputTokens: 1000 }
+      })
+    });
+    
+    if (response.ok) {
+      const result = await response.json();
+      const text = result.candidates?.[0]?.content?.parts?.[0]?.text;
+      const jsonMatch = text?.match(/\{[\s\S]*\}/);
+      if (jsonMatch) return JSON.parse(jsonMatch[0]);
+    }
+  } catch {}
+
+  return {
+    technologies: { languages: [], frameworks: [], databases: [], packages: [], patterns: [] },
+    assessment: { interests: [], skill_level: "unknown", background: "unknown" },
+    summary: TECH_ANALYSIS_FALLBACK_SUMMARY
+  };
+}
+
+// Generate Voyage embeddings for many texts using as few requests as the batch limits allow.
+// Returns one embedding per input (null where the request for that batch failed).
+export async function generateEmbeddings(texts: string[], voyageApiKey: string): Promise<(number[] | null)[]> {
+  const embeddings: (number[] | null)[] = new Array(texts.length).fill(null);
+
+  // Pack inputs into batches under the input-count and token limits
+  const batches: number[][] = [];
+  let current: number[] = [];
+  let currentTokens = 0;
+  texts.forEach((text, index) => {
+    const tokens = Math.ceil(text.length / APPROX_CHARS_PER_TOKEN);
+    if (current.length > 0 && (current.length >= VOYAGE_MAX_BATCH_INPUTS || currentTokens + tokens > VOYAGE_MAX_BATCH_TOKENS)) {
+      batches.push(current);
+      current = [];
+      currentTokens = 0;
+    }
+    current.push(index);
+    currentTokens += tokens;
+  });
+  if (current.length > 0) batches.push(current);
+
+  for (const batch of batches) {
+    try {
+      const voyageResponse = await fetch('https://api.voyageai.com/v1/embeddings', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${voyageApiKey}`
+        },
+        body: JSON.stringify({
+          input: batch.map(index => texts[index]),
+          model: EMBEDDING_MODEL
+        })
+      });
+
+      if (!voyageResponse.ok) {
+        console.error(`Failed to generate embeddings for batch of ${batch.length}:`, await voyageResponse.text());
+        continue;
+      }
+
+      const voyageResult = await voyageResponse.json();
+      for (const item of voyageResult.data as Array<{ index: number; embedding: number[] }>) {
+        embeddings[batch[item.index]] = item.embedding;
+      }
+    } catch (embeddingError) {
+      console.error(`Error generating embeddings for batch of ${batch.length}:`, embeddingError);
+    }
+  }
+
+  return embeddings;
+}
+
+// generateEmbeddings, but texts whose vector the caller already has (precomputed) skip Voyage
+export async function resolveEmbeddings(
+  texts: string[],
+  voyageApiKey: string,
+  precomputed: PrecomputedResults = {}
+): Promise<(number[] | null)[]> {
+  const embeddings = texts.map(text => precomputed.embeddings?.[embeddingCacheKey(text)] || null);
+  const missing = embeddings.flatMap((embedding, index) => (embedding ? [] : [index]));
+  if (missing.length === 0) return embeddings;
+
+  const generated = await generateEmbeddings(missing.map(index => texts[index]), voyageApiKey);
+  missing.forEach((index, i) => {
+    embeddings[index] = generated[i];
+  });
+  return embeddings;
+}
+
+// Embeddings and analyses this request computed that were not in precomputed, for the
+// caller's cache. Fallback analyses (every Gemini model failed) are left out.
+export function collectComputedResults(
+  repositoryEmbeddings: RepositoryEmbedding[],
+  precomputed: PrecomputedResults = {}
+): PrecomputedResults {
+  const computed: Required<PrecomputedResults> = { embeddings: {}, analyses: {} };
+  for (const repoEmbedding of repositoryEmbeddings) {
+    const embeddingKey = embeddingCacheKey(repoEmbedding.embeddingText);
+    if (!precomputed.embeddings?.[embeddingKey]) {
+      computed.embeddings[embeddingKey] = repoEmbedding.embedding;
+    }
+    const analysisKey = analysisCacheKey(repoEmbedding.embeddingText);
+    if (!precomputed.analyses?.[analysisKey] && repoEmbedding.summary !== TECH_ANALYSIS_FALLBACK_SUMMARY) {
+      computed.analyses[analysisKey] = {
+        technologies: repoEmbedding.technologies,
+        assessment: repoEmbedding.assessment,
+        summary: repoEmbedding.summary
+      };
+    }
+  }
+  return computed;
+}
+
+// Turn repository groups plus their (pre-computed) vectors into embedding records
+export async function buildRepositoryEmbeddings(
+  repoGroups: RepositoryGroupInput[],
+  embeddingTexts: string[],
+  embeddings: (number[] | null)[],
+  geminiApiKey: string,
+  precomputed: PrecomputedResults = {}
+): Promise<RepositoryEmbedding[]> {
+  const repositoryEmbeddings: RepositoryEmbedding[] = [];
+
+  for (let i = 0; i < repoGroups.length; i++) {
+    const repoGroup = repoGroups[i];
+    const embedding = embeddings[i];
+    if (!embedding) continue;
+
+    // Analyze technologies using the same content, unless the caller already has the analysis
+    const techAnalysis = precomputed.analyses?.[analysisCacheKey(embeddingTexts[i])]
+      || await analyzeTechnologies(embeddingTexts[i], geminiApiKey);
+
+    repositoryEmbeddings.push({
+      repositoryName: repoGroup.repositoryName,
+      repositoryFullName: repoGroup.repositoryFullName,
+      contributionType: repoGroup.contributionType,
+      fileCount: repoGroup.fileCount,
+      embedding,
+      embeddingText: embeddingTexts[i],
+      contentHash: repositoryContentHash(repoGroup),
+      technologies: techAnalysis.technologies,
+      assessment: techAnalysis.assessment,
+      summary: techAnalysis.summary
+    });
+  }
+
+  return repositoryEmbeddings;
+}
+
+// Row and metadata shapes written for a subscriber's repository embeddings
+function repositoryEmbeddingRow(
+  subscriberId: number,
+  data: GitHubEmbeddingData,
+  repoEmbedding: RepositoryEmbedding,
+  updatedAt: string
+) {
+  return {
+    subscriber_id: subscriberId,
+    repository_name: repoEmbedding.repositoryFullName, // Use full path
+    contribution_type: repoEmbedding.contributionType,
+    file_count: repoEmbedding.fileCount,
+    embedding: repoEmbedding.embedding,
+    embedding_text: repoEmbedding.embeddingText,
+    content_hash: repoEmbedding.contentHash,
+    technologies: repoEmbedding.technologies,
+    assessment: repoEmbedding.assessment,
+    summary: repoEmbedding.summary,
+    last_analyzed_commit: data.lastAnalyzedCommit, // From analyzer
+    updated_at: updatedAt
+  };
+}
+
+function embeddingMetadata(data: GitHubEmbeddingData, totalRepositoryGroups: number) {
+  return {
+    username: data.username,
+    totalRepositories: data.totalRepositories,
+    totalRepositoryGroups,
+    analysisDate: data.analysisDate,
+    contributionSummary: data.contributionSummary
+  };
+}
+
+// Write-back batching; the batch endpoint lets callers override the first two per chunk
+export const DEFAULT_WRITE_BATCH_ROWS = 200;
+export const DEFAULT_WRITE_FLUSH_MS = 500;
+const WRITE_MAX_ATTEMPTS = 3;
+const WRITE_RETRY_DELAY_MS = 500; // Doubles per attempt
+
+export interface EmbeddingWriterOptions {
+  maxRows?: number; // rows per upsert; a flush starts as soon as this many are buffered
+  maxWaitMs?: number; // longest a buffered row waits for more rows to join its batch
+  maxAttempts?: number; // attempts per batch before its subscribers fail
+}
+
+interface PendingWrite {
+  subscriberId: number;
+  rows: ReturnType<typeof repositoryEmbeddingRow>[];
+  metadata: ReturnType<typeof embeddingMetadata>;
+  resolve: () => void;
+  reject: (error: Error) => void;
+}
+
+// Buffers repository embeddings across subscribers and writes them back as multi-row
+// upserts, plus one embedding_metadata update per flush (store_embedding_metadata, see
+// add_bulk_embedding_metadata.sql). A flush happens when maxRows rows are buffered or
+// maxWaitMs after the first buffered row, whichever comes first. A batch that still
+// fails after maxAttempts fails only the subscribers with rows in it.
+export class RepositoryEmbeddingWriter {
+  readonly stats = { batches: 0, rows: 0, retries: 0, failedBatches: 0 };
+
+  private readonly maxRows: number;
+  private readonly maxWaitMs: number;
+  private readonly maxAttempts: number;
+  private pending: PendingWrite[] = [];
+  private pendingRows = 0;
+  private timer: ReturnType<typeof setTimeout> | null = null;
+  private flushing: Promise<void> = Promise.resolve();
+  private bulkMetadata = true;
+
+  constructor(private readonly supabase: SupabaseClient, options: EmbeddingWriterOptions = {}) {
+    this.maxRows = Math.max(1, Math.floor(options.maxRows ?? DEFAULT_WRITE_BATCH_ROWS));
+    this.maxWaitMs = Math.max(0, options.maxWaitMs ?? DEFAULT_WRITE_FLUSH_MS);
+    this.maxAttempts = Math.max(1, Math.floor(options.maxAttempts ?? WRITE_MAX_ATTEMPTS));
+  }
+
+  // Queue a subscriber's embeddings; resolves once its rows and metadata are stored.
+  // unchangedRepositoryCount covers repos an incremental run skipped because their hash matched.
+  add(
+    subscriberId: number,
+    data: GitHubEmbeddingData,
+    repositoryEmbeddings: RepositoryEmbedding[],
+    unchangedRepositoryCount = 0
+  ): Promise<void> {
+    return new Promise((resolve, reject) => {
+      const updatedAt = new Date().toISOString();
+      this.pending.push({
+        subscriberId,
+        rows: repositoryEmbeddings.map(repoEmbedding => repositoryEmbeddingRow(subscriberId, data, repoEmbedding, updatedAt)),
+        metadata: embeddingMetadata(data, repositoryEmbeddings.length + unchangedRepositoryCount),
+        resolve,
+        reject
+      });
+      this.pendingRows += repositoryEmbeddings.length;
+
+      if (this.pendingRows >= this.maxRows) {
+        void this.flush();
+      } else if (!this.timer) {
+        this.timer = setTimeout(() => void this.flush(), this.maxWaitMs);
+      }
+    });
+  }
+
+  // Write everything buffered so far. Flushes run one after another, so a
+  // subscriber's newer rows never land before its older ones.
+  flush(): Promise<void> {
+    if (this.timer) {
+      clearTimeout(this.timer);
+      this.timer = null;
+    }
+    const writes = this.pending;
+    this.pending = [];
+    this.pendingRows = 0;
+    this.flushing = this.flushing.then(() => this.write(writes));
+    return this.flushing;
+  }
+
+  private async write(writes: PendingWrite[]): Promise<void> {
+    if (writes.length === 0) return;
+
+    // Postgres rejects an upsert that touches the same row twice, so the latest row wins;
+    // every write that contributed to the key shares its outcome
+    const latest = new Map<string, { row: PendingWrite['rows'][number]; writes: PendingWrite[] }>();
+    for (const write of writes) {
+      for (const row of write.rows) {
+        const key = `${row.subscriber_id}/${row.repository_name}`;
+        const entry = latest.get(key);
+        if (entry) {
+          entry.row = row;
+          entry.writes.push(write);
+        } else {
+          latest.set(key, { row, writes: [write] });
+        }
+      }
+    }
+    const entries = [...latest.values()];
+
+    const failed = new Map<PendingWrite, Error>();
+    for (let start = 0; start < entries.length; start += this.maxRows) {
+      const batch = entries.slice(start, start + this.maxRows);
+      try {
+        await this.withRetries(async () => {
+          const { error } = await this.supabase
+            .from('github_repository_embeddings')
+            .upsert(batch.map(entry => entry.row), { onConflict: 'subscriber_id,repository_name' });
+          if (error) throw new Error(error.message);
+        });
+        this.stats.batches++;
+        this.stats.rows += batch.length;
+      } catch (error) {
+        console.error(`Failed to upsert ${batch.length} repository embeddings:`, error);
+        this.stats.failedBatches++;
+        for (const entry of batch) {
+          for (const write of entry.writes) {
+            failed.set(write, error instanceof Error ? error : new Error(String(error)));
+          }
+        }
+      }
+    }
+
+    const stored = writes.filter(write => !failed.has(write));
+    if (stored.length > 0) {
+      try {
+        await this.writeMetadata(stored);
+      } catch (error) {
+        console.error('Failed to update metadata:', error);
+        // Don't fail the request for metadata errors
+      }
+    }
+
+    for (const write of writes) {
+      const error = failed.get(write);
+      if (error) {
+        write.reject(error);
+      } else {
+        write.resolve();
+      }
+    }
+  }
+
+  private async writeMetadata(writes: PendingWrite[]): Promise<void> {
+    const metadata = new Map<number, PendingWrite['metadata']>();
+    for (const write of writes) {
+      metadata.set(write.subscriberId, write.metadata);
+    }
+
+    if (this.bulkMetadata && metadata.size > 1) {
+      const { error } = await this.supabase.rpc('store_embedding_metadata', {
+        p_rows: [...metadata].map(([id, value]) => ({ id, metadata: value }))
+      });
+      if (!error) return;
+      if (error.code !== 'PGRST202') throw new Error(error.message);
+      // The function isn't deployed yet; fall back to one update per subscriber
+      console.warn('store_embedding_metadata not found, run add_bulk_embedding_metadata.sql');
+      this.bulkMetadata = false;
+    }
+
+    await Promise.all([...metadata].map(([id, value]) => this.withRetries(async () => {
+      const { error } = await this.supabase
+        .from('subscribers')
+        .update({ embedding_metadata: value })
+        .eq('id', id);
+      if (error) throw new Error(error.message);
+    })));
+  }
+
+  private async withRetries(operation: () => Promise<void>): Promise<void> {
+    for (let attempt = 1; ; attempt++) {
+      try {
+        return await operation();
+      } catch (error) {
+        if (attempt >= this.maxAttempts) throw error;
+        this.stats.retries++;
+        await new Promise(resolve => setTimeout(resolve, WRITE_RETRY_DELAY_MS * 2 ** (attempt - 1)));
+      }
+    }
+  }
+}
+
+// Persist one subscriber's repository embeddings (one multi-row upsert) and metadata.
+// Throws if the embeddings could not be stored.
+export async function storeRepositoryEmbeddings(
+  supabase: SupabaseClient,
+  subscriberId: number,
+  data: GitHubEmbeddingData,
+  repositoryEmbeddings: RepositoryEmbedding[],
+  unchangedRepositoryCount = 0
+): Promise<void> {
+  const writer = new RepositoryEmbeddingWriter(supabase, { maxRows: Math.max(1, repositoryEmbeddings.length) });
+  const stored = writer.add(subscriberId, data, repositoryEmbeddings, unchangedRepositoryCount);
+  await writer.flush();
+  await stored;
+}
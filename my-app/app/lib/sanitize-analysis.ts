@@ -0,0 +1,31 @@
+import type { GitHubProfileAnalysis } from '../types/github-analysis';
+
+// JSON-like type used for sanitized analysis payloads
+type JSONPrimitive = string | number | boolean | null;
+type JSONArray = JSONValue[];
+type JSONObject = { [key: string]: JSONValue };
+type JSONValue = JSONPrimitive | JSONArray | JSONObject | GitHubProfileAnalysis;
+
+// Helper function to sanitize data by removing null bytes and problematic characters
+export function sanitizeAnalysisData(obj: JSONValue): JSONValue {
+  if (typeof obj === 'string') {
+    // Remove null bytes and other problematic Unicode characters
+    return obj
+      .replace(/\u0000/g, '')
+      .replace(/[\u0001-\u0008\u000B\u000C\u000E-\u001F\u007F]/g, '');
+  }
+
+  if (Array.isArray(obj)) {
+    return (obj as JSONArray).map(sanitizeAnalysisData);
+  }
+
+  if (obj !== null && typeof obj === 'object') {
+    const cleaned: JSONObject = {};
+    for (const [key, value] of Object.entries(obj as JSONObject)) {
+      cleaned[key] = sanitizeAnalysisData(value);
+    }
+    return cleaned;
+  }
+
+  return obj;
+}
@@ -0,0 +1,23 @@
+// Server-Timing header for API routes, so batch clients can split a request's latency
+// by upstream (github, voyage, gemini, supabase) instead of only seeing the total.
+export class ServerTiming {
+  private durations = new Map<string, number>();
+
+  // Run fn and add its duration (ms) to the named metric
+  async time<T>(name: string, fn: () => PromiseLike<T>): Promise<T> {
+    const started = performance.now();
+    try {
+      return await fn();
+    } finally {
+      this.durations.set(name, (this.durations.get(name) ?? 0) + performance.now() - started);
+    }
+  }
+
+  headers(): Record<string, string> {
+    if (this.durations.size === 0) return {};
+    const value = Array.from(this.durations.entries())
+      .map(([name, ms]) => `${name};dur=${ms.toFixed(1)}`)
+      .join(', ');
+    return { 'Server-Timing': value };
+  }
+}
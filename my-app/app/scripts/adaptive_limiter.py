@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Adaptive Concurrency Limiter
+============================
+
+AIMD (additive-increase / multiplicative-decrease) concurrency control for the
+batch scripts, replacing the fixed `asyncio.Semaphore(max_concurrent)`.
+
+- Every healthy response grows the limit by 1/limit (about +1 per round trip).
+- A 429, 5xx or network error halves it (at most once per cooldown window).
+- Responses much slower than the best latency seen so far hold growth.
+- Each upstream has a token bucket; `Retry-After` pauses that bucket and a 429
+  also lowers its refill rate. Without `rate_per_second` (the scripts'
+  `--rate-limit`) there is no rate pacing: the bucket only honours Retry-After
+  pauses, and the concurrency limit is the only brake.
+
+`summary()` exposes the current limit and throttle events for `print_summary`.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP date) into seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    def __init__(self, rate: Optional[float] = None, capacity: Optional[float] = None, min_rate: float = 0.1):
+        self.rate = rate  # tokens per second; None means no rate cap
+        self.capacity = capacity or (rate or 1.0)
+        self.min_rate = min_rate
+        self.tokens = self.capacity
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def slow_down(self, factor: float):
+        if self.rate:
+            self.rate = max(self.min_rate, self.rate * factor)
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            if self.rate is None:
+                return
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class LimiterSlot:
+    """Handle for one in-flight request; call `record()` with the outcome."""
+
+    def __init__(self, limiter: 'AdaptiveLimiter', upstream: str):
+        self.limiter = limiter
+        self.upstream = upstream
+        self.started = time.monotonic()
+
+    def record(self, status: Optional[int] = None, retry_after: Optional[str] = None, exception: bool = False):
+        self.limiter.record(self.upstream, status, time.monotonic() - self.started, retry_after, exception)
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial_limit: int = 5, min_limit: int = 1, max_limit: int = 20,
+                 decrease_factor: float = 0.5, rate_per_second: Optional[float] = None,
+                 latency_tolerance: float = 3.0, cooldown: float = 1.0):
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.rate_per_second = rate_per_second
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.peak_limit = self.limit
+        self.lowest_limit = self.limit
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.upstream_stats: Dict[str, Dict] = {}
+        self.throttle_events: List[Dict] = []
+        self._best_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._started = time.monotonic()
+        self._cond: Optional[asyncio.Condition] = None
+
+    def _bucket(self, upstream: str) -> TokenBucket:
+        if upstream not in self.buckets:
+            self.buckets[upstream] = TokenBucket(self.rate_per_second)
+            self.upstream_stats[upstream] = {"requests": 0, "throttled": 0, "latency_total": 0.0}
+        return self.buckets[upstream]
+
+    @asynccontextmanager
+    async def slot(self, upstream: str):
+        """Wait for a concurrency slot and a token for `upstream`."""
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            await self._bucket(upstream).acquire()
+            yield LimiterSlot(self, upstream)
+        finally:
+            # Releasing also wakes waiters after record() has grown the limit
+            async with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def record(self, upstream: str, status: Optional[int], latency: float,
+               retry_after: Optional[str] = None, exception: bool = False):
+        """Feed one response back into the controller."""
+        bucket = self._bucket(upstream)
+        stats = self.upstream_stats[upstream]
+        stats["requests"] += 1
+        stats["latency_total"] += latency
+
+        if exception:
+            reason = "network"
+        elif status == 429:
+            reason = "429"
+        elif status is not None and status >= 500:
+            reason = "5xx"
+        else:
+            reason = None
+
+        if reason:
+            stats["throttled"] += 1
+            delay = parse_retry_after(retry_after)
+            if delay:
+                bucket.pause(delay)
+            if reason == "429":
+                bucket.slow_down(self.decrease_factor)
+            self._decrease(upstream, reason, delay)
+            return
+
+        if status is None:
+            return  # No upstream call was made (dry run, skipped)
+
+        if self._best_latency is None or latency < self._best_latency:
+            self._best_latency = latency
+        if latency <= self._best_latency * self.latency_tolerance:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self.peak_limit = max(self.peak_limit, self.limit)
+
+    def _decrease(self, upstream: str, reason: str, retry_after: Optional[float]):
+        now = time.monotonic()
+        # One decrease per cooldown window, so a burst of failures from the same
+        # congestion episode doesn't collapse the limit to the floor
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        self.lowest_limit = min(self.lowest_limit, self.limit)
+        self.throttle_events.append({
+            "at": round(now - self._started, 2),
+            "upstream": upstream,
+            "reason": reason,
+            "retry_after": retry_after,
+            "new_limit": int(self.limit)
+        })
+
+    def summary(self) -> Dict:
+        reasons: Dict[str, int] = {}
+        for event in self.throttle_events:
+            reasons[event["reason"]] = reasons.get(event["reason"], 0) + 1
+        return {
+            "current_limit": int(self.limit),
+            "peak_limit": int(self.peak_limit),
+            "lowest_limit": int(self.lowest_limit),
+            "throttle_events": len(self.throttle_events),
+            "throttle_reasons": reasons,
+            "upstreams": {
+                name: {
+                    "requests": stats["requests"],
+                    "throttled": stats["throttled"],
+                    "avg_latency": round(stats["latency_total"] / stats["requests"], 3) if stats["requests"] else 0,
+                    "rate_per_second": self.buckets[name].rate
+                }
+                for name, stats in self.upstream_stats.items()
+            }
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"🚦 Concurrency: final limit {summary['current_limit']} "
+              f"(peak {summary['peak_limit']}, low {summary['lowest_limit']}, ceiling {self.max_limit})")
+        if summary["throttle_events"]:
+            reasons = ", ".join(f"{reason}: {count}" for reason, count in summary["throttle_reasons"].items())
+            print(f"  - Throttle events: {summary['throttle_events']} ({reasons})")
+        for name, stats in summary["upstreams"].items():
+            print(f"  - {name}: {stats['requests']} requests, {stats['throttled']} throttled, "
+                  f"avg latency {stats['avg_latency']}s")
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Approximate Nearest-Neighbour Index
+===================================
+
+IVF (inverted file) index over the exported embeddings (see
+`similarity_engine.py export`). Spherical k-means splits the normalised
+vectors into `nlist` cells; a query scores only the vectors in its `nprobe`
+closest cells instead of every vector. That makes lookup cost roughly
+`nprobe / nlist` of exact search.
+
+Two indexes are built from an export:
+    subscribers.ivf.npz    one vector per subscriber        (user -> user)
+    repositories.ivf.npz   one vector per repository, owned  (repo -> user)
+                           by its subscriber
+
+`update` inserts new or changed vectors from a fresh export without
+retraining. `benchmark` reports recall@k and latency against exact search
+for a grid of nlist/nprobe so parameters can be picked from data.
+
+Usage:
+    python app/scripts/ann_index.py build [--nlist N]
+    python app/scripts/ann_index.py update
+    python app/scripts/ann_index.py query --subscriber-id 123 [--top-k 10] [--nprobe 8]
+    python app/scripts/ann_index.py query --repository owner/name [--top-k 10]
+    python app/scripts/ann_index.py benchmark [--nlist 64,256] [--nprobe 1,4,16]
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from similarity_engine import DEFAULT_EXPORT_DIR, EmbeddingExport, normalize_rows, top_k
+
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 20
+KMEANS_SAMPLE = 50000  # Train centroids on at most this many vectors
+SUBSCRIBER_INDEX = 'subscribers.ivf.npz'
+REPOSITORY_INDEX = 'repositories.ivf.npz'
+
+
+def default_nlist(count: int) -> int:
+    """Roughly sqrt(N) cells, the usual IVF starting point."""
+    return max(1, min(4096, int(np.sqrt(max(count, 1)))))
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iterations: int = KMEANS_ITERATIONS,
+                    seed: int = 0) -> np.ndarray:
+    """Spherical k-means: centroids are renormalised so assignment is by cosine."""
+    rng = np.random.default_rng(seed)
+    if vectors.shape[0] > KMEANS_SAMPLE:
+        vectors = vectors[np.sort(rng.choice(vectors.shape[0], KMEANS_SAMPLE, replace=False))]
+    vectors = np.asarray(vectors, dtype=np.float32)
+    nlist = min(nlist, vectors.shape[0])
+    centroids = vectors[rng.choice(vectors.shape[0], nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=nlist)
+        # Re-seed empty cells from random vectors so no cell goes unused
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(vectors.shape[0], int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+    assignments = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], chunk_size):
+        block = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+        assignments[start:start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+class IVFIndex:
+    def __init__(self, centroids: np.ndarray, trained_size: int = 0):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.dim = self.centroids.shape[1]
+        self.trained_size = trained_size
+        self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.owners = np.zeros(0, dtype=np.int64)  # subscriber id each vector belongs to
+        self.keys: List[str] = []
+        self.live = np.zeros(0, dtype=bool)  # False once a key has been replaced
+        self._positions: Dict[str, int] = {}
+        self._lists: Optional[List[np.ndarray]] = None
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, nlist: int, seed: int = 0) -> 'IVFIndex':
+        return cls(train_centroids(vectors, nlist, seed=seed), trained_size=vectors.shape[0])
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    def __len__(self) -> int:
+        return int(self.live.sum())
+
+    def add(self, keys: Sequence[str], owners: Sequence[int], vectors: np.ndarray):
+        """Insert vectors (normalised here); a key already in the index is replaced."""
+        vectors = normalize_rows(np.array(vectors, dtype=np.float32))
+        for key in keys:
+            position = self._positions.get(key)
+            if position is not None:
+                self.live[position] = False
+        start = len(self.keys)
+        self.vectors = np.vstack([self.vectors, vectors])
+        self.assignments = np.concatenate([self.assignments, _assign(vectors, self.centroids)])
+        self.owners = np.concatenate([self.owners, np.asarray(owners, dtype=np.int64)])
+        self.live = np.concatenate([self.live, np.ones(len(keys), dtype=bool)])
+        for offset, key in enumerate(keys):
+            self.keys.append(key)
+            self._positions[key] = start + offset
+        self._lists = None
+
+    def vector(self, key: str) -> Optional[np.ndarray]:
+        position = self._positions.get(key)
+        return None if position is None else self.vectors[position]
+
+    def _inverted_lists(self) -> List[np.ndarray]:
+        if self._lists is None:
+            live_rows = np.flatnonzero(self.live)
+            order = live_rows[np.argsort(self.assignments[live_rows], kind='stable')]
+            bounds = np.searchsorted(self.assignments[order], np.arange(self.nlist + 1))
+            self._lists = [order[bounds[cell]:bounds[cell + 1]] for cell in range(self.nlist)]
+        return self._lists
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = DEFAULT_NPROBE,
+               exclude_owner: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k vector positions and cosine scores for one query vector."""
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        lists = self._inverted_lists()
+        nprobe = min(nprobe, self.nlist)
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        candidates = np.concatenate([lists[cell] for cell in probes])
+        if exclude_owner is not None:
+            candidates = candidates[self.owners[candidates] != exclude_owner]
+        if candidates.size == 0:
+            return candidates, np.zeros(0, dtype=np.float32)
+        scores = self.vectors[candidates] @ query
+        k = min(k, candidates.size)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return candidates[best], scores[best]
+
+    def search_owners(self, query: np.ndarray, k: int, nprobe: int = DEFAULT_NPROBE,
+                      exclude_owner: Optional[int] = None, oversample: int = 4) -> List[Tuple[int, float]]:
+        """Top-k subscribers by their best-matching vector (repo -> user)."""
+        positions, scores = self.search(query, k * oversample, nprobe, exclude_owner)
+        best: Dict[int, float] = {}
+        for owner, score in zip(self.owners[positions], scores):
+            owner = int(owner)
+            if owner not in best:  # results are sorted, so the first hit is the owner's best
+                best[owner] = float(score)
+        return list(best.items())[:k]
+
+    def save(self, path: str):
+        """Write a compacted copy (replaced vectors dropped) to `path`."""
+        live = self.live
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, vectors=self.vectors[live],
+                 assignments=self.assignments[live], owners=self.owners[live],
+                 keys=np.asarray(self.keys, dtype=object)[live].astype(str),
+                 trained_size=np.int64(self.trained_size))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'IVFIndex':
+        with np.load(path) as data:
+            index = cls(data['centroids'], int(data['trained_size']))
+            index.vectors = data['vectors']
+            index.assignments = data['assignments']
+            index.owners = data['owners']
+            index.keys = data['keys'].tolist()
+        index.live = np.ones(len(index.keys), dtype=bool)
+        index._positions = {key: position for position, key in enumerate(index.keys)}
+        return index
+
+
+def repository_key(subscriber_id: int, repository_name: str) -> str:
+    return f"{subscriber_id}:{repository_name}"
+
+
+def _export_items(export: EmbeddingExport, kind: str) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    if kind == 'subscribers':
+        keys = [str(subscriber_id) for subscriber_id in export.subscriber_ids]
+        return keys, np.asarray(export.subscriber_ids, dtype=np.int64), export.subscriber_vectors
+    keys = [repository_key(subscriber_id, name) for subscriber_id, name in export.repository_rows]
+    owners = np.asarray([subscriber_id for subscriber_id, _ in export.repository_rows], dtype=np.int64)
+    return keys, owners, export.repository_vectors
+
+
+def build_indexes(export: EmbeddingExport, nlist: Optional[int] = None) -> Dict[str, IVFIndex]:
+    indexes = {}
+    for kind in ('subscribers', 'repositories'):
+        keys, owners, vectors = _export_items(export, kind)
+        index = IVFIndex.train(vectors, nlist or default_nlist(len(keys)))
+        index.add(keys, owners, vectors)
+        indexes[kind] = index
+    return indexes
+
+
+def update_index(index: IVFIndex, keys: List[str], owners: np.ndarray, vectors: np.ndarray) -> int:
+    """Insert export rows that are new or whose vector changed; returns how many were inserted."""
+    changed = []
+    for position, key in enumerate(keys):
+        existing = index.vector(key)
+        if existing is None or not np.allclose(existing, vectors[position], atol=1e-6):
+            changed.append(position)
+    if changed:
+        index.add([keys[position] for position in changed], owners[changed], vectors[changed])
+    return len(changed)
+
+
+def benchmark(export: EmbeddingExport, kind: str, nlists: Sequence[int], nprobes: Sequence[int],
+              k: int = 10, queries: int = 200, seed: int = 0) -> List[Dict]:
+    """Recall@k and per-query latency of IVF search against exact search."""
+    keys, owners, vectors = _export_items(export, kind)
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(len(keys), min(queries, len(keys)), replace=False))
+    query_vectors = np.asarray(vectors[sample], dtype=np.float32)
+
+    exact = np.vstack([indices for _, indices, _ in top_k(query_vectors, vectors, k, exclude_rows=sample)])
+    # Exact latency is measured one query at a time, like the IVF lookups below
+    exact_latencies = []
+    for row, query in zip(sample, query_vectors):
+        started = time.perf_counter()
+        for _ in top_k(query[None, :], vectors, k, exclude_rows=np.array([row])):
+            pass
+        exact_latencies.append((time.perf_counter() - started) * 1000)
+    exact_ms = float(np.percentile(exact_latencies, 50))
+
+    results = []
+    for nlist in nlists:
+        started = time.perf_counter()
+        index = IVFIndex.train(vectors, nlist, seed=seed)
+        index.add(keys, owners, vectors)
+        build_seconds = time.perf_counter() - started
+        for nprobe in nprobes:
+            if nprobe > index.nlist:
+                continue
+            hits, latencies = 0, []
+            for row, query in zip(sample, query_vectors):
+                started = time.perf_counter()
+                positions, _ = index.search(query, k + 1, nprobe)
+                latencies.append((time.perf_counter() - started) * 1000)
+                found = set(positions[positions != row][:k].tolist())
+                expected = exact[len(latencies) - 1]
+                hits += len(found.intersection(expected.tolist()))
+            results.append({
+                "kind": kind,
+                "nlist": index.nlist,
+                "nprobe": nprobe,
+                "recall": hits / (len(sample) * exact.shape[1]),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p95_ms": float(np.percentile(latencies, 95)),
+                "exact_ms": exact_ms,
+                "build_seconds": build_seconds
+            })
+    return results
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(',') if part.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF approximate nearest-neighbour index over exported embeddings")
+    parser.add_argument("--out-dir", default=DEFAULT_EXPORT_DIR, help="Export directory (indexes are saved alongside)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Train and build both indexes from the export")
+    build_parser.add_argument("--nlist", type=int, help="Cells per index (default: sqrt of the vector count)")
+
+    subparsers.add_parser("update", help="Insert new or changed vectors from a fresh export without retraining")
+
+    query_parser = subparsers.add_parser("query", help="Nearest subscribers to a subscriber or a repository")
+    target = query_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--subscriber-id", type=int, help="User -> user lookup")
+    target.add_argument("--repository", metavar="OWNER/NAME", help="Repo -> user lookup (with --owner-id)")
+    query_parser.add_argument("--owner-id", type=int, help="Subscriber who owns --repository (required for repo lookups)")
+    query_parser.add_argument("--top-k", type=int, default=10, help="Subscribers to return")
+    query_parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE, help="Cells to search")
+
+    bench_parser = subparsers.add_parser("benchmark", help="Recall/latency of IVF against exact search")
+    bench_parser.add_argument("--kind", choices=["subscribers", "repositories"], default="subscribers")
+    bench_parser.add_argument("--nlist", type=_int_list, help="Comma-separated cell counts (default: sqrt(N)/2, sqrt(N), 2*sqrt(N))")
+    bench_parser.add_argument("--nprobe", type=_int_list, default=[1, 2, 4, 8, 16, 32], help="Comma-separated probe counts")
+    bench_parser.add_argument("--top-k", type=int, default=10, help="k for recall@k")
+    bench_parser.add_argument("--queries", type=int, default=200, help="Sampled query vectors")
+
+    args = parser.parse_args()
+    paths = {
+        'subscribers': os.path.join(args.out_dir, SUBSCRIBER_INDEX),
+        'repositories': os.path.join(args.out_dir, REPOSITORY_INDEX)
+    }
+
+    try:
+        if args.command == "build":
+            export = EmbeddingExport.load(args.out_dir)
+            started = time.monotonic()
+            for kind, index in build_indexes(export, args.nlist).items():
+                index.save(paths[kind])
+                print(f"✅ {kind}: {len(index)} vectors in {index.nlist} cells -> {paths[kind]}")
+            print(f"🕐 Built in {time.monotonic() - started:.1f}s")
+
+        elif args.command == "update":
+            export = EmbeddingExport.load(args.out_dir)
+            for kind, path in paths.items():
+                index = IVFIndex.load(path)
+                keys, owners, vectors = _export_items(export, kind)
+                inserted = update_index(index, keys, owners, vectors)
+                index.save(path)
+                print(f"✅ {kind}: inserted {inserted} new/changed vectors ({len(index)} total)")
+                if len(index) > 4 * index.trained_size:
+                    print(f"   ⚠️ Index has grown {len(index) / max(index.trained_size, 1):.1f}x since training; "
+                          f"run build to retrain the cells")
+
+        elif args.command == "query":
+            if args.subscriber_id is not None:
+                index = IVFIndex.load(paths['subscribers'])
+                query = index.vector(str(args.subscriber_id))
+                label = f"subscriber {args.subscriber_id}"
+                exclude = args.subscriber_id
+            else:
+                if args.owner_id is None:
+                    print("❌ --owner-id is required with --repository")
+                    sys.exit(1)
+                index = IVFIndex.load(paths['repositories'])
+                query = index.vector(repository_key(args.owner_id, args.repository))
+                label = f"repository {args.repository}"
+                exclude = args.owner_id
+            if query is None:
+                print(f"❌ {label} is not in the index")
+                sys.exit(1)
+
+            started = time.perf_counter()
+            matches = index.search_owners(query, args.top_k, args.nprobe, exclude_owner=exclude)
+            print(f"🔍 Nearest subscribers to {label} ({(time.perf_counter() - started) * 1000:.1f}ms):")
+            for rank, (subscriber_id, score) in enumerate(matches, start=1):
+                print(f"{rank:>3}. subscriber {subscriber_id} ({score:.4f})")
+
+        elif args.command == "benchmark":
+            export = EmbeddingExport.load(args.out_dir)
+            count = len(export.subscriber_ids if args.kind == 'subscribers' else export.repository_rows)
+            base = default_nlist(count)
+            nlists = args.nlist or sorted({max(1, base // 2), base, base * 2})
+            print(f"📊 Benchmarking {args.kind} ({count} vectors, recall@{args.top_k}, {args.queries} queries)")
+            print(f"{'nlist':>6} {'nprobe':>6} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'exact p50':>9} {'build s':>8}")
+            for row in benchmark(export, args.kind, nlists, args.nprobe, args.top_k, args.queries):
+                print(f"{row['nlist']:>6} {row['nprobe']:>6} {row['recall']:>7.3f} {row['p50_ms']:>8.3f} "
+                      f"{row['p95_ms']:>8.3f} {row['exact_ms']:>9.3f} {row['build_seconds']:>8.2f}")
+
+    except KeyboardInterrupt:
+        print("\n⚠️  Process interrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Unexpected error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Batch Endpoint Client
+=====================
+
+Sends subscribers to `/api/batch-analyze-github-profiles` in chunks instead of
+one HTTP call each. The route processes a chunk with a single Supabase client
+and batched Voyage requests, and streams one NDJSON line per subscriber back
+as each finishes:
+
+    {"subscriberId": 123, "username": "octocat", "status": "success", "repositoriesAnalyzed": 4, ...}
+    {"subscriberId": 124, "username": "ghost", "status": "error", "httpStatus": 404, "error": "..."}
+
+Chunks go through the same adaptive limiter and retry policy as single calls;
+subscribers that come back with a transient failure are resent in the next
+attempt's (smaller) chunk. A 200 chunk whose lines carry a 429 or 5xx counts as
+that throttle for the limiter.
+"""
+
+import asyncio
+import json
+import aiohttp
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from adaptive_limiter import AdaptiveLimiter
+from retry_policy import RetryPolicy
+from http_transport import loads
+
+BATCH_ENDPOINT = "/api/batch-analyze-github-profiles"
+DEFAULT_CHUNK_SIZE = 10
+
+
+@dataclass
+class WriteBackSettings:
+    """How the route groups a chunk's embedding writes into multi-row upserts.
+
+    Unset fields keep the route's defaults (200 rows, 500 ms).
+    """
+    batch_rows: Optional[int] = None  # repository rows per upsert
+    flush_ms: Optional[int] = None  # longest a row waits for its batch to fill
+
+    def payload(self) -> Dict:
+        fields = {"writeBatchRows": self.batch_rows, "writeFlushMs": self.flush_ms}
+        return {key: value for key, value in fields.items() if value is not None}
+
+
+class ChunkRequestError(Exception):
+    def __init__(self, status: int, retry_after: str = None, message: str = ""):
+        super().__init__(message or f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def chunk_line_to_result(line: Dict) -> Dict:
+    """Convert one NDJSON line from the batch route into the scripts' result format."""
+    result = {
+        "subscriber_id": line.get("subscriberId"),
+        "status": line.get("status", "error"),
+        "username": line.get("username")
+    }
+    if result["status"] == "success":
+        result.update({
+            "repositories_analyzed": line.get("repositoriesAnalyzed", 0),
+            "embedding_generated": line.get("embeddingGenerated", False),
+            "repository_embeddings_generated": line.get("repositoryEmbeddingsGenerated", 0),
+            "http_status": 200
+        })
+        if line.get("computed"):
+            result["computed"] = line["computed"]  # only sent when the caller asked for returnComputed
+    elif result["status"] == "skipped":
+        result["reason"] = line.get("error")
+    else:
+        result.update({
+            "http_status": line.get("httpStatus"),
+            "error": line.get("error")
+        })
+        if line.get("retryAfter") is not None:
+            result["retry_after"] = str(line["retryAfter"])
+    return result
+
+
+def throttle_rank(status: Optional[int]) -> int:
+    """How strongly a status should slow the limiter: 429 over 5xx over anything else."""
+    if status == 429:
+        return 2
+    return 1 if status is not None and status >= 500 else 0
+
+
+async def stream_chunk(session: aiohttp.ClientSession, url: str, headers: Dict, payload: Dict) -> AsyncIterator[Dict]:
+    """POST a chunk and yield per-subscriber results as NDJSON lines arrive."""
+    async with session.post(url, json=payload, headers=headers) as response:
+        if response.status != 200:
+            raise ChunkRequestError(response.status, response.headers.get('Retry-After'))
+        async for raw_line in response.content:
+            raw_line = raw_line.strip()
+            if raw_line:
+                yield chunk_line_to_result(loads(raw_line))
+
+
+async def run_chunk(chunk: List[Dict], send: Callable[[List[Dict]], AsyncIterator[Dict]],
+                    finish: Callable[[Dict], Awaitable[None]], limiter: AdaptiveLimiter,
+                    retry_policy: RetryPolicy, upstream: str):
+    """Send a chunk, finish each subscriber as its result streams in, retry transient failures."""
+    pending = chunk
+    attempt = 0
+    while pending:
+        attempt += 1
+        outstanding = {str(subscriber.get('id')): subscriber for subscriber in pending}
+        retry: List[Dict] = []
+        retry_after = None
+        # The chunk itself comes back 200; throttling shows up in its lines, so the worst
+        # line is what the limiter hears about
+        worst_status, worst_retry_after = None, None
+
+        async with limiter.slot(upstream) as slot:
+            chunk_status, network_error = 200, False
+            try:
+                async for result in send(pending):
+                    if throttle_rank(result.get("http_status")) > throttle_rank(worst_status):
+                        worst_status, worst_retry_after = result["http_status"], result.get("retry_after")
+                    subscriber = outstanding.pop(str(result.get("subscriber_id")), None)
+                    if subscriber is None:
+                        continue
+                    if retry_policy.should_retry(result, attempt):
+                        retry.append(subscriber)
+                        retry_after = retry_after or result.get("retry_after")
+                        continue
+                    if attempt > 1:
+                        result["attempts"] = attempt
+                        if result["status"] == "success":
+                            retry_policy.record_recovery()
+                    await finish(result)
+            except ChunkRequestError as e:
+                chunk_status, retry_after = e.status, e.retry_after
+            except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+                network_error = True
+                print(f"⚠️ Chunk stream failed after {len(pending) - len(outstanding)}/{len(pending)} results: {e}")
+            if outstanding and not network_error and chunk_status == 200:
+                # A 200 stream that ends before every subscriber has a line was cut short
+                # (the route crashed, a proxy closed it); that is worth resending, not a final "HTTP 200"
+                network_error = True
+                print(f"⚠️ Chunk stream ended after {len(pending) - len(outstanding)}/{len(pending)} results")
+            if chunk_status == 200 and not network_error and worst_status is not None:
+                slot.record(worst_status, worst_retry_after)
+            else:
+                slot.record(chunk_status, retry_after, network_error)
+
+        # Subscribers the stream never reported on share the chunk-level failure
+        for subscriber in outstanding.values():
+            result = {
+                "subscriber_id": subscriber.get('id'),
+                "status": "error",
+                "http_status": None if network_error else chunk_status,
+                "retry_after": retry_after,
+                "network_error": network_error,
+                "error": "Chunk request failed" if network_error else f"HTTP {chunk_status}"
+            }
+            if retry_policy.should_retry(result, attempt):
+                retry.append(subscriber)
+            else:
+                await finish(result)
+
+        if retry:
+            delay = retry_policy.next_delay(attempt, retry_after)
+            retry_policy.record_wait(delay)
+            print(f"🔁 Resending {len(retry)} subscribers (attempt {attempt + 1}) in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        pending = retry
+
+
+async def iter_chunks(source: AsyncIterator[Dict], size: int) -> AsyncIterator[List[Dict]]:
+    """Group an async stream of subscribers into lists of `size`."""
+    chunk: List[Dict] = []
+    async for item in source:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def iter_list(items: List[Dict]) -> AsyncIterator[Dict]:
+    for item in items:
+        yield item
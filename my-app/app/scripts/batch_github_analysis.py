@@ -9,56 +9,65 @@ This script processes all subscribers with GitHub URLs to:
 3. Update their Supabase records
 
 Usage:
-    python app/scripts/batch_github_analysis.py [--dry-run] [--limit N] [--skip-existing]
+    python app/scripts/batch_github_analysis.py [--dry-run] [--limit N] [--skip-existing] [--stream [--page-size N]] [--precheck]
 """
 
 import asyncio
 import aiohttp
+import contextlib
 import json
 import argparse
 import os
 import sys
 from datetime import datetime
-from typing import List, Dict, Optional
-import re
+from typing import List, Dict, Optional, Tuple
 
 # Add the app directory to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
+from subscriber_stream import (DEFAULT_PAGE_SIZE, fetch_changed_subscribers, fetch_last_subscriber_id,
+                               fetch_latest_change, iter_subscriber_pages, run_bounded_queue)
+from run_journal import DEFAULT_JOURNAL_DIR, RunJournal
+from adaptive_limiter import AdaptiveLimiter
+from retry_policy import RetryPolicy
+from run_metrics import RunMetrics, set_current_subscriber, write_metrics_report
+from http_transport import TransportSettings, create_session, read_json
+from work_leases import (DEFAULT_LEASE_SECONDS, DEFAULT_RANGE_SIZE, RangeWorker, create_range_worker, parse_shard,
+                         worker_journal_name)
+from batch_endpoint import BATCH_ENDPOINT, WriteBackSettings, iter_chunks, iter_list, run_chunk, stream_chunk
+from username_precheck import ApiUsernameLookup, FixtureUsernameLookup, UsernamePrecheck, extract_github_username
+
 class BatchGitHubProcessor:
-    def __init__(self, base_url: str = "http://localhost:3000", dry_run: bool = False, service_role_key: str = None):
+    # analyze-github-profile is bound by the GitHub API
+    UPSTREAM = "github"
+
+    def __init__(self, base_url: str = "http://localhost:3000", dry_run: bool = False, service_role_key: str = None,
+                 journal: Optional[RunJournal] = None, retry_policy: Optional[RetryPolicy] = None,
+                 metrics: Optional[RunMetrics] = None, transport: Optional[TransportSettings] = None,
+                 work: Optional[RangeWorker] = None, write_back: Optional[WriteBackSettings] = None,
+                 precheck: Optional[UsernamePrecheck] = None):
         self.base_url = base_url
         self.dry_run = dry_run
         self.service_role_key = service_role_key
+        self.journal = journal
+        self.limiter: Optional[AdaptiveLimiter] = None
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.metrics = metrics
+        self.transport = transport
+        self.work = work
+        self.write_back = write_back or WriteBackSettings()
+        self.precheck = precheck
+        # Leader subscriber id -> other subscribers with the same handle, who share its outcome
+        self.shared: Dict[int, List[Dict]] = {}
         self.processed_count = 0
         self.error_count = 0
         self.skipped_count = 0
+        self.resumed_count = 0
         self.results = []
         
     def extract_github_username(self, github_url: str) -> Optional[str]:
         """Extract username from GitHub URL"""
-        if not github_url:
-            return None
-            
-        # Clean up the URL and extract username
-        github_url = github_url.strip()
-        
-        # Handle various GitHub URL formats
-        patterns = [
-            r'https?://github\.com/([^/\?]+)',
-            r'github\.com/([^/\?]+)',
-            r'^([^/\?]+)$'  # Just username
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, github_url, re.IGNORECASE)
-            if match:
-                username = match.group(1).strip()
-                # Filter out common non-username paths
-                if username.lower() not in ['orgs', 'organizations', 'explore', 'settings', 'notifications']:
-                    return username
-        
-        return None
+        return extract_github_username(github_url)
 
     async def get_subscribers_with_github_urls(self, session: aiohttp.ClientSession, limit: Optional[int] = None) -> List[Dict]:
         """Fetch subscribers who have GitHub URLs but might not have embeddings yet."""
@@ -74,7 +83,7 @@ class BatchGitHubProcessor:
             async with session.get(f"{self.base_url}/api/get_subscribers_with_github", 
                                  params=params, headers=headers) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = await read_json(response)
                     subscribers = data.get('subscribers', [])
                     print(f"📋 Fetched {len(subscribers)} subscribers with GitHub URLs")
                     # Log sample of what fields we have
@@ -89,7 +98,50 @@ class BatchGitHubProcessor:
             print(f"❌ Error fetching subscribers: {e}")
             return []
 
-    async def analyze_github_profile(self, session: aiohttp.ClientSession, username: str, subscriber_id: int, first_name: str = None, last_name: str = None) -> Dict:
+    def stream_subscribers_with_github_urls(self, session: aiohttp.ClientSession, limit: Optional[int] = None,
+                                            skip_existing: bool = False, page_size: int = DEFAULT_PAGE_SIZE,
+                                            after_id: Optional[int] = None, max_id: Optional[int] = None):
+        """Page through subscribers with GitHub URLs by id, without the heavy data/vector columns."""
+        params = {'include_heavy': 'false'}
+        if skip_existing:
+            params['skip_existing'] = 'true'
+        if max_id is not None:
+            params['max_id'] = max_id
+
+        headers = {}
+        if self.service_role_key:
+            headers['authorization'] = f'Bearer {self.service_role_key}'
+
+        return iter_subscriber_pages(session, f"{self.base_url}/api/get_subscribers_with_github",
+                                     headers, params=params, page_size=page_size, limit=limit, after_id=after_id)
+
+    async def last_subscriber_id(self, session: aiohttp.ClientSession) -> int:
+        """Highest subscriber id the list route returns, where sharded workers stop claiming ranges."""
+        headers = {}
+        if self.service_role_key:
+            headers['authorization'] = f'Bearer {self.service_role_key}'
+        return await fetch_last_subscriber_id(session, f"{self.base_url}/api/get_subscribers_with_github", headers,
+                                              {'include_heavy': 'false'})
+
+    async def changed_subscribers(self, session: aiohttp.ClientSession, after: Optional[Tuple[str, int]],
+                                  page_size: int = DEFAULT_PAGE_SIZE) -> List[Dict]:
+        """One page of subscribers whose GitHub inputs changed after the (changed_at, id) watermark."""
+        headers = {}
+        if self.service_role_key:
+            headers['authorization'] = f'Bearer {self.service_role_key}'
+        return await fetch_changed_subscribers(session, f"{self.base_url}/api/get_subscribers_with_github", headers,
+                                               {'include_heavy': 'false'}, page_size, after)
+
+    async def latest_change(self, session: aiohttp.ClientSession) -> Optional[Tuple[str, int]]:
+        """Watermark of the most recent change, where a new follower starts by default."""
+        headers = {}
+        if self.service_role_key:
+            headers['authorization'] = f'Bearer {self.service_role_key}'
+        return await fetch_latest_change(session, f"{self.base_url}/api/get_subscribers_with_github", headers,
+                                         {'include_heavy': 'false'})
+
+    async def analyze_github_profile(self, session: aiohttp.ClientSession, username: str, subscriber_id: int, first_name: str = None, last_name: str = None,
+                                     skip_embedding: bool = False, shared_ids: Optional[List[int]] = None) -> Dict:
         """Analyze a GitHub profile using the existing API"""
         try:
             payload = {
@@ -97,6 +149,12 @@ class BatchGitHubProcessor:
                 "store_to_user": True,
                 "id": subscriber_id
             }
+            if skip_embedding:
+                # The caller embeds separately (github_pipeline.py) and needs the stored analysis back
+                payload["skip_embedding"] = True
+            if shared_ids:
+                # The route stores the same analysis for subscribers with this handle
+                payload["shared_ids"] = shared_ids
             
             # Add name fields for better commit verification if available
             if first_name:
@@ -114,19 +172,29 @@ class BatchGitHubProcessor:
             
             async with session.post(f"{self.base_url}/api/analyze-github-profile", 
                                   json=payload, headers=headers) as response:
-                result = await response.json()
+                try:
+                    result = await read_json(response)
+                except json.JSONDecodeError:
+                    # Proxies and crashed workers return HTML error pages
+                    result = {}
                 
                 if response.status == 200 and result.get('success'):
                     return {
                         "success": True,
                         "username": username,
+                        "http_status": response.status,
                         "repositories_analyzed": len(result.get('data', {}).get('analyzedRepositories', [])),
-                        "embedding_generated": result.get('embeddingGenerated', False)
+                        "embedding_generated": result.get('embeddingGenerated', False),
+                        # Keyed by shared subscriber id (as a string, from JSON)
+                        "shared_embeddings_generated": result.get('sharedEmbeddingsGenerated') or {},
+                        "analysis_data": result.get('analysisData')
                     }
                 else:
                     return {
                         "success": False,
                         "username": username,
+                        "http_status": response.status,
+                        "retry_after": response.headers.get('Retry-After'),
                         "error": result.get('error', f'HTTP {response.status}')
                     }
                     
@@ -134,15 +202,14 @@ class BatchGitHubProcessor:
             return {
                 "success": False,
                 "username": username,
+                "network_error": True,
                 "error": str(e)
             }
 
-    async def process_subscriber(self, session: aiohttp.ClientSession, subscriber: Dict, skip_existing: bool = False) -> Dict:
-        """Process a single subscriber"""
+    def precheck_subscriber(self, subscriber: Dict, skip_existing: bool = False) -> Optional[Dict]:
+        """Return a skipped result if the subscriber needs no upstream call"""
         subscriber_id = subscriber.get('id')
-        github_url = subscriber.get('github_url', '')  # Use github_url column
-        first_name = subscriber.get('first_name', '')
-        last_name = subscriber.get('last_name', '')
+        github_url = subscriber.get('github_url', '')
         
         # Extract username from URL
         username = self.extract_github_username(github_url)
@@ -157,7 +224,6 @@ class BatchGitHubProcessor:
         
         # Skip if already has embeddings and skip_existing is True
         if skip_existing and subscriber.get('github_vector_embeddings'):
-            self.skipped_count += 1
             return {
                 "subscriber_id": subscriber_id,
                 "status": "skipped", 
@@ -165,71 +231,250 @@ class BatchGitHubProcessor:
                 "username": username
             }
         
+        return None
+
+    async def process_subscriber(self, session: aiohttp.ClientSession, subscriber: Dict, skip_existing: bool = False) -> Dict:
+        """Process a single subscriber"""
+        subscriber_id = subscriber.get('id')
+        github_url = subscriber.get('github_url', '')  # Use github_url column
+        first_name = subscriber.get('first_name', '')
+        last_name = subscriber.get('last_name', '')
+        
+        skipped = self.precheck_subscriber(subscriber, skip_existing)
+        if skipped:
+            return skipped
+        
+        # Extract username from URL (the precheck already normalized it)
+        username = subscriber.get('_username') or self.extract_github_username(github_url)
+        shared_ids = [sharer.get('id') for sharer in subscriber.get('_shared_with', [])]
+        
         # Log what name info we have for this user
         name_info = f"{first_name} {last_name}".strip() if first_name or last_name else "No name provided"
-        print(f"🔍 Processing {username} (ID: {subscriber_id}, Name: {name_info})")
+        print(f"🔍 Processing {username} (ID: {subscriber_id}, Name: {name_info})"
+              f"{f', shared with {shared_ids}' if shared_ids else ''}")
         
         # Analyze GitHub profile with name information for better commit verification
-        result = await self.analyze_github_profile(session, username, subscriber_id, first_name, last_name)
+        result = await self.analyze_github_profile(session, username, subscriber_id, first_name, last_name,
+                                                   shared_ids=shared_ids)
         
         if result.get("success"):
-            self.processed_count += 1
             return {
                 "subscriber_id": subscriber_id,
                 "status": "success",
                 "username": username,
                 "repositories_analyzed": result.get("repositories_analyzed", 0),
                 "embedding_generated": result.get("embedding_generated", False),
+                "shared_embeddings_generated": result.get("shared_embeddings_generated", {}),
+                "http_status": result.get("http_status"),
                 "dry_run": result.get("dry_run", False)
             }
         else:
-            self.error_count += 1
             return {
                 "subscriber_id": subscriber_id,
                 "status": "error",
                 "username": username,
+                "http_status": result.get("http_status"),
+                "retry_after": result.get("retry_after"),
+                "network_error": result.get("network_error", False),
                 "error": result.get("error")
             }
 
-    async def process_batch(self, limit: Optional[int] = None, skip_existing: bool = False, max_concurrent: int = 5):
+    async def handle_subscriber(self, session: aiohttp.ClientSession, subscriber: Dict, skip_existing: bool = False) -> Dict:
+        """Process a subscriber, record the result and print progress"""
+        # Already finished in an earlier attempt of this run
+        if self.journal and self.journal.is_completed(subscriber.get('id')):
+            self.resumed_count += 1
+            if self.work:
+                self.work.done(subscriber.get('id'))
+            return {"subscriber_id": subscriber.get('id'), "status": "resumed"}
+        
+        set_current_subscriber(subscriber.get('id'))
+        # The adaptive limiter gates each attempt; transient failures are retried with backoff outside it
+        result = await self.retry_policy.run(self.limiter, self.UPSTREAM,
+                                             lambda: self.process_subscriber(session, subscriber, skip_existing))
+        
+        await self.finish_subscriber(result)
+        return result
+
+    async def finish_subscriber(self, result: Dict):
+        """Record a final subscriber outcome and print progress"""
+        shared_embeddings = result.pop("shared_embeddings_generated", None) or {}
+        if result["status"] == "success":
+            self.processed_count += 1
+        elif result["status"] == "error":
+            self.error_count += 1
+        else:
+            self.skipped_count += 1
+        self.results.append(result)
+        if self.journal:
+            self.journal.record(result)
+        if self.work:
+            self.work.done(result['subscriber_id'])
+        
+        # Print progress
+        status_emoji = "✅" if result["status"] == "success" else "⏭️" if result["status"] == "skipped" else "❌"
+        print(f"{status_emoji} User {result['subscriber_id']}: {result.get('username', 'N/A')} - {result['status']}")
+        
+        if result["status"] == "error":
+            print(f"   Error: {result.get('error')}")
+        
+        # Subscribers sharing the handle get the same outcome; the route stored it for them too
+        for sharer in self.shared.pop(result['subscriber_id'], []):
+            sharer_result = dict(result, subscriber_id=sharer.get('id'), shared_from=result['subscriber_id'])
+            if str(sharer.get('id')) in shared_embeddings:
+                sharer_result["embedding_generated"] = shared_embeddings[str(sharer.get('id'))]
+            await self.finish_subscriber(sharer_result)
+
+    def send_chunk(self, session: aiohttp.ClientSession, chunk: List[Dict]):
+        """Send a chunk to the batch endpoint; yields one result per subscriber"""
+        if self.dry_run:
+            return self._dry_run_chunk(chunk)
+        
+        payload = {"subscribers": [{
+            "id": subscriber.get('id'),
+            "github_url": subscriber.get('github_url'),
+            "username": subscriber.get('_username'),
+            "first_name": subscriber.get('first_name'),
+            "last_name": subscriber.get('last_name'),
+            "sharedWith": [sharer.get('id') for sharer in subscriber.get('_shared_with', [])]
+        } for subscriber in chunk], **self.write_back.payload()}
+        headers = {"Content-Type": "application/json"}
+        if self.service_role_key:
+            headers['authorization'] = f'Bearer {self.service_role_key}'
+        return stream_chunk(session, f"{self.base_url}{BATCH_ENDPOINT}", headers, payload)
+
+    async def _dry_run_chunk(self, chunk: List[Dict]):
+        print(f"🔍 [DRY RUN] Would send chunk of {len(chunk)} subscribers to {BATCH_ENDPOINT}")
+        for subscriber in chunk:
+            yield {"subscriber_id": subscriber.get('id'), "username": self.extract_github_username(subscriber.get('github_url', '')), "status": "success", "dry_run": True}
+
+    async def handle_chunk(self, session: aiohttp.ClientSession, chunk: List[Dict], skip_existing: bool = False):
+        """Process a chunk of subscribers through the batch endpoint"""
+        to_send = []
+        for subscriber in chunk:
+            if self.journal and self.journal.is_completed(subscriber.get('id')):
+                self.resumed_count += 1
+                if self.work:
+                    self.work.done(subscriber.get('id'))
+                continue
+            skipped = self.precheck_subscriber(subscriber, skip_existing)
+            if skipped:
+                await self.finish_subscriber(skipped)
+            else:
+                to_send.append(subscriber)
+        
+        if to_send:
+            await run_chunk(to_send, lambda pending: self.send_chunk(session, pending), self.finish_subscriber,
+                            self.limiter, self.retry_policy, self.UPSTREAM)
+
+    async def precheck_window(self, session: aiohttp.ClientSession, window: List[Dict], skip_existing: bool = False) -> List[Dict]:
+        """Finish every subscriber the username precheck rules out; return one leader per live handle"""
+        candidates = []
+        for subscriber in window:
+            if self.journal and self.journal.is_completed(subscriber.get('id')):
+                self.resumed_count += 1
+                if self.work:
+                    self.work.done(subscriber.get('id'))
+                continue
+            skipped = self.precheck_subscriber(subscriber, skip_existing)
+            if skipped:
+                await self.finish_subscriber(skipped)
+            else:
+                candidates.append(subscriber)
+        
+        usernames = [self.extract_github_username(subscriber.get('github_url', '')) for subscriber in candidates]
+        leaders, dropped = await self.precheck.prepare(session, candidates, usernames)
+        for result in dropped:
+            await self.finish_subscriber(result)
+        for leader in leaders:
+            if leader['_shared_with']:
+                self.shared[leader['id']] = leader['_shared_with']
+        return leaders
+
+    async def iter_prechecked(self, session: aiohttp.ClientSession, source, window_size: int, skip_existing: bool = False):
+        """Run the username precheck over a subscriber stream one window at a time"""
+        async for window in iter_chunks(source, window_size):
+            for leader in await self.precheck_window(session, window, skip_existing):
+                yield leader
+
+    async def process_batch(self, limit: Optional[int] = None, skip_existing: bool = False, max_concurrent: int = 5,
+                            stream: bool = False, page_size: int = DEFAULT_PAGE_SIZE,
+                            concurrency_ceiling: Optional[int] = None, rate_limit: Optional[float] = None,
+                            chunk_size: Optional[int] = None):
         """Process all subscribers in batches"""
         print(f"🚀 Starting batch GitHub analysis...")
-        print(f"📊 Settings: limit={limit}, skip_existing={skip_existing}, max_concurrent={max_concurrent}")
-        print(f"🏃 Mode: {'DRY RUN' if self.dry_run else 'LIVE'}")
+        # max_concurrent is the starting point; the limiter adapts between 1 and the ceiling
+        self.limiter = AdaptiveLimiter(initial_limit=max_concurrent,
+                                       max_limit=concurrency_ceiling or max_concurrent * 4,
+                                       rate_per_second=rate_limit)
+        # Sharded workers always stream their id ranges
+        stream = stream or self.work is not None
+        print(f"📊 Settings: limit={limit}, skip_existing={skip_existing}, max_concurrent={max_concurrent}, "
+              f"concurrency_ceiling={self.limiter.max_limit}, rate_limit={rate_limit}")
+        print(f"🏃 Mode: {'DRY RUN' if self.dry_run else 'LIVE'}{f' (streaming, page_size={page_size})' if stream else ''}"
+              f"{f' (batch endpoint, chunk_size={chunk_size})' if chunk_size else ''}")
+        if self.work:
+            print(f"🧩 Work: {self.work.describe()}")
         print()
         
-        async with aiohttp.ClientSession() as session:
-            # Get subscribers with GitHub URLs
-            subscribers = await self.get_subscribers_with_github_urls(session, limit)
-            
-            if not subscribers:
-                print("❌ No subscribers found with GitHub URLs")
-                return
-            
-            print(f"📋 Found {len(subscribers)} subscribers to process")
-            print()
-            
-            # Process subscribers with concurrency control
-            semaphore = asyncio.Semaphore(max_concurrent)
+        if self.metrics:
+            await self.metrics.start()
+        # Trace hooks time every outbound call for the run report; the work scope hands
+        # unfinished id ranges back to other workers if this run stops early
+        async with create_session(self.limiter.max_limit, self.transport,
+                                  trace_configs=[self.metrics.trace_config()] if self.metrics else None) as session, \
+                self.work or contextlib.nullcontext():
+            if self.work:
+                # Claim id ranges (static shard or lease) and stream each one in turn
+                subscribers = self.work.subscribers(
+                    lambda after_id, max_id: self.stream_subscribers_with_github_urls(
+                        session, None, skip_existing, page_size, after_id, max_id),
+                    await self.last_subscriber_id(session))
+            elif stream:
+                # Start processing while later pages are still loading
+                subscribers = self.stream_subscribers_with_github_urls(session, limit, skip_existing, page_size)
+            else:
+                # Get subscribers with GitHub URLs
+                subscribers = await self.get_subscribers_with_github_urls(session, limit)
+                
+                if not subscribers:
+                    print("❌ No subscribers found with GitHub URLs")
+                    return
+                
+                print(f"📋 Found {len(subscribers)} subscribers to process")
+                print()
             
-            async def process_with_semaphore(subscriber):
-                async with semaphore:
-                    result = await self.process_subscriber(session, subscriber, skip_existing)
-                    self.results.append(result)
-                    
-                    # Print progress
-                    status_emoji = "✅" if result["status"] == "success" else "⏭️" if result["status"] == "skipped" else "❌"
-                    print(f"{status_emoji} User {result['subscriber_id']}: {result.get('username', 'N/A')} - {result['status']}")
-                    
-                    if result["status"] == "error":
-                        print(f"   Error: {result.get('error')}")
-                    
-                    return result
+            if self.precheck:
+                # Normalize, dedupe and existence-check handles before anything is analyzed;
+                # streamed runs dedupe within each page-sized window
+                if stream:
+                    subscribers = self.iter_prechecked(session, subscribers, page_size, skip_existing)
+                else:
+                    subscribers = await self.precheck_window(session, subscribers, skip_existing)
             
-            # Execute all tasks
-            tasks = [process_with_semaphore(subscriber) for subscriber in subscribers]
-            await asyncio.gather(*tasks)
+            if chunk_size:
+                # Send chunks to the batch endpoint; concurrency is counted in chunks
+                source = subscribers if stream else iter_list(subscribers)
+                total = await run_bounded_queue(
+                    iter_chunks(source, chunk_size),
+                    lambda chunk: self.handle_chunk(session, chunk, skip_existing),
+                    max_concurrent=self.limiter.max_limit
+                )
+            elif stream:
+                total = await run_bounded_queue(
+                    subscribers,
+                    lambda subscriber: self.handle_subscriber(session, subscriber, skip_existing),
+                    max_concurrent=self.limiter.max_limit
+                )
+            else:
+                # Concurrency is controlled by the adaptive limiter inside handle_subscriber
+                tasks = [self.handle_subscriber(session, subscriber, skip_existing) for subscriber in subscribers]
+                total = len(await asyncio.gather(*tasks))
             
+            if not total:
+                print("❌ No subscribers found with GitHub URLs")
+                return
+        
         # Print summary
         self.print_summary()
 
@@ -242,6 +487,8 @@ class BatchGitHubProcessor:
         print(f"❌ Errors: {self.error_count}")
         print(f"⏭️ Skipped: {self.skipped_count}")
         print(f"📋 Total: {len(self.results)}")
+        if self.resumed_count:
+            print(f"♻️ Already completed in earlier attempts: {self.resumed_count}")
         print()
         
         if self.error_count > 0:
@@ -260,6 +507,23 @@ class BatchGitHubProcessor:
             print(f"  - Total repositories analyzed: {total_repos}")
             print(f"  - Embeddings generated: {embeddings_generated}/{len(success_results)}")
         
+        if self.precheck:
+            print()
+            self.precheck.print_summary()
+        if self.limiter:
+            print()
+            self.limiter.print_summary()
+        self.retry_policy.print_summary()
+        if self.work:
+            self.work.print_summary()
+        if self.metrics:
+            print()
+            self.metrics.print_summary()
+        
+        if self.journal:
+            print(f"\n📝 Run journal: {self.journal.path}")
+            print(f"   Retry failed/pending subscribers with: --resume {self.journal.run_id}")
+        
         print(f"\n🕐 Completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
 def main():
@@ -268,20 +532,92 @@ def main():
     parser.add_argument("--limit", type=int, help="Limit number of subscribers to process")
     parser.add_argument("--skip-existing", action="store_true", help="Skip subscribers who already have GitHub embeddings")
     parser.add_argument("--base-url", default="http://localhost:3000", help="Base URL for API calls")
-    parser.add_argument("--max-concurrent", type=int, default=5, help="Maximum concurrent API calls")
+    parser.add_argument("--max-concurrent", type=int, default=5, help="Initial concurrent API calls (adapts to upstream health)")
+    parser.add_argument("--concurrency-ceiling", type=int, help="Upper bound for adaptive concurrency (default: 4x --max-concurrent)")
+    parser.add_argument("--rate-limit", type=float, help="Max requests per second to each upstream (token bucket)")
     parser.add_argument("--service-key", required=True, help="Supabase service role key for authentication")
+    parser.add_argument("--stream", action="store_true", help="Page through subscribers by id and start processing before all pages are loaded")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Subscribers per page in --stream mode")
+    parser.add_argument("--chunk-size", type=int, help=f"Send subscribers to {BATCH_ENDPOINT} in chunks of N instead of one call each")
+    parser.add_argument("--precheck", action="store_true", help="Normalize and dedupe GitHub handles and drop accounts that don't exist before analyzing")
+    parser.add_argument("--username-fixture", metavar="PATH", help="With --precheck: check handles against this file of known logins instead of the API")
+    parser.add_argument("--skip-organizations", action="store_true", help="With --precheck: drop GitHub organization accounts instead of analyzing them")
+    parser.add_argument("--write-batch-rows", type=int, help="With --chunk-size: repository embedding rows the route writes per upsert (default 200)")
+    parser.add_argument("--write-flush-ms", type=int, help="With --chunk-size: longest the route holds rows for a fuller upsert (default 500)")
+    parser.add_argument("--max-attempts", type=int, default=4, help="Attempts per subscriber for transient failures (429/502/503/504, network)")
+    parser.add_argument("--retry-budget", type=int, default=100, help="Maximum retries across the whole run")
+    parser.add_argument("--resume", metavar="RUN_ID", help="Resume a previous run, skipping subscribers it already completed")
+    parser.add_argument("--journal-dir", default=DEFAULT_JOURNAL_DIR, help="Directory for run journals")
+    parser.add_argument("--profile", action="store_true", help="Also record event-loop lag and per-subscriber timing in the run report")
+    parser.add_argument("--metrics-textfile", metavar="PATH", help="Prometheus textfile path (default: next to the run journal)")
+    parser.add_argument("--connect-timeout", type=float, default=TransportSettings.connect_timeout, help="Seconds to open a connection to the API")
+    parser.add_argument("--read-timeout", type=float, default=TransportSettings.read_timeout, help="Seconds to wait for response data before failing the call")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N", help="Process only id ranges I, I+N, I+2N, ... (static split across N workers)")
+    parser.add_argument("--leases", metavar="PATH|api", help="Claim id ranges through expiring leases in a SQLite file, or the batch_work_leases table with 'api'")
+    parser.add_argument("--lease-run", default="analysis", help="Name shared by the workers of one coordinated run")
+    parser.add_argument("--range-size", type=int, default=DEFAULT_RANGE_SIZE, help="Subscriber ids per claimed range")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS, help="Lease length; a crashed worker's ranges are claimed again after this")
     
     args = parser.parse_args()
+    if args.shard and args.leases:
+        parser.error("--shard and --leases are alternatives; pick one")
+    if (args.shard or args.leases) and args.limit:
+        parser.error("--limit cannot be combined with --shard/--leases")
+    if (args.username_fixture or args.skip_organizations) and not args.precheck:
+        parser.error("--username-fixture/--skip-organizations only apply with --precheck")
+    if (args.write_batch_rows or args.write_flush_ms is not None) and not args.chunk_size:
+        parser.error("--write-batch-rows/--write-flush-ms only apply with --chunk-size")
+    
+    # Open the run journal (new run, or the one being resumed)
+    try:
+        if args.resume:
+            journal = RunJournal.resume(args.resume, args.journal_dir)
+            print(f"♻️ Resuming run {journal.run_id} ({len(journal.outcomes)} subscribers already recorded)")
+        else:
+            journal = RunJournal.start(worker_journal_name("analysis", args.shard, args.leases), args.journal_dir, settings=vars(args) | {"service_key": None})
+    except Exception as e:
+        print(f"❌ Failed to open run journal: {e}")
+        sys.exit(1)
+    
+    try:
+        work = create_range_worker(args.shard, args.leases, args.lease_run, args.range_size, args.lease_seconds,
+                                   args.base_url, args.service_key)
+    except Exception as e:
+        print(f"❌ Failed to open work leases: {e}")
+        journal.close()
+        sys.exit(1)
+    
+    precheck = None
+    if args.precheck:
+        try:
+            lookup = (FixtureUsernameLookup(args.username_fixture) if args.username_fixture
+                      else ApiUsernameLookup(args.base_url, args.service_key))
+            precheck = UsernamePrecheck(lookup, args.skip_organizations)
+        except Exception as e:
+            print(f"❌ Failed to load username fixture: {e}")
+            journal.close()
+            sys.exit(1)
     
     # Create processor
-    processor = BatchGitHubProcessor(base_url=args.base_url, dry_run=args.dry_run, service_role_key=args.service_key)
+    metrics = RunMetrics("analysis", profile=args.profile)
+    processor = BatchGitHubProcessor(base_url=args.base_url, dry_run=args.dry_run, service_role_key=args.service_key,
+                                     journal=journal, metrics=metrics, work=work,
+                                     transport=TransportSettings(connect_timeout=args.connect_timeout, read_timeout=args.read_timeout),
+                                     write_back=WriteBackSettings(batch_rows=args.write_batch_rows, flush_ms=args.write_flush_ms),
+                                     precheck=precheck,
+                                     retry_policy=RetryPolicy(max_attempts=args.max_attempts, retry_budget=args.retry_budget))
     
     # Run batch processing
     try:
         asyncio.run(processor.process_batch(
             limit=args.limit,
             skip_existing=args.skip_existing,
-            max_concurrent=args.max_concurrent
+            max_concurrent=args.max_concurrent,
+            stream=args.stream,
+            page_size=args.page_size,
+            concurrency_ceiling=args.concurrency_ceiling,
+            rate_limit=args.rate_limit,
+            chunk_size=args.chunk_size
         ))
     except KeyboardInterrupt:
         print("\n⚠️  Process interrupted by user")
@@ -289,6 +625,9 @@ def main():
     except Exception as e:
         print(f"\n❌ Unexpected error: {e}")
         processor.print_summary()
+    finally:
+        write_metrics_report(metrics, journal, args.metrics_textfile)
+        journal.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -8,11 +8,12 @@ This script processes subscribers who have github_url_data to:
 2. Update their Supabase records with vector embeddings
 
 Usage:
-    python app/scripts/batch_github_embeddings.py --service-key YOUR_SERVICE_KEY [--dry-run] [--limit N] [--skip-existing]
+    python app/scripts/batch_github_embeddings.py --service-key YOUR_SERVICE_KEY [--dry-run] [--limit N] [--skip-existing] [--stream [--page-size N]] [--incremental] [--cache [PATH]] [--preprocess]
 """
 
 import asyncio
 import aiohttp
+import contextlib
 import json
 import argparse
 import os
@@ -23,14 +24,52 @@ from typing import List, Dict, Optional
 # Add the app directory to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
+from subscriber_stream import DEFAULT_PAGE_SIZE, fetch_last_subscriber_id, iter_subscriber_pages, run_bounded_queue
+from run_journal import DEFAULT_JOURNAL_DIR, RunJournal
+from adaptive_limiter import AdaptiveLimiter
+from retry_policy import RetryPolicy
+from run_metrics import RunMetrics, set_current_subscriber, write_metrics_report
+from http_transport import TransportSettings, create_session, read_json
+from work_leases import (DEFAULT_LEASE_SECONDS, DEFAULT_RANGE_SIZE, RangeWorker, create_range_worker, parse_shard,
+                         worker_journal_name)
+from batch_endpoint import BATCH_ENDPOINT, WriteBackSettings, iter_chunks, iter_list, run_chunk, stream_chunk
+from content_hash import split_changed_repositories
+from embedding_cache import DEFAULT_CACHE_MAX_MB, DEFAULT_CACHE_PATH, EmbeddingCache
+from embedding_text import create_repository_embedding_text
+from embedding_prep import DEFAULT_REPO_TOKEN_BUDGET, EmbeddingPreprocessor
+
+# Subscribers per /api/get_repository_content_hashes lookup in --incremental mode
+HASH_LOOKUP_BATCH = 200
+
 class BatchGitHubEmbeddingsProcessor:
-    def __init__(self, base_url: str = "http://localhost:3000", dry_run: bool = False, service_role_key: str = None):
+    # github_embedding is bound by Voyage/Gemini
+    UPSTREAM = "embedding"
+
+    def __init__(self, base_url: str = "http://localhost:3000", dry_run: bool = False, service_role_key: str = None,
+                 journal: Optional[RunJournal] = None, retry_policy: Optional[RetryPolicy] = None,
+                 incremental: bool = False, cache: Optional[EmbeddingCache] = None,
+                 metrics: Optional[RunMetrics] = None, transport: Optional[TransportSettings] = None,
+                 work: Optional[RangeWorker] = None, write_back: Optional[WriteBackSettings] = None,
+                 preprocessor: Optional[EmbeddingPreprocessor] = None):
         self.base_url = base_url
         self.dry_run = dry_run
         self.service_role_key = service_role_key
+        self.journal = journal
+        self.limiter: Optional[AdaptiveLimiter] = None
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.metrics = metrics
+        self.transport = transport
+        self.work = work
+        self.write_back = write_back or WriteBackSettings()
+        self.incremental = incremental
+        self.cache = cache
+        self.preprocessor = preprocessor
+        self.repositories_changed = 0
+        self.repositories_unchanged = 0
         self.processed_count = 0
         self.error_count = 0
         self.skipped_count = 0
+        self.resumed_count = 0
         self.results = []
 
     async def get_subscribers_with_github_data(self, session: aiohttp.ClientSession, limit: Optional[int] = None, skip_existing: bool = False) -> List[Dict]:
@@ -50,7 +89,7 @@ class BatchGitHubEmbeddingsProcessor:
             async with session.get(f"{self.base_url}/api/get_subscribers_with_github_data", 
                                  params=params, headers=headers) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = await read_json(response)
                     subscribers = data.get('subscribers', [])
                     print(f"📋 Fetched {len(subscribers)} subscribers with GitHub data")
                     # Log sample of what fields we have
@@ -65,13 +104,89 @@ class BatchGitHubEmbeddingsProcessor:
             print(f"❌ Error fetching subscribers: {e}")
             return []
 
-    async def generate_embedding(self, session: aiohttp.ClientSession, subscriber_id: int, github_data: Dict) -> Dict:
+    def stream_subscribers_with_github_data(self, session: aiohttp.ClientSession, limit: Optional[int] = None,
+                                            skip_existing: bool = False, page_size: int = DEFAULT_PAGE_SIZE,
+                                            after_id: Optional[int] = None, max_id: Optional[int] = None):
+        """Page through subscribers with github_url_data by id, without the vector column."""
+        params = {'include_heavy': 'false'}
+        if skip_existing:
+            params['skip_existing'] = 'true'
+        if max_id is not None:
+            params['max_id'] = max_id
+
+        headers = {}
+        if self.service_role_key:
+            headers['authorization'] = f'Bearer {self.service_role_key}'
+
+        return iter_subscriber_pages(session, f"{self.base_url}/api/get_subscribers_with_github_data",
+                                     headers, params=params, page_size=page_size, limit=limit, after_id=after_id)
+
+    async def last_subscriber_id(self, session: aiohttp.ClientSession) -> int:
+        """Highest subscriber id the list route returns, where sharded workers stop claiming ranges."""
+        headers = {}
+        if self.service_role_key:
+            headers['authorization'] = f'Bearer {self.service_role_key}'
+        return await fetch_last_subscriber_id(session, f"{self.base_url}/api/get_subscribers_with_github_data", headers,
+                                              {'include_heavy': 'false'})
+
+    async def attach_stored_hashes(self, session: aiohttp.ClientSession, subscribers: List[Dict]):
+        """Look up stored repository content hashes for a batch of subscribers in one call."""
+        headers = {}
+        if self.service_role_key:
+            headers['authorization'] = f'Bearer {self.service_role_key}'
+        
+        hashes = {}
+        try:
+            ids = ",".join(str(subscriber.get('id')) for subscriber in subscribers)
+            async with session.get(f"{self.base_url}/api/get_repository_content_hashes",
+                                   params={'subscriber_ids': ids}, headers=headers) as response:
+                if response.status == 200:
+                    hashes = (await read_json(response)).get('hashes', {})
+                else:
+                    print(f"⚠️ Failed to fetch content hashes: {response.status} (re-embedding this batch in full)")
+        except Exception as e:
+            print(f"⚠️ Error fetching content hashes: {e} (re-embedding this batch in full)")
+        
+        for subscriber in subscribers:
+            subscriber['_stored_hashes'] = hashes.get(str(subscriber.get('id')), {})
+
+    async def with_stored_hashes(self, session: aiohttp.ClientSession, source):
+        """Annotate a stream of subscribers with stored hashes, one lookup per batch."""
+        async for batch in iter_chunks(source, HASH_LOOKUP_BATCH):
+            await self.attach_stored_hashes(session, batch)
+            for subscriber in batch:
+                yield subscriber
+
+    def preprocess(self, subscriber: Dict):
+        """Drop and trim files before upload (--preprocess); hashes and cache keys follow the result"""
+        if self.preprocessor and subscriber.get('github_url_data') and not subscriber.get('_preprocessed'):
+            subscriber['github_url_data'] = self.preprocessor.apply(subscriber['github_url_data'])
+            subscriber['_preprocessed'] = True
+
+    def precomputed_for(self, subscriber: Dict) -> Optional[Dict]:
+        """Cached embeddings/analyses for the repositories this subscriber will send"""
+        if not self.cache:
+            return None
+        if '_precomputed' not in subscriber:
+            github_data = subscriber.get('_changed_data') or subscriber.get('github_url_data') or {}
+            texts = [create_repository_embedding_text(group) for group in github_data.get('repositoryGroups') or []]
+            subscriber['_precomputed'] = self.cache.lookup(texts)
+        return subscriber['_precomputed']
+
+    async def generate_embedding(self, session: aiohttp.ClientSession, subscriber_id: int, github_data: Dict,
+                                 unchanged_count: int = 0, precomputed: Optional[Dict] = None) -> Dict:
         """Generate embedding for GitHub data using the existing API"""
         try:
             payload = {
                 "data": github_data,
                 "subscriberId": subscriber_id
             }
+            if unchanged_count:
+                payload["unchangedRepositoryCount"] = unchanged_count
+            if precomputed is not None:
+                # Cache hits skip Voyage/Gemini; ask for the misses back so they can be cached
+                payload["precomputed"] = precomputed
+                payload["returnComputed"] = True
             
             if self.dry_run:
                 print(f"🔍 [DRY RUN] Would generate embedding for user {subscriber_id}")
@@ -84,18 +199,26 @@ class BatchGitHubEmbeddingsProcessor:
             
             async with session.post(f"{self.base_url}/api/github_embedding", 
                                   json=payload, headers=headers) as response:
-                result = await response.json()
+                try:
+                    result = await read_json(response)
+                except json.JSONDecodeError:
+                    # Proxies and crashed workers return HTML error pages
+                    result = {}
                 
                 if response.status == 200 and result.get('success'):
                     return {
                         "success": True,
+                        "http_status": response.status,
                         "embedding_generated": result.get('embeddingGenerated', False),
                         "matches": len(result.get('matches', [])),
-                        "query_vector_length": result.get('queryVectorLength', 0)
+                        "query_vector_length": result.get('queryVectorLength', 0),
+                        "computed": result.get('computed')
                     }
                 else:
                     return {
                         "success": False,
+                        "http_status": response.status,
+                        "retry_after": response.headers.get('Retry-After'),
                         "error": result.get('error', f'HTTP {response.status}'),
                         "details": result.get('details', '')
                     }
@@ -103,17 +226,15 @@ class BatchGitHubEmbeddingsProcessor:
         except Exception as e:
             return {
                 "success": False,
+                "network_error": True,
                 "error": str(e)
             }
 
-    async def process_subscriber(self, session: aiohttp.ClientSession, subscriber: Dict, skip_existing: bool = False) -> Dict:
-        """Process a single subscriber"""
+    def precheck_subscriber(self, subscriber: Dict, skip_existing: bool = False) -> Optional[Dict]:
+        """Return a skipped result if the subscriber needs no upstream call"""
         subscriber_id = subscriber.get('id')
-        github_data = subscriber.get('github_url_data')
-        first_name = subscriber.get('first_name', '')
-        last_name = subscriber.get('last_name', '')
         
-        if not github_data:
+        if not subscriber.get('github_url_data'):
             return {
                 "subscriber_id": subscriber_id,
                 "status": "skipped",
@@ -122,23 +243,55 @@ class BatchGitHubEmbeddingsProcessor:
         
         # Skip if already has embeddings and skip_existing is True
         if skip_existing and subscriber.get('github_vector_embeddings'):
-            self.skipped_count += 1
             return {
                 "subscriber_id": subscriber_id,
                 "status": "skipped", 
                 "reason": "Already has GitHub embeddings"
             }
         
+        self.preprocess(subscriber)
+        
+        # Incremental mode: only repositories whose content hash changed get re-embedded
+        if self.incremental and '_changed_data' not in subscriber:
+            github_data = subscriber['github_url_data']
+            changed, unchanged = split_changed_repositories(github_data, subscriber.get('_stored_hashes', {}))
+            self.repositories_changed += len(changed)
+            self.repositories_unchanged += len(unchanged)
+            subscriber['_changed_data'] = {**github_data, 'repositoryGroups': changed} if changed else None
+            subscriber['_unchanged_count'] = len(unchanged)
+        
+        if self.incremental and not subscriber['_changed_data']:
+            return {
+                "subscriber_id": subscriber_id,
+                "status": "skipped",
+                "reason": "No repository changes since last embedding"
+            }
+        
+        return None
+
+    async def process_subscriber(self, session: aiohttp.ClientSession, subscriber: Dict, skip_existing: bool = False) -> Dict:
+        """Process a single subscriber"""
+        subscriber_id = subscriber.get('id')
+        first_name = subscriber.get('first_name', '')
+        last_name = subscriber.get('last_name', '')
+        
+        skipped = self.precheck_subscriber(subscriber, skip_existing)
+        if skipped:
+            return skipped
+        
+        # Read after the precheck, which may have preprocessed it
+        github_data = subscriber.get('github_url_data')
+        
         # Extract username from github_data for logging
         username = github_data.get('username', 'Unknown')
         name_info = f"{first_name} {last_name}".strip() if first_name or last_name else "No name provided"
         print(f"🔍 Processing {username} (ID: {subscriber_id}, Name: {name_info})")
         
-        # Generate embedding using existing github_data
-        result = await self.generate_embedding(session, subscriber_id, github_data)
+        # Generate embedding using existing github_data (only changed repositories in incremental mode)
+        result = await self.generate_embedding(session, subscriber_id, subscriber.get('_changed_data') or github_data,
+                                               subscriber.get('_unchanged_count', 0), self.precomputed_for(subscriber))
         
         if result.get("success"):
-            self.processed_count += 1
             return {
                 "subscriber_id": subscriber_id,
                 "status": "success",
@@ -146,57 +299,188 @@ class BatchGitHubEmbeddingsProcessor:
                 "embedding_generated": result.get("embedding_generated", False),
                 "matches_found": result.get("matches", 0),
                 "vector_length": result.get("query_vector_length", 0),
-                "dry_run": result.get("dry_run", False)
+                "http_status": result.get("http_status"),
+                "dry_run": result.get("dry_run", False),
+                "computed": result.get("computed")
             }
         else:
-            self.error_count += 1
             return {
                 "subscriber_id": subscriber_id,
                 "status": "error",
                 "username": username,
+                "http_status": result.get("http_status"),
+                "retry_after": result.get("retry_after"),
+                "network_error": result.get("network_error", False),
                 "error": result.get("error"),
                 "details": result.get("details", "")
             }
 
-    async def process_batch(self, limit: Optional[int] = None, skip_existing: bool = False, max_concurrent: int = 5):
+    async def handle_subscriber(self, session: aiohttp.ClientSession, subscriber: Dict, skip_existing: bool = False) -> Dict:
+        """Process a subscriber, record the result and print progress"""
+        # Already finished in an earlier attempt of this run
+        if self.journal and self.journal.is_completed(subscriber.get('id')):
+            self.resumed_count += 1
+            if self.work:
+                self.work.done(subscriber.get('id'))
+            return {"subscriber_id": subscriber.get('id'), "status": "resumed"}
+        
+        set_current_subscriber(subscriber.get('id'))
+        # The adaptive limiter gates each attempt; transient failures are retried with backoff outside it
+        result = await self.retry_policy.run(self.limiter, self.UPSTREAM,
+                                             lambda: self.process_subscriber(session, subscriber, skip_existing))
+        
+        subscriber.pop('_precomputed', None)
+        await self.finish_subscriber(result)
+        return result
+
+    async def finish_subscriber(self, result: Dict):
+        """Record a final subscriber outcome and print progress"""
+        # Newly computed embeddings/analyses go to the cache, not the journal
+        computed = result.pop("computed", None)
+        if self.cache:
+            self.cache.store(computed)
+        
+        if result["status"] == "success":
+            self.processed_count += 1
+        elif result["status"] == "error":
+            self.error_count += 1
+        else:
+            self.skipped_count += 1
+        self.results.append(result)
+        if self.journal:
+            self.journal.record(result)
+        if self.work:
+            self.work.done(result['subscriber_id'])
+        
+        # Print progress
+        status_emoji = "✅" if result["status"] == "success" else "⏭️" if result["status"] == "skipped" else "❌"
+        print(f"{status_emoji} User {result['subscriber_id']}: {result.get('username', 'N/A')} - {result['status']}")
+        
+        if result["status"] == "error":
+            print(f"   Error: {result.get('error')}")
+            if result.get('details'):
+                print(f"   Details: {result.get('details')}")
+
+    def send_chunk(self, session: aiohttp.ClientSession, chunk: List[Dict]):
+        """Send a chunk to the batch endpoint; yields one result per subscriber"""
+        if self.dry_run:
+            return self._dry_run_chunk(chunk)
+        
+        payload = {"mode": "embed", "subscribers": [{
+            "id": subscriber.get('id'),
+            "data": subscriber.get('_changed_data') or subscriber.get('github_url_data'),
+            "unchangedRepositoryCount": subscriber.get('_unchanged_count', 0),
+            "precomputed": self.precomputed_for(subscriber)
+        } for subscriber in chunk], "returnComputed": self.cache is not None, **self.write_back.payload()}
+        headers = {"Content-Type": "application/json"}
+        if self.service_role_key:
+            headers['authorization'] = f'Bearer {self.service_role_key}'
+        return stream_chunk(session, f"{self.base_url}{BATCH_ENDPOINT}", headers, payload)
+
+    async def _dry_run_chunk(self, chunk: List[Dict]):
+        print(f"🔍 [DRY RUN] Would send chunk of {len(chunk)} subscribers to {BATCH_ENDPOINT}")
+        for subscriber in chunk:
+            self.precomputed_for(subscriber)
+            yield {"subscriber_id": subscriber.get('id'), "username": (subscriber.get('github_url_data') or {}).get('username', 'Unknown'), "status": "success", "dry_run": True}
+
+    async def handle_chunk(self, session: aiohttp.ClientSession, chunk: List[Dict], skip_existing: bool = False):
+        """Process a chunk of subscribers through the batch endpoint"""
+        to_send = []
+        for subscriber in chunk:
+            if self.journal and self.journal.is_completed(subscriber.get('id')):
+                self.resumed_count += 1
+                if self.work:
+                    self.work.done(subscriber.get('id'))
+                continue
+            skipped = self.precheck_subscriber(subscriber, skip_existing)
+            if skipped:
+                await self.finish_subscriber(skipped)
+            else:
+                to_send.append(subscriber)
+        
+        if to_send:
+            await run_chunk(to_send, lambda pending: self.send_chunk(session, pending), self.finish_subscriber,
+                            self.limiter, self.retry_policy, self.UPSTREAM)
+            for subscriber in to_send:
+                subscriber.pop('_precomputed', None)
+
+    async def process_batch(self, limit: Optional[int] = None, skip_existing: bool = False, max_concurrent: int = 5,
+                            stream: bool = False, page_size: int = DEFAULT_PAGE_SIZE,
+                            concurrency_ceiling: Optional[int] = None, rate_limit: Optional[float] = None,
+                            chunk_size: Optional[int] = None):
         """Process all subscribers in batches"""
         print(f"🚀 Starting batch GitHub embeddings generation...")
-        print(f"📊 Settings: limit={limit}, skip_existing={skip_existing}, max_concurrent={max_concurrent}")
-        print(f"🏃 Mode: {'DRY RUN' if self.dry_run else 'LIVE'}")
+        # max_concurrent is the starting point; the limiter adapts between 1 and the ceiling
+        self.limiter = AdaptiveLimiter(initial_limit=max_concurrent,
+                                       max_limit=concurrency_ceiling or max_concurrent * 4,
+                                       rate_per_second=rate_limit)
+        # Sharded workers always stream their id ranges
+        stream = stream or self.work is not None
+        print(f"📊 Settings: limit={limit}, skip_existing={skip_existing}, max_concurrent={max_concurrent}, "
+              f"concurrency_ceiling={self.limiter.max_limit}, rate_limit={rate_limit}")
+        print(f"🏃 Mode: {'DRY RUN' if self.dry_run else 'LIVE'}{f' (streaming, page_size={page_size})' if stream else ''}"
+              f"{f' (batch endpoint, chunk_size={chunk_size})' if chunk_size else ''}")
+        if self.work:
+            print(f"🧩 Work: {self.work.describe()}")
         print()
         
-        async with aiohttp.ClientSession() as session:
-            # Get subscribers with GitHub data
-            subscribers = await self.get_subscribers_with_github_data(session, limit, skip_existing)
-            
-            if not subscribers:
-                print("❌ No subscribers found with GitHub data")
-                return
+        if self.metrics:
+            await self.metrics.start()
+        # Trace hooks time every outbound call for the run report; the work scope hands
+        # unfinished id ranges back to other workers if this run stops early
+        async with create_session(self.limiter.max_limit, self.transport,
+                                  trace_configs=[self.metrics.trace_config()] if self.metrics else None) as session, \
+                self.work or contextlib.nullcontext():
+            if self.work:
+                # Claim id ranges (static shard or lease) and stream each one in turn
+                subscribers = self.work.subscribers(
+                    lambda after_id, max_id: self.stream_subscribers_with_github_data(
+                        session, None, skip_existing, page_size, after_id, max_id),
+                    await self.last_subscriber_id(session))
+            elif stream:
+                # Start processing while later pages are still loading
+                subscribers = self.stream_subscribers_with_github_data(session, limit, skip_existing, page_size)
+            else:
+                # Get subscribers with GitHub data
+                subscribers = await self.get_subscribers_with_github_data(session, limit, skip_existing)
+                
+                if not subscribers:
+                    print("❌ No subscribers found with GitHub data")
+                    return
+                
+                print(f"📋 Found {len(subscribers)} subscribers to process")
+                print()
             
-            print(f"📋 Found {len(subscribers)} subscribers to process")
-            print()
-            # Process subscribers with concurrency control
-            semaphore = asyncio.Semaphore(max_concurrent)
+            if self.incremental:
+                # One hash lookup per batch of subscribers, ahead of processing
+                if stream:
+                    subscribers = self.with_stored_hashes(session, subscribers)
+                else:
+                    for start in range(0, len(subscribers), HASH_LOOKUP_BATCH):
+                        await self.attach_stored_hashes(session, subscribers[start:start + HASH_LOOKUP_BATCH])
             
-            async def process_with_semaphore(subscriber):
-                async with semaphore:
-                    result = await self.process_subscriber(session, subscriber, skip_existing)
-                    self.results.append(result)
-                    
-                    # Print progress
-                    status_emoji = "✅" if result["status"] == "success" else "⏭️" if result["status"] == "skipped" else "❌"
-                    print(f"{status_emoji} User {result['subscriber_id']}: {result.get('username', 'N/A')} - {result['status']}")
-                    
-                    if result["status"] == "error":
-                        print(f"   Error: {result.get('error')}")
-                        if result.get('details'):
-                            print(f"   Details: {result.get('details')}")
-                    
-                    return result
+            if chunk_size:
+                # Send chunks to the batch endpoint; concurrency is counted in chunks
+                source = subscribers if stream else iter_list(subscribers)
+                total = await run_bounded_queue(
+                    iter_chunks(source, chunk_size),
+                    lambda chunk: self.handle_chunk(session, chunk, skip_existing),
+                    max_concurrent=self.limiter.max_limit
+                )
+            elif stream:
+                total = await run_bounded_queue(
+                    subscribers,
+                    lambda subscriber: self.handle_subscriber(session, subscriber, skip_existing),
+                    max_concurrent=self.limiter.max_limit
+                )
+            else:
+                # Concurrency is controlled by the adaptive limiter inside handle_subscriber
+                tasks = [self.handle_subscriber(session, subscriber, skip_existing) for subscriber in subscribers]
+                total = len(await asyncio.gather(*tasks))
             
-            # Execute all tasks
-            tasks = [process_with_semaphore(subscriber) for subscriber in subscribers]
-            await asyncio.gather(*tasks)
+            if not total:
+                print("❌ No subscribers found with GitHub data")
+                return
         
         # Print summary
         self.print_summary()
@@ -210,6 +494,8 @@ class BatchGitHubEmbeddingsProcessor:
         print(f"❌ Errors: {self.error_count}")
         print(f"⏭️ Skipped: {self.skipped_count}")
         print(f"📋 Total: {len(self.results)}")
+        if self.resumed_count:
+            print(f"♻️ Already completed in earlier attempts: {self.resumed_count}")
         print()
         
         if self.error_count > 0:
@@ -230,6 +516,31 @@ class BatchGitHubEmbeddingsProcessor:
             print(f"  - Embeddings generated: {embeddings_generated}/{len(success_results)}")
             print(f"  - Total similarity matches found: {total_matches}")
         
+        if self.incremental:
+            total_repos = self.repositories_changed + self.repositories_unchanged
+            print(f"🧮 Incremental: {self.repositories_changed}/{total_repos} repositories changed and sent for embedding, "
+                  f"{self.repositories_unchanged} unchanged skipped")
+        
+        if self.preprocessor:
+            self.preprocessor.print_summary()
+        
+        if self.cache:
+            self.cache.print_summary()
+        
+        if self.limiter:
+            print()
+            self.limiter.print_summary()
+        self.retry_policy.print_summary()
+        if self.work:
+            self.work.print_summary()
+        if self.metrics:
+            print()
+            self.metrics.print_summary()
+        
+        if self.journal:
+            print(f"\n📝 Run journal: {self.journal.path}")
+            print(f"   Retry failed/pending subscribers with: --resume {self.journal.run_id}")
+        
         print(f"\n🕐 Completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
 def main():
@@ -238,20 +549,80 @@ def main():
     parser.add_argument("--limit", type=int, help="Limit number of subscribers to process")
     parser.add_argument("--skip-existing", action="store_true", help="Skip subscribers who already have GitHub embeddings")
     parser.add_argument("--base-url", default="http://localhost:3000", help="Base URL for API calls")
-    parser.add_argument("--max-concurrent", type=int, default=5, help="Maximum concurrent API calls")
+    parser.add_argument("--max-concurrent", type=int, default=5, help="Initial concurrent API calls (adapts to upstream health)")
+    parser.add_argument("--concurrency-ceiling", type=int, help="Upper bound for adaptive concurrency (default: 4x --max-concurrent)")
+    parser.add_argument("--rate-limit", type=float, help="Max requests per second to each upstream (token bucket)")
     parser.add_argument("--service-key", required=True, help="Supabase service role key for authentication")
+    parser.add_argument("--stream", action="store_true", help="Page through subscribers by id and start processing before all pages are loaded")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Subscribers per page in --stream mode")
+    parser.add_argument("--incremental", action="store_true", help="Only re-embed repositories whose content hash changed since they were last embedded")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_PATH, metavar="PATH",
+                        help=f"Reuse embeddings/analyses from a local SQLite cache (default path: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_MB, help="Evict least-recently-used cache entries beyond this size")
+    parser.add_argument("--preprocess", action="store_true", help="Drop lockfiles, vendored/generated/minified and duplicate files and fit each repository to a token budget before upload")
+    parser.add_argument("--repo-token-budget", type=int, default=DEFAULT_REPO_TOKEN_BUDGET, help="With --preprocess: estimated tokens per repository (0 = no budget)")
+    parser.add_argument("--chunk-size", type=int, help=f"Send subscribers to {BATCH_ENDPOINT} in chunks of N instead of one call each")
+    parser.add_argument("--write-batch-rows", type=int, help="With --chunk-size: repository embedding rows the route writes per upsert (default 200)")
+    parser.add_argument("--write-flush-ms", type=int, help="With --chunk-size: longest the route holds rows for a fuller upsert (default 500)")
+    parser.add_argument("--max-attempts", type=int, default=4, help="Attempts per subscriber for transient failures (429/502/503/504, network)")
+    parser.add_argument("--retry-budget", type=int, default=100, help="Maximum retries across the whole run")
+    parser.add_argument("--resume", metavar="RUN_ID", help="Resume a previous run, skipping subscribers it already completed")
+    parser.add_argument("--journal-dir", default=DEFAULT_JOURNAL_DIR, help="Directory for run journals")
+    parser.add_argument("--profile", action="store_true", help="Also record event-loop lag and per-subscriber timing in the run report")
+    parser.add_argument("--metrics-textfile", metavar="PATH", help="Prometheus textfile path (default: next to the run journal)")
+    parser.add_argument("--connect-timeout", type=float, default=TransportSettings.connect_timeout, help="Seconds to open a connection to the API")
+    parser.add_argument("--read-timeout", type=float, default=TransportSettings.read_timeout, help="Seconds to wait for response data before failing the call")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N", help="Process only id ranges I, I+N, I+2N, ... (static split across N workers)")
+    parser.add_argument("--leases", metavar="PATH|api", help="Claim id ranges through expiring leases in a SQLite file, or the batch_work_leases table with 'api'")
+    parser.add_argument("--lease-run", default="embeddings", help="Name shared by the workers of one coordinated run")
+    parser.add_argument("--range-size", type=int, default=DEFAULT_RANGE_SIZE, help="Subscriber ids per claimed range")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS, help="Lease length; a crashed worker's ranges are claimed again after this")
     
     args = parser.parse_args()
+    if args.shard and args.leases:
+        parser.error("--shard and --leases are alternatives; pick one")
+    if (args.shard or args.leases) and args.limit:
+        parser.error("--limit cannot be combined with --shard/--leases")
+    if (args.write_batch_rows or args.write_flush_ms is not None) and not args.chunk_size:
+        parser.error("--write-batch-rows/--write-flush-ms only apply with --chunk-size")
+    
+    # Open the run journal (new run, or the one being resumed)
+    try:
+        if args.resume:
+            journal = RunJournal.resume(args.resume, args.journal_dir)
+            print(f"♻️ Resuming run {journal.run_id} ({len(journal.outcomes)} subscribers already recorded)")
+        else:
+            journal = RunJournal.start(worker_journal_name("embeddings", args.shard, args.leases), args.journal_dir, settings=vars(args) | {"service_key": None})
+    except Exception as e:
+        print(f"❌ Failed to open run journal: {e}")
+        sys.exit(1)
     
     # Create processor
+    metrics = RunMetrics("embeddings", profile=args.profile)
+    cache = None
     try:
+        cache = EmbeddingCache(args.cache, args.cache_max_mb * 1024 * 1024) if args.cache else None
+        work = create_range_worker(args.shard, args.leases, args.lease_run, args.range_size, args.lease_seconds,
+                                   args.base_url, args.service_key)
         processor = BatchGitHubEmbeddingsProcessor(
             base_url=args.base_url, 
             dry_run=args.dry_run, 
-            service_role_key=args.service_key
+            service_role_key=args.service_key,
+            journal=journal,
+            metrics=metrics,
+            work=work,
+            transport=TransportSettings(connect_timeout=args.connect_timeout, read_timeout=args.read_timeout),
+            write_back=WriteBackSettings(batch_rows=args.write_batch_rows, flush_ms=args.write_flush_ms),
+            retry_policy=RetryPolicy(max_attempts=args.max_attempts, retry_budget=args.retry_budget),
+            incremental=args.incremental,
+            cache=cache,
+            preprocessor=EmbeddingPreprocessor(args.repo_token_budget) if args.preprocess else None
         )
     except Exception as e:
         print(f"❌ Failed to initialize processor: {e}")
+        journal.close()
+        if cache:
+            cache.close()
         sys.exit(1)
     
     # Run batch processing
@@ -259,7 +630,12 @@ def main():
         asyncio.run(processor.process_batch(
             limit=args.limit,
             skip_existing=args.skip_existing,
-            max_concurrent=args.max_concurrent
+            max_concurrent=args.max_concurrent,
+            stream=args.stream,
+            page_size=args.page_size,
+            concurrency_ceiling=args.concurrency_ceiling,
+            rate_limit=args.rate_limit,
+            chunk_size=args.chunk_size
         ))
     except KeyboardInterrupt:
         print("\n⚠️  Process interrupted by user")
@@ -267,6 +643,11 @@ def main():
     except Exception as e:
         print(f"\n❌ Unexpected error: {e}")
         processor.print_summary()
+    finally:
+        write_metrics_report(metrics, journal, args.metrics_textfile)
+        journal.close()
+        if cache:
+            cache.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Batch Script Benchmark
+======================
+
+Throughput benchmark for `batch_github_analysis.py`,
+`batch_github_embeddings.py` and `github_pipeline.py` against the local
+stand-in API (`mock_api_server.py`), never production.
+
+For every dataset size the harness starts a mock server. It then runs each
+script at each concurrency setting in a fresh child process, so peak RSS
+belongs to that run alone. Each run reports:
+- subscribers/sec and CPU time
+- peak RSS
+- p50/p95/p99 latency of the script's main endpoint (from the run metrics)
+- errors and retries
+
+Results are saved to `runs/bench-<timestamp>.json`. `--compare` diffs a run
+against an earlier results file and flags throughput regressions.
+
+Usage:
+    python app/scripts/benchmark_batch.py [--subscribers 1000,10000] [--concurrency 5,10,20,40]
+        [--scripts analysis,embeddings,pipeline] [--compare runs/bench-....json]
+        [any mock_api_server.py flag, e.g. --analyze-latency 50,400 --error-rate 0.02 --burst-every 10]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from run_journal import DEFAULT_JOURNAL_DIR
+from retry_policy import RetryPolicy
+from run_metrics import RunMetrics
+
+SCRIPTS = ("analysis", "embeddings", "pipeline")
+MAIN_ENDPOINT = {
+    "analysis": "/api/analyze-github-profile",
+    "embeddings": "/api/github_embedding",
+    "pipeline": "/api/github_embedding"
+}
+# Fast defaults so a sweep finishes in minutes; pass production-like values to the mock explicitly
+DEFAULT_MOCK_ARGS = ["--analyze-latency", "50,400", "--embed-latency", "30,250", "--list-latency", "5,40"]
+REGRESSION_THRESHOLD = 0.10
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_server(subscribers: int, mock_args: List[str]) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_api_server.py"),
+                               "--port", str(port), "--subscribers", str(subscribers), *mock_args],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Mock server exited: {server.stderr.read().decode(errors='replace')[-500:]}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/healthz", timeout=1):
+                return server, base_url
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("Mock server did not start within 15s")
+
+
+async def _run_script(spec: Dict, metrics: RunMetrics):
+    retry_policy = RetryPolicy(max_attempts=spec["max_attempts"], retry_budget=None)
+    concurrency = spec["concurrency"]
+    # Imported here so the harness process itself stays small
+    if spec["script"] == "pipeline":
+        from github_pipeline import GitHubPipeline
+        runner = GitHubPipeline(base_url=spec["base_url"], service_role_key="benchmark", retry_policy=retry_policy,
+                                metrics=metrics)
+        await runner.run(page_size=spec["page_size"], analysis_concurrent=concurrency, analysis_ceiling=concurrency,
+                         embedding_concurrent=concurrency, embedding_ceiling=concurrency)
+    else:
+        if spec["script"] == "analysis":
+            from batch_github_analysis import BatchGitHubProcessor as Processor
+        else:
+            from batch_github_embeddings import BatchGitHubEmbeddingsProcessor as Processor
+        runner = Processor(base_url=spec["base_url"], service_role_key="benchmark", retry_policy=retry_policy,
+                           metrics=metrics)
+        await runner.process_batch(max_concurrent=concurrency, concurrency_ceiling=concurrency,
+                                   stream=spec["stream"], page_size=spec["page_size"])
+    return runner
+
+
+def run_one(spec: Dict) -> Dict:
+    """Run one script/size/concurrency combination in this process and measure it."""
+    metrics = RunMetrics(spec["script"])
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        runner = asyncio.run(_run_script(spec, metrics))
+    wall = time.perf_counter() - started
+    metrics.finish()
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    endpoint = metrics.report()["endpoints"].get(MAIN_ENDPOINT[spec["script"]], {}).get("latency", {})
+    finished = runner.processed_count + runner.error_count + runner.skipped_count
+    return {
+        "script": spec["script"],
+        "subscribers": spec["subscribers"],
+        "concurrency": spec["concurrency"],
+        "finished": finished,
+        "succeeded": runner.processed_count,
+        "errors": runner.error_count,
+        "retries": runner.retry_policy.retries,
+        "wall_seconds": round(wall, 3),
+        "subscribers_per_second": round(finished / wall, 2) if wall else 0.0,
+        "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 3),
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),  # ru_maxrss is KB on Linux
+        "latency": {key: endpoint.get(key, 0.0) for key in ("p50", "p95", "p99")}
+    }
+
+
+def run_child(spec: Dict) -> Dict:
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-one", json.dumps(spec)],
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{spec['script']} run failed: {completed.stderr.strip()[-500:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def print_row(result: Dict, baseline: Optional[Dict] = None):
+    latency = result["latency"]
+    line = (f"{result['script']:<11} {result['subscribers']:>7} {result['concurrency']:>4} "
+            f"{result['subscribers_per_second']:>9.1f} {result['wall_seconds']:>8.1f} {result['cpu_seconds']:>7.1f} "
+            f"{result['peak_rss_mb']:>8.1f} {latency['p50']:>6.3f} {latency['p95']:>6.3f} {latency['p99']:>6.3f} "
+            f"{result['errors']:>6} {result['retries']:>7}")
+    if baseline:
+        change = result["subscribers_per_second"] / baseline["subscribers_per_second"] - 1 if baseline["subscribers_per_second"] else 0.0
+        flag = " ⚠️ regression" if change < -REGRESSION_THRESHOLD else ""
+        line += f"  {change:+.0%} vs baseline{flag}"
+    print(line, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batch scripts against a local mock API",
+                                     epilog="Unrecognised flags are passed to mock_api_server.py")
+    parser.add_argument("--subscribers", default="1000,10000", help="Comma-separated dataset sizes")
+    parser.add_argument("--concurrency", default="5,10,20,40", help="Comma-separated concurrency settings (fixed limit)")
+    parser.add_argument("--scripts", default=",".join(SCRIPTS), help=f"Comma-separated subset of {', '.join(SCRIPTS)}")
+    parser.add_argument("--page-size", type=int, default=200, help="Subscribers per page")
+    parser.add_argument("--list", action="store_true", help="Fetch the whole list up front instead of streaming pages (analysis/embeddings)")
+    parser.add_argument("--max-attempts", type=int, default=4, help="Attempts per subscriber for transient failures")
+    parser.add_argument("--output", help="Results file (default: runs/bench-<timestamp>.json)")
+    parser.add_argument("--compare", metavar="RESULTS", help="Earlier results file to compare throughput against")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    args, mock_args = parser.parse_known_args()
+
+    if args.run_one:
+        print(json.dumps(run_one(json.loads(args.run_one))))
+        return
+
+    try:
+        scripts = [name for name in args.scripts.split(",") if name]
+        unknown = [name for name in scripts if name not in SCRIPTS]
+        if unknown:
+            raise ValueError(f"Unknown script(s): {', '.join(unknown)}")
+        sizes = [int(value) for value in args.subscribers.split(",")]
+        concurrencies = [int(value) for value in args.concurrency.split(",")]
+
+        baseline: Dict = {}
+        if args.compare:
+            with open(args.compare, "r", encoding="utf-8") as f:
+                for result in json.load(f)["results"]:
+                    baseline[(result["script"], result["subscribers"], result["concurrency"])] = result
+
+        mock_args = DEFAULT_MOCK_ARGS + mock_args  # later flags win in argparse
+        print(f"🧪 Benchmark: scripts={scripts}, subscribers={sizes}, concurrency={concurrencies}")
+        print(f"   Mock: {' '.join(mock_args)}")
+        print(f"{'script':<11} {'subs':>7} {'conc':>4} {'subs/s':>9} {'wall s':>8} {'cpu s':>7} {'rss MB':>8} "
+              f"{'p50':>6} {'p95':>6} {'p99':>6} {'errors':>6} {'retries':>7}")
+
+        results = []
+        for size in sizes:
+            server, base_url = start_mock_server(size, mock_args)
+            try:
+                for script in scripts:
+                    for concurrency in concurrencies:
+                        result = run_child({
+                            "script": script, "subscribers": size, "concurrency": concurrency,
+                            "base_url": base_url, "page_size": args.page_size, "stream": not args.list,
+                            "max_attempts": args.max_attempts
+                        })
+                        results.append(result)
+                        print_row(result, baseline.get((script, size, concurrency)))
+            finally:
+                server.terminate()
+                server.wait()
+
+        output = args.output or os.path.join(DEFAULT_JOURNAL_DIR, f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"created_at": datetime.now().isoformat(), "mock_args": mock_args, "page_size": args.page_size,
+                       "stream": not args.list, "results": results}, f, indent=2)
+        print(f"\n📝 Results: {output}")
+
+        best = max(results, key=lambda result: result["subscribers_per_second"], default=None)
+        if best:
+            print(f"🏆 Fastest: {best['script']} at concurrency {best['concurrency']} "
+                  f"({best['subscribers_per_second']:.1f} subscribers/s on {best['subscribers']} subscribers)")
+
+    except KeyboardInterrupt:
+        print("\n⚠️  Benchmark interrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Unexpected error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Change-Feed Follower
+====================
+
+Long-running mode for `github_pipeline.py --follow`. Instead of a full pass
+over the subscribers table, the pipeline polls for subscribers whose
+`github_url_changed_at` (kept current by the trigger in
+`add_subscriber_change_watermark.sql`) is past a persisted watermark, and
+runs each micro-batch through analysis and embedding as soon as it arrives:
+
+- a poll is one keyset query on (github_url_changed_at, id) over an index, so
+  an idle poll costs the same whether the table has 1k or 1M rows; steady-state
+  work follows the rate of change, not the table size
+- while pages come back full the feed keeps reading; otherwise it sleeps
+  `--poll-seconds` (a new signup is picked up within that time)
+- a write stamps the row when it runs but becomes visible when its transaction
+  commits, so a row can appear behind changes already read; once caught up the
+  feed re-reads the last `--follow-overlap-seconds` before the newest change
+  and skips (id, changed_at) pairs it has already handed out
+- the watermark file only ever moves past subscribers whose outcome has been
+  recorded (a low watermark, like a finished id range in `work_leases.py`), so
+  a crash or restart redoes at most the in-flight subscribers
+- failed subscribers are fed back after `--follow-retry-seconds`, up to
+  `--follow-attempts` times, and hold the watermark until then
+- the first Ctrl+C / SIGTERM stops polling, lets in-flight subscribers finish
+  and saves the watermark; a second Ctrl+C stops at once
+
+Watermarks are JSON files in runs/watermarks/<name>.json holding
+{"changed_at": ..., "id": ..., "recent": [[id, changed_at], ...], "floor": ...},
+where `recent` lists the finished changes inside the overlap window, so a
+restart re-reads the window without redoing them, and `floor` is the change a
+`--follow-from now` follower started after. One follower per name: two daemons
+on the same name would process every change twice.
+
+Usage:
+    python app/scripts/github_pipeline.py --service-key KEY --follow [--follow-name pipeline] [--follow-from now|start]
+    python app/scripts/change_feed.py status [--follow-name pipeline]
+    python app/scripts/change_feed.py reset [--follow-name pipeline]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from run_journal import DEFAULT_JOURNAL_DIR
+
+DEFAULT_WATERMARK_DIR = os.path.join(DEFAULT_JOURNAL_DIR, 'watermarks')
+DEFAULT_POLL_SECONDS = 5.0
+DEFAULT_FOLLOW_ATTEMPTS = 3
+DEFAULT_RETRY_SECONDS = 60.0
+# Changes that commit later than this after a newer change was read are missed
+DEFAULT_OVERLAP_SECONDS = 30.0
+# Saving the watermark is a small file write; do it at most this often while busy
+COMMIT_INTERVAL_SECONDS = 1.0
+FOLLOW_FROM = ("now", "start")
+
+Watermark = Tuple[str, int]  # (github_url_changed_at, id) of the last change handled
+
+
+def change_time(changed_at: str) -> datetime:
+    """github_url_changed_at as an aware datetime (PostgREST returns ISO 8601, naive means UTC)."""
+    parsed = datetime.fromisoformat(changed_at.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class WatermarkFile:
+    """The follower's committed watermark, replaced atomically on every save."""
+
+    def __init__(self, name: str, watermark_dir: str = DEFAULT_WATERMARK_DIR):
+        os.makedirs(watermark_dir, exist_ok=True)
+        self.name = name
+        self.path = os.path.join(watermark_dir, f"{name}.json")
+
+    def load(self) -> Optional[Watermark]:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        return (saved['changed_at'], int(saved['id'])) if saved.get('changed_at') else None
+
+    def load_window(self) -> Tuple[List[Tuple[int, str]], Optional[Watermark]]:
+        """(id, changed_at) finished inside the overlap window at the last save, and the follower's floor."""
+        if not os.path.exists(self.path):
+            return [], None
+        with open(self.path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        recent = [(int(subscriber_id), changed_at) for subscriber_id, changed_at in saved.get('recent', [])]
+        return recent, (saved['floor'][0], int(saved['floor'][1])) if saved.get('floor') else None
+
+    def save(self, watermark: Optional[Watermark], recent: Optional[List[Tuple[int, str]]] = None,
+             floor: Optional[Watermark] = None):
+        saved = {"changed_at": watermark[0], "id": watermark[1]} if watermark else {"changed_at": None, "id": 0}
+        saved["recent"] = [list(key) for key in recent or []]
+        saved["floor"] = list(floor) if floor else None
+        saved["saved_at"] = datetime.now().isoformat()
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(saved, f)
+        os.replace(temp_path, self.path)
+
+    def reset(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        os.remove(self.path)
+        return True
+
+
+class ChangeFollower:
+    """Streams changed subscribers forever and commits a watermark behind the finished ones."""
+
+    def __init__(self, store: WatermarkFile, poll_seconds: float = DEFAULT_POLL_SECONDS, start: str = "now",
+                 max_attempts: int = DEFAULT_FOLLOW_ATTEMPTS, retry_seconds: float = DEFAULT_RETRY_SECONDS,
+                 overlap_seconds: float = DEFAULT_OVERLAP_SECONDS, dry_run: bool = False):
+        if start not in FOLLOW_FROM:
+            raise ValueError(f"start must be one of {FOLLOW_FROM}, got {start!r}")
+        self.store = store
+        self.poll_seconds = poll_seconds
+        self.start = start
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.dry_run = dry_run  # nothing was written, so the saved watermark must not move
+        self.committed: Optional[Watermark] = None
+        self.saved: Optional[Watermark] = None
+        # Handed-out changes in feed order: [watermark, finished]; the watermark advances over the finished prefix
+        self.pending: Deque[List] = deque()
+        self.in_flight: Dict[int, Deque[List]] = {}  # subscriber id -> its pending entries, oldest first
+        self.originals: Dict[int, Dict] = {}  # subscriber id -> row as fetched, for retries
+        self.attempts: Dict[int, int] = {}
+        self.retries: Deque[Tuple[float, Dict]] = deque()  # (due time, subscriber)
+        # (id, changed_at) handed out within the overlap window, so a re-read skips them; the
+        # finished ones are saved with the watermark, so a restart skips them too
+        self.seen: Dict[Tuple[int, str], datetime] = {}
+        self.finished: Dict[Tuple[int, str], datetime] = {}
+        self.finished_dirty = False
+        self.newest: Optional[datetime] = None
+        self.floor: Optional[Watermark] = None  # `--follow-from now`: nothing at or before it is handed out
+        self.stopping = asyncio.Event()
+        self.polls = 0
+        self.changes = 0
+        self.retried_count = 0
+        self.late_count = 0
+        self.abandoned_count = 0
+        self.last_commit = 0.0
+        self._interrupts = 0
+        self._signals: List[int] = []
+
+    def describe(self) -> str:
+        return (f"following '{self.store.name}' from {self._format(self.committed)}, "
+                f"polling every {self.poll_seconds:g}s")
+
+    @staticmethod
+    def _format(watermark: Optional[Watermark]) -> str:
+        return f"{watermark[0]} (id {watermark[1]})" if watermark else "the first change"
+
+    def done(self, subscriber_id, failed: bool = False):
+        """A subscriber's outcome was recorded; failures are fed back until they run out of attempts."""
+        subscriber_id = int(subscriber_id)
+        entries = self.in_flight.get(subscriber_id)
+        if not entries:
+            return
+        if failed:
+            if self.stopping.is_set():
+                # Left unfinished: the watermark stays behind it and the next start retries it
+                return
+            attempts = self.attempts.get(subscriber_id, 1)
+            if attempts < self.max_attempts:
+                # Keep the entry pending: the watermark stays put until the retry is recorded
+                self.attempts[subscriber_id] = attempts + 1
+                self.retries.append((time.monotonic() + self.retry_seconds, self.originals[subscriber_id]))
+                return
+            self.abandoned_count += 1
+            print(f"⚠️ Giving up on subscriber {subscriber_id} after {attempts} attempts; "
+                  f"it is picked up again on its next change")
+
+        entry = entries.popleft()
+        entry[1] = True
+        key = (subscriber_id, entry[0][0])
+        if key in self.seen:
+            self.finished[key] = self.seen[key]
+            self.finished_dirty = True
+        if not entries:
+            del self.in_flight[subscriber_id]
+            self.originals.pop(subscriber_id, None)
+            self.attempts.pop(subscriber_id, None)
+        while self.pending and self.pending[0][1]:
+            watermark = self.pending.popleft()[0]
+            # A late commit sits behind changes already finished; the watermark never moves back
+            if self.committed is None or self._order(watermark) > self._order(self.committed):
+                self.committed = watermark
+        if time.monotonic() - self.last_commit >= COMMIT_INTERVAL_SECONDS:
+            self.commit()
+
+    def commit(self):
+        if (self.committed != self.saved or self.finished_dirty) and not self.dry_run:
+            self.store.save(self.committed, list(self.finished), self.floor)
+            self.saved = self.committed
+            self.finished_dirty = False
+        self.last_commit = time.monotonic()
+
+    @staticmethod
+    def _order(watermark: Watermark) -> Tuple[datetime, int]:
+        return change_time(watermark[0]), watermark[1]
+
+    def _rewind(self, newest: Optional[datetime]) -> Optional[Watermark]:
+        """Cursor that re-reads the overlap window before `newest`."""
+        return ((newest - self.overlap).isoformat(), 0) if newest else None
+
+    def _is_new(self, subscriber: Dict) -> bool:
+        key = (int(subscriber['id']), subscriber['github_url_changed_at'])
+        if key in self.seen:
+            return False
+        changed = change_time(key[1])
+        if self.floor and (changed, key[0]) <= self._order(self.floor):
+            return False
+        if self.newest and changed < self.newest:
+            self.late_count += 1
+        self.seen[key] = changed
+        self.newest = max(self.newest, changed) if self.newest else changed
+        return True
+
+    def _forget_seen(self):
+        horizon = self.newest - self.overlap
+        self.seen = {key: changed for key, changed in self.seen.items() if changed >= horizon}
+        finished = {key: changed for key, changed in self.finished.items() if changed >= horizon}
+        self.finished_dirty |= len(finished) != len(self.finished)
+        self.finished = finished
+
+    def _track(self, subscriber: Dict) -> Dict:
+        subscriber_id = int(subscriber['id'])
+        entry = [(subscriber['github_url_changed_at'], subscriber_id), False]
+        self.pending.append(entry)
+        self.in_flight.setdefault(subscriber_id, deque()).append(entry)
+        # The pipeline annotates the dict it is handed; a retry starts again from the row as fetched
+        self.originals[subscriber_id] = dict(subscriber)
+        self.attempts.setdefault(subscriber_id, 1)
+        self.changes += 1
+        return subscriber
+
+    def _due_retries(self) -> List[Dict]:
+        due = []
+        now = time.monotonic()
+        while self.retries and self.retries[0][0] <= now:
+            due.append(dict(self.retries.popleft()[1]))
+        self.retried_count += len(due)
+        return due
+
+    async def _wait(self, seconds: float):
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self.stopping.wait(), timeout=seconds)
+
+    async def subscribers(self, fetch_page: Callable[[Optional[Watermark]], Awaitable[List[Dict]]],
+                          fetch_latest: Callable[[], Awaitable[Optional[Watermark]]],
+                          page_size: int) -> AsyncIterator[Dict]:
+        """Yield changed subscribers, oldest change first, until stop() is called."""
+        self.committed = self.saved = self.store.load()
+        # Resuming re-reads the overlap window before the saved watermark and skips what was finished there
+        cursor = self._rewind(change_time(self.committed[0])) if self.committed else None
+        recent, self.floor = self.store.load_window()
+        self.finished = {key: change_time(key[1]) for key in recent}
+        self.seen = dict(self.finished)
+        self.newest = change_time(self.committed[0]) if self.committed else None
+        if self.committed is None and self.start == "now":
+            self.committed = cursor = await fetch_latest()
+            self.floor = self.committed
+            self.commit()
+        print(f"👀 Following changes after {self._format(self.committed)}")
+
+        while not self.stopping.is_set():
+            for subscriber in self._due_retries():
+                yield subscriber
+
+            try:
+                page = await fetch_page(cursor)
+            except Exception as e:
+                # The next poll tries again from the same cursor
+                print(f"⚠️ Change feed poll failed: {e}")
+                page = []
+            self.polls += 1
+            fresh = [self._is_new(subscriber) for subscriber in page]
+            if any(fresh):
+                print(f"🔔 {sum(fresh)} changed subscriber(s) after {self._format(cursor)}")
+            for subscriber, is_new in zip(page, fresh):
+                cursor = (subscriber['github_url_changed_at'], int(subscriber['id']))
+                if not is_new:
+                    continue
+                yield self._track(subscriber)
+                if self.stopping.is_set():
+                    # The rest of the page stays past the watermark for the next start
+                    break
+
+            if len(page) < page_size:
+                if self.newest:
+                    # Caught up: the next poll re-reads the window where a late commit can still land
+                    self._forget_seen()
+                    cursor = self._rewind(self.newest)
+                self.commit()
+                await self._wait(min(self.poll_seconds, max(0.0, self.retries[0][0] - time.monotonic()))
+                                 if self.retries else self.poll_seconds)
+
+    def stop(self):
+        """Stop polling; in-flight subscribers still finish and the watermark is saved on exit."""
+        self._interrupts += 1
+        if self._interrupts > 1:
+            # Second signal: back to the default handlers, so the next one interrupts at once
+            self._remove_signal_handlers()
+            raise KeyboardInterrupt
+        print("\n🛑 Stopping: finishing in-flight subscribers, press Ctrl+C again to abort")
+        self.stopping.set()
+
+    def _remove_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for signum in self._signals:
+            loop.remove_signal_handler(signum)
+        self._signals = []
+
+    async def __aenter__(self) -> 'ChangeFollower':
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.stop)
+                self._signals.append(signum)
+            except (NotImplementedError, RuntimeError):
+                # Windows event loops have no signal handlers; Ctrl+C then stops at once
+                pass
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._remove_signal_handlers()
+        self.commit()
+
+    def print_summary(self):
+        print(f"👀 Change feed ({self.store.name}): {self.polls} polls, {self.changes} changes, "
+              f"{self.late_count} committed late, {self.retried_count} retried, {self.abandoned_count} given up")
+        print(f"   Watermark: {self._format(self.committed)} -> {self.store.path}")
+        if self.pending:
+            print(f"   {len(self.pending)} change(s) past the watermark were unfinished and are redone on the next start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or reset a follow-mode watermark")
+    parser.add_argument("command", choices=["status", "reset"])
+    parser.add_argument("--follow-name", default="pipeline", help="Watermark name the follower was started with")
+    parser.add_argument("--watermark-dir", default=DEFAULT_WATERMARK_DIR, help="Directory holding watermark files")
+    args = parser.parse_args()
+
+    try:
+        store = WatermarkFile(args.follow_name, args.watermark_dir)
+        if args.command == "status":
+            watermark = store.load()
+            if watermark:
+                print(f"👀 '{store.name}': changes after {watermark[0]} (id {watermark[1]}) are still to be processed")
+            else:
+                print(f"👀 '{store.name}': no watermark saved; the next --follow starts from --follow-from")
+        elif store.reset():
+            print(f"🧹 Deleted watermark '{store.name}'")
+        else:
+            print(f"ℹ️ No watermark '{store.name}' to delete")
+    except KeyboardInterrupt:
+        print("\n⚠️  Interrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Unexpected error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Co-Enrollment Similarity
+========================
+
+Person <-> person course overlap across the harvard-classes rosters (see
+`roster_store.py`), without quadratic pairwise Jaccard:
+
+1. MinHash: each person's course set becomes a `num_perm` signature whose
+   per-position agreement estimates Jaccard similarity.
+2. LSH banding: signatures are cut into `bands` of `rows`; people sharing
+   any band bucket become candidate pairs, which are then kept if their
+   estimated similarity clears the threshold.
+3. Cohorts: connected components over the kept pairs.
+
+Courses are hashed by their code, not their store id, so signatures stay
+valid when the store is rebuilt. Because MinHash is a running minimum,
+`update` folds a new semester file into saved signatures without recomputing
+the old ones. `benchmark` compares against exact sparse Jaccard.
+
+Usage:
+    python app/scripts/co_enrollment.py build [--num-perm 128]
+    python app/scripts/co_enrollment.py update
+    python app/scripts/co_enrollment.py similar "Karina Chung" [--threshold 0.3]
+    python app/scripts/co_enrollment.py cohorts [--threshold 0.5] [--min-size 3]
+    python app/scripts/co_enrollment.py benchmark [--threshold 0.5]
+"""
+
+import argparse
+import os
+import sys
+import time
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from roster_store import DEFAULT_STORE_PATH, ROSTER_DIR, RosterStore
+
+DEFAULT_SIGNATURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports', 'co_enrollment.npz')
+DEFAULT_NUM_PERM = 128
+DEFAULT_THRESHOLD = 0.5
+# People with fewer distinct courses than this produce mostly trivial matches
+DEFAULT_MIN_COURSES = 3
+# Buckets bigger than this (e.g. everyone whose only course is EXPOS 20) are skipped
+MAX_BUCKET_SIZE = 500
+# Candidates this far below the threshold (by estimate) still get an exact check
+ESTIMATE_SLACK = 0.15
+MERSENNE_PRIME = (1 << 31) - 1
+PERM_CHUNK = 16
+
+
+def course_tokens(codes: List[str]) -> np.ndarray:
+    """Stable integer per course code (independent of store ids)."""
+    return np.asarray([zlib.crc32(code.encode('utf-8')) % MERSENNE_PRIME for code in codes], dtype=np.int64)
+
+
+def choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """Pick (bands, rows) with bands * rows == num_perm whose S-curve midpoint (1/b)^(1/r) is closest to threshold."""
+    options = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    return min(options, key=lambda option: abs((1 / option[0]) ** (1 / option[1]) - threshold))
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.seed = seed
+        self.a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.int64)
+        self.b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.int64)
+
+    def signatures(self, indptr: np.ndarray, tokens: np.ndarray) -> np.ndarray:
+        """Signatures (num_perm x people) for CSR rows of course tokens; empty rows stay at the max value."""
+        people = indptr.shape[0] - 1
+        signatures = np.full((self.num_perm, people), MERSENNE_PRIME, dtype=np.int64)
+        nonempty = np.flatnonzero(np.diff(indptr) > 0)
+        if tokens.size == 0:
+            return signatures
+        for start in range(0, self.num_perm, PERM_CHUNK):
+            end = min(start + PERM_CHUNK, self.num_perm)
+            hashes = (self.a[start:end, None] * tokens[None, :] + self.b[start:end, None]) % MERSENNE_PRIME
+            signatures[start:end, nonempty] = np.minimum.reduceat(hashes, indptr[nonempty], axis=1)
+        return signatures
+
+
+def person_course_sets(store: RosterStore, semesters: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Distinct (person, course id) CSR, optionally limited to some semesters."""
+    entry_people = np.repeat(np.arange(len(store.people), dtype=np.int64), np.diff(store.person_indptr))
+    entry_courses = store.person_courses.astype(np.int64)
+    if semesters is not None:
+        keep = np.isin(store.person_semesters, [store.semester_ids[name] for name in semesters])
+        entry_people, entry_courses = entry_people[keep], entry_courses[keep]
+    pairs = np.unique(entry_people * len(store.courses) + entry_courses)
+    pair_people = pairs // len(store.courses)
+    indptr = np.zeros(len(store.people) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pair_people, minlength=len(store.people)), out=indptr[1:])
+    return indptr, pairs % len(store.courses)
+
+
+def course_bitsets(store: RosterStore, names: List[str]) -> np.ndarray:
+    """One row of packed course bits per name (all-zero for names the store lacks)."""
+    indptr, courses = person_course_sets(store)
+    words = (len(store.courses) + 63) // 64
+    bits = np.zeros((len(names), words), dtype=np.uint64)
+    rows = np.asarray([store.person_ids.get(name, -1) for name in names], dtype=np.int64)
+    present = np.flatnonzero(rows >= 0)
+    counts = np.diff(indptr)[rows[present]]
+    starts = indptr[rows[present]]
+    entry_rows = np.repeat(present, counts)
+    entry_courses = courses[np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())]
+    np.bitwise_or.at(bits, (entry_rows, entry_courses // 64), np.left_shift(np.uint64(1), (entry_courses % 64).astype(np.uint64)))
+    return bits
+
+
+def popcount_rows(words: np.ndarray) -> np.ndarray:
+    """Set bits per row of packed uint64 words (np.bitwise_count needs NumPy 2)."""
+    return np.unpackbits(np.ascontiguousarray(words).view(np.uint8), axis=1).sum(axis=1, dtype=np.int64)
+
+
+def exact_jaccard(bits: np.ndarray, pairs: np.ndarray) -> np.ndarray:
+    left, right = bits[pairs[:, 0]], bits[pairs[:, 1]]
+    intersections = popcount_rows(left & right)
+    unions = popcount_rows(left | right)
+    return intersections / np.maximum(unions, 1)
+
+
+class CoEnrollmentIndex:
+    def __init__(self, hasher: MinHasher, names: List[str], signatures: np.ndarray, course_counts: np.ndarray,
+                 semesters: List[str]):
+        self.hasher = hasher
+        self.names = names
+        self.signatures = signatures  # num_perm x people
+        self.course_counts = course_counts
+        self.semesters = semesters
+        self.person_ids = {name: person_id for person_id, name in enumerate(names)}
+
+    @classmethod
+    def build(cls, store: RosterStore, num_perm: int = DEFAULT_NUM_PERM, seed: int = 1) -> 'CoEnrollmentIndex':
+        hasher = MinHasher(num_perm, seed)
+        indptr, courses = person_course_sets(store)
+        signatures = hasher.signatures(indptr, course_tokens(store.courses)[courses])
+        return cls(hasher, list(store.people), signatures, np.diff(indptr), list(store.semesters))
+
+    def update(self, store: RosterStore) -> Tuple[int, int]:
+        """Fold semesters the index has not seen yet into the signatures; returns (new semesters, new people)."""
+        new_semesters = [name for name in store.semesters if name not in self.semesters]
+        if not new_semesters:
+            return 0, 0
+        indptr, courses = person_course_sets(store, new_semesters)
+        fresh = self.hasher.signatures(indptr, course_tokens(store.courses)[courses])
+
+        # Map store people onto index columns, appending people seen for the first time
+        columns = np.empty(len(store.people), dtype=np.int64)
+        added = 0
+        for person_id, name in enumerate(store.people):
+            column = self.person_ids.get(name)
+            if column is None:
+                column = len(self.names)
+                self.names.append(name)
+                self.person_ids[name] = column
+                added += 1
+            columns[person_id] = column
+        if added:
+            self.signatures = np.hstack([self.signatures, np.full((self.hasher.num_perm, added), MERSENNE_PRIME,
+                                                                  dtype=np.int64)])
+        np.minimum.at(self.signatures.T, columns, fresh.T)
+
+        # Distinct course counts come from the rebuilt store (courses may repeat across semesters)
+        all_indptr, _ = person_course_sets(store)
+        counts = np.zeros(len(self.names), dtype=np.int64)
+        counts[columns] = np.diff(all_indptr)
+        self.course_counts = counts
+        self.semesters.extend(new_semesters)
+        return len(new_semesters), added
+
+    def candidate_pairs(self, threshold: float = DEFAULT_THRESHOLD, min_courses: int = DEFAULT_MIN_COURSES,
+                        bands: Optional[int] = None, store: Optional[RosterStore] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        LSH candidate pairs (i < j) with Jaccard >= threshold; returns (pairs, scores).
+
+        With `store`, candidates are checked exactly and scores are exact; without it, the
+        MinHash estimate decides, which misses some pairs sitting right on the threshold.
+        """
+        bands = bands or choose_bands(self.hasher.num_perm, threshold)[0]
+        rows = self.hasher.num_perm // bands
+        eligible = np.flatnonzero(self.course_counts >= min_courses)
+        mixer = np.random.default_rng(self.hasher.seed + 1).integers(1, 1 << 61, rows, dtype=np.uint64)
+
+        found = []
+        for band in range(bands):
+            block = self.signatures[band * rows:(band + 1) * rows, eligible].astype(np.uint64)
+            keys = (block * mixer[:, None]).sum(axis=0)  # wrapping uint64 hash of the band
+            order = np.argsort(keys, kind='stable')
+            sorted_keys = keys[order]
+            boundaries = np.flatnonzero(np.diff(sorted_keys)) + 1
+            for bucket in np.split(order, boundaries):
+                if 1 < bucket.size <= MAX_BUCKET_SIZE:
+                    members = eligible[bucket]
+                    left, right = np.triu_indices(members.size, k=1)
+                    found.append(np.stack([members[left], members[right]], axis=1))
+
+        if not found:
+            return np.zeros((0, 2), dtype=np.int64), np.zeros(0)
+        pairs = np.unique(np.sort(np.vstack(found), axis=1), axis=0)
+        estimates = self.estimate(pairs)
+        if store is None:
+            keep = estimates >= threshold
+            return pairs[keep], estimates[keep]
+        pairs = pairs[estimates >= threshold - ESTIMATE_SLACK]
+        scores = exact_jaccard(course_bitsets(store, self.names), pairs)
+        keep = scores >= threshold
+        return pairs[keep], scores[keep]
+
+    def estimate(self, pairs: np.ndarray) -> np.ndarray:
+        agreement = np.zeros(pairs.shape[0])
+        for start in range(0, pairs.shape[0], 100000):
+            chunk = pairs[start:start + 100000]
+            agreement[start:start + chunk.shape[0]] = (
+                self.signatures[:, chunk[:, 0]] == self.signatures[:, chunk[:, 1]]).mean(axis=0)
+        return agreement
+
+    def similar(self, name: str, top_k: int = 10, threshold: float = 0.2) -> List[Tuple[str, float]]:
+        """People whose course sets overlap most with `name` (estimated Jaccard)."""
+        person_id = self.person_ids.get(name)
+        if person_id is None:
+            raise KeyError(f"{name} is not in the rosters")
+        scores = (self.signatures == self.signatures[:, person_id:person_id + 1]).mean(axis=0)
+        scores[person_id] = -1
+        scores[self.course_counts == 0] = -1
+        best = np.argsort(-scores)[:top_k]
+        return [(self.names[index], float(scores[index])) for index in best if scores[index] >= threshold]
+
+    def cohorts(self, threshold: float = DEFAULT_THRESHOLD, min_size: int = 3,
+                min_courses: int = DEFAULT_MIN_COURSES, store: Optional[RosterStore] = None) -> List[List[int]]:
+        """Connected components of the similarity graph, largest first."""
+        pairs, _ = self.candidate_pairs(threshold, min_courses, store=store)
+        parent = np.arange(len(self.names))
+
+        def find(node: int) -> int:
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        for left, right in pairs:
+            root_left, root_right = find(left), find(right)
+            if root_left != root_right:
+                parent[max(root_left, root_right)] = min(root_left, root_right)
+
+        groups: Dict[int, List[int]] = {}
+        for node in np.unique(pairs):
+            groups.setdefault(find(int(node)), []).append(int(node))
+        return sorted((group for group in groups.values() if len(group) >= min_size), key=len, reverse=True)
+
+    def save(self, path: str = DEFAULT_SIGNATURE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, signatures=self.signatures, course_counts=self.course_counts,
+                 names=np.frombuffer('\n'.join(self.names).encode('utf-8'), dtype=np.uint8),
+                 semesters=np.asarray(self.semesters, dtype=str),
+                 num_perm=np.int64(self.hasher.num_perm), seed=np.int64(self.hasher.seed))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_SIGNATURE_PATH) -> 'CoEnrollmentIndex':
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No co-enrollment signatures at {path}; run the build command first")
+        with np.load(path) as data:
+            hasher = MinHasher(int(data['num_perm']), int(data['seed']))
+            return cls(hasher, data['names'].tobytes().decode('utf-8').split('\n'), data['signatures'],
+                       data['course_counts'], data['semesters'].tolist())
+
+
+def exact_jaccard_pairs(store: RosterStore, threshold: float, min_courses: int = DEFAULT_MIN_COURSES,
+                        block_size: int = 256) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact Jaccard >= threshold for all pairs, via blocked sparse intersection counts (X @ X.T)."""
+    indptr, courses = person_course_sets(store)
+    sizes = np.diff(indptr)
+    people = len(store.people)
+    # course -> people CSR over the distinct pairs
+    pair_people = np.repeat(np.arange(people, dtype=np.int64), sizes)
+    order = np.argsort(courses, kind='stable')
+    course_people = pair_people[order]
+    course_indptr = np.zeros(len(store.courses) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(courses, minlength=len(store.courses)), out=course_indptr[1:])
+
+    eligible = sizes >= min_courses
+    found, scores = [], []
+    for start in range(0, people, block_size):
+        block = np.arange(start, min(start + block_size, people))
+        block = block[eligible[block]]
+        if block.size == 0:
+            continue
+        # Every (block person, co-enrolled person) incidence, one bincount for the whole block
+        rows, others = [], []
+        for offset, person in enumerate(block):
+            for course in courses[indptr[person]:indptr[person + 1]]:
+                members = course_people[course_indptr[course]:course_indptr[course + 1]]
+                rows.append(np.full(members.size, offset, dtype=np.int64))
+                others.append(members)
+        intersections = np.bincount(np.concatenate(rows) * people + np.concatenate(others),
+                                    minlength=block.size * people).reshape(block.size, people)
+        unions = sizes[block][:, None] + sizes[None, :] - intersections
+        jaccard = np.where(unions > 0, intersections / np.maximum(unions, 1), 0)
+        jaccard[:, ~eligible] = 0
+        jaccard[np.arange(block.size), block] = 0
+        left, right = np.nonzero(jaccard >= threshold)
+        keep = block[left] < right
+        found.append(np.stack([block[left][keep], right[keep]], axis=1))
+        scores.append(jaccard[left[keep], right[keep]])
+    if not found:
+        return np.zeros((0, 2), dtype=np.int64), np.zeros(0)
+    return np.vstack(found), np.concatenate(scores)
+
+
+def benchmark(store: RosterStore, threshold: float, num_perms: List[int], min_courses: int):
+    started = time.perf_counter()
+    exact_pairs, _ = exact_jaccard_pairs(store, threshold, min_courses)
+    exact_seconds = time.perf_counter() - started
+    exact = {tuple(pair) for pair in exact_pairs.tolist()}
+    print(f"🎯 Exact sparse Jaccard: {len(exact)} pairs >= {threshold} in {exact_seconds:.2f}s")
+    print(f"{'perm':>5} {'bands':>5} {'rows':>4} {'pairs':>7} {'recall':>7} {'precision':>9} {'signatures s':>12} {'lsh s':>6}")
+
+    for num_perm in num_perms:
+        started = time.perf_counter()
+        index = CoEnrollmentIndex.build(store, num_perm)
+        signature_seconds = time.perf_counter() - started
+        bands, rows = choose_bands(num_perm, threshold)
+        started = time.perf_counter()
+        pairs, _ = index.candidate_pairs(threshold, min_courses, bands, store)
+        lsh_seconds = time.perf_counter() - started
+        found = {tuple(pair) for pair in pairs.tolist()}
+        hits = len(found & exact)
+        recall = hits / len(exact) if exact else 1.0
+        precision = hits / len(found) if found else 1.0
+        print(f"{num_perm:>5} {bands:>5} {rows:>4} {len(found):>7} {recall:>7.3f} {precision:>9.3f} "
+              f"{signature_seconds:>12.2f} {lsh_seconds:>6.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MinHash/LSH co-enrollment similarity over the course rosters")
+    parser.add_argument("--roster-dir", default=ROSTER_DIR, help="Directory containing people_dict_*.json")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Binary roster store path")
+    parser.add_argument("--signatures", default=DEFAULT_SIGNATURE_PATH, help="Saved MinHash signatures")
+    parser.add_argument("--min-courses", type=int, default=DEFAULT_MIN_COURSES, help="Ignore people with fewer distinct courses")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Compute MinHash signatures for everyone")
+    build_parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM, help="Signature length")
+    subparsers.add_parser("update", help="Fold newly added semester files into saved signatures")
+    similar_parser = subparsers.add_parser("similar", help="People with the most course overlap with NAME")
+    similar_parser.add_argument("name")
+    similar_parser.add_argument("--top-k", type=int, default=10)
+    similar_parser.add_argument("--threshold", type=float, default=0.2)
+    pairs_parser = subparsers.add_parser("pairs", help="Count LSH pairs above a threshold")
+    pairs_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    cohorts_parser = subparsers.add_parser("cohorts", help="Cluster people into co-enrollment cohorts")
+    cohorts_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    cohorts_parser.add_argument("--min-size", type=int, default=3)
+    cohorts_parser.add_argument("--show", type=int, default=10, help="Cohorts to print")
+    bench_parser = subparsers.add_parser("benchmark", help="Compare LSH against exact sparse Jaccard")
+    bench_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    bench_parser.add_argument("--num-perm", default="64,128,256", help="Comma-separated signature lengths")
+
+    args = parser.parse_args()
+
+    try:
+        store = RosterStore.open(args.roster_dir, args.store)
+        started = time.perf_counter()
+
+        if args.command == "build":
+            index = CoEnrollmentIndex.build(store, args.num_perm)
+            index.save(args.signatures)
+            print(f"✅ {len(index.names)} signatures ({args.num_perm} permutations) in "
+                  f"{time.perf_counter() - started:.2f}s -> {args.signatures}")
+
+        elif args.command == "update":
+            index = CoEnrollmentIndex.load(args.signatures)
+            new_semesters, new_people = index.update(store)
+            index.save(args.signatures)
+            print(f"✅ Folded in {new_semesters} new semester(s), {new_people} new people "
+                  f"in {time.perf_counter() - started:.2f}s")
+
+        elif args.command == "benchmark":
+            benchmark(store, args.threshold, [int(value) for value in args.num_perm.split(',')], args.min_courses)
+
+        else:
+            index = CoEnrollmentIndex.load(args.signatures)
+            if args.command == "similar":
+                for rank, (name, score) in enumerate(index.similar(args.name, args.top_k, args.threshold), start=1):
+                    print(f"{rank:>3}. {name} (~{score:.2f} Jaccard)")
+            elif args.command == "pairs":
+                pairs, _ = index.candidate_pairs(args.threshold, args.min_courses, store=store)
+                print(f"🔗 {len(pairs)} pairs with Jaccard >= {args.threshold} "
+                      f"in {time.perf_counter() - started:.2f}s")
+            elif args.command == "cohorts":
+                cohorts = index.cohorts(args.threshold, args.min_size, args.min_courses, store)
+                print(f"👥 {len(cohorts)} cohorts of {args.min_size}+ people in {time.perf_counter() - started:.2f}s")
+                for cohort in cohorts[:args.show]:
+                    taken = Counter(code for member in cohort for code in store.courses_of(index.names[member]))
+                    common = ', '.join(f"{code} ({count * 100 // len(cohort)}%)" for code, count in taken.most_common(4))
+                    print(f"  - {len(cohort)} people; most common courses: {common}")
+                    print(f"    {', '.join(index.names[member] for member in cohort[:8])}{' ...' if len(cohort) > 8 else ''}")
+
+    except KeyError as e:
+        print(f"❌ {e.args[0]}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\n⚠️  Process interrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Unexpected error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
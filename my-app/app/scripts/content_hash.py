@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Repository Content Hashing
+==========================
+
+Stable content hash of a repository group from `github_url_data`, computed
+over the same inputs `createRepositoryEmbeddingText` consumes. Must stay in
+sync with `repositoryContentHash` in `app/lib/github-embeddings.ts`, which
+stores the hash next to each row in `github_repository_embeddings`.
+"""
+
+import hashlib
+from typing import Dict, List, Tuple
+
+CONTENT_HASH_VERSION = "v1"
+
+
+def _field(value) -> str:
+    return "" if value is None else str(value)
+
+
+def repository_content_hash(repo_group: Dict) -> str:
+    """sha256 over NUL-framed repository fields and file path/content pairs."""
+    digest = hashlib.sha256()
+    parts = [
+        CONTENT_HASH_VERSION,
+        _field(repo_group.get('repositoryFullName')),
+        _field(repo_group.get('contributionType')),
+        _field(repo_group.get('fileCount'))
+    ]
+    for file in repo_group.get('files') or []:
+        parts.append(_field(file.get('path')))
+        parts.append(_field(file.get('content')))
+    for part in parts:
+        digest.update(part.encode('utf-8', 'surrogatepass'))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def split_changed_repositories(github_data: Dict, stored_hashes: Dict[str, str]) -> Tuple[List[Dict], List[Dict]]:
+    """Split repository groups into (changed, unchanged) against stored hashes."""
+    changed, unchanged = [], []
+    for repo_group in github_data.get('repositoryGroups') or []:
+        stored = stored_hashes.get(repo_group.get('repositoryFullName'))
+        if stored and stored == repository_content_hash(repo_group):
+            unchanged.append(repo_group)
+        else:
+            changed.append(repo_group)
+    return changed, unchanged
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Course-Based Candidate Ranking
+==============================
+
+Ranks every person in the course rosters at once (see `roster_store.py`)
+against a weighted boolean query over course codes, and writes the top-k
+straight into candidate files like `potential_senior_candidates.json`.
+
+Query language:
+    "COMPSCI 61"                 a course code (quoted; * and ? are wildcards)
+    "STAT 1*"^2                  weight a term (default 1; negative weights penalise)
+    a AND b, a OR b, NOT a       boolean structure, with ( ) for grouping
+    a b                          juxtaposition means AND
+
+A person must satisfy the boolean structure to be ranked. Their score is the
+weighted number of distinct matching courses across all non-negated terms,
+so `"COMPSCI 61" AND "STAT 110" AND "GENED *"` keeps people who took all
+three and ranks those with more GENEDs higher.
+
+Seniority is inferred from the span of semesters a person appears in
+(first to latest roster, in term order). A roster without a year (`Fall`) is
+placed with `--undated-term "Fall 2023"`, or else at the same-season term
+whose neighbouring rosters share the most people with it. Scoring is a handful of
+`np.bincount` passes over the enrolment arrays, so ranking all ~20k people
+takes milliseconds.
+
+Usage:
+    python app/scripts/course_ranking.py '"COMPSCI 61" AND "STAT 110" AND "GENED *"' [--top-k 25]
+    python app/scripts/course_ranking.py '"APCOMP 209A"^2 OR "STAT 109A"' --seniority senior --write senior
+    python app/scripts/course_ranking.py '"STAT 110"' --undated-term "Fall 2023"
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from roster_store import DEFAULT_STORE_PATH, ROSTER_DIR, RosterStore, read_roster_json
+
+DEFAULT_TOP_K = 25
+# Terms seen (first roster to last) at which a person counts as senior / junior
+SENIOR_MIN_SPAN = 3
+JUNIOR_MIN_SPAN = 2
+TERM_ORDER = {"Spring": 0, "Summer": 1, "Fall": 2}
+CANDIDATE_FILES = {
+    "junior": os.path.join(ROSTER_DIR, 'potential_junior_candidates.json'),
+    "senior": os.path.join(ROSTER_DIR, 'potential_senior_candidates.json')
+}
+
+_TOKEN = re.compile(r'\s*(?:(?P<code>"[^"]*")|(?P<weight>\^-?\d+(?:\.\d+)?)|(?P<op>AND|OR|NOT|\(|\)))', re.IGNORECASE)
+
+
+class QueryError(ValueError):
+    pass
+
+
+@dataclass
+class Term:
+    pattern: str
+    weight: float = 1.0
+
+
+@dataclass
+class Node:
+    op: str  # 'AND', 'OR', 'NOT'
+    children: List
+
+
+def tokenize(query: str) -> List[Tuple[str, str]]:
+    tokens, position = [], 0
+    query = query.rstrip()
+    while position < len(query):
+        match = _TOKEN.match(query, position)
+        if not match:
+            raise QueryError(f"Unexpected input at position {position}: {query[position:position + 20]!r} "
+                             f"(course codes must be quoted)")
+        kind = match.lastgroup
+        value = match.group(kind)
+        tokens.append((kind, value.upper() if kind == 'op' else value))
+        position = match.end()
+    return tokens
+
+
+def parse_query(query: str):
+    """Parse the query language into a tree of Node/Term."""
+    tokens = tokenize(query)
+    position = 0
+
+    def peek() -> Optional[Tuple[str, str]]:
+        return tokens[position] if position < len(tokens) else None
+
+    def take() -> Tuple[str, str]:
+        nonlocal position
+        if position >= len(tokens):
+            raise QueryError("Unexpected end of query")
+        position += 1
+        return tokens[position - 1]
+
+    def parse_or():
+        children = [parse_and()]
+        while peek() == ('op', 'OR'):
+            take()
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else Node('OR', children)
+
+    def parse_and():
+        children = [parse_unary()]
+        while peek() is not None and peek() not in (('op', 'OR'), ('op', ')')):
+            if peek() == ('op', 'AND'):
+                take()
+            children.append(parse_unary())
+        return children[0] if len(children) == 1 else Node('AND', children)
+
+    def parse_unary():
+        token = peek()
+        if token is None:
+            raise QueryError("Query ended unexpectedly")
+        if token == ('op', 'NOT'):
+            take()
+            return Node('NOT', [parse_unary()])
+        if token == ('op', '('):
+            take()
+            node = parse_or()
+            if take() != ('op', ')'):
+                raise QueryError("Missing closing parenthesis")
+            return node
+        if token[0] == 'code':
+            take()
+            term = Term(token[1][1:-1].strip().upper())
+            if peek() is not None and peek()[0] == 'weight':
+                term.weight = float(take()[1][1:])
+            return term
+        raise QueryError(f"Unexpected {token[1]!r}")
+
+    if not tokens:
+        raise QueryError("Empty query")
+    tree = parse_or()
+    if position != len(tokens):
+        raise QueryError(f"Unexpected {tokens[position][1]!r}")
+    return tree
+
+
+def parse_term(name: str) -> Optional[Tuple[int, int]]:
+    """'Fall 2024' -> (2024, TERM_ORDER['Fall']); None for a roster without a year."""
+    parts = name.split()
+    if len(parts) > 1 and parts[-1].isdigit():
+        return int(parts[-1]), TERM_ORDER.get(parts[0].capitalize(), 0)
+    return None
+
+
+def term_index(year: int, term: int) -> int:
+    """Position on a Spring/Fall timeline ('Fall 2024' -> 2024*2+1)."""
+    return year * 2 + (1 if term >= TERM_ORDER["Fall"] else 0)
+
+
+def infer_undated_terms(store: RosterStore) -> Dict[str, str]:
+    """Dated term for each roster without a year, by overlap with the dated rosters.
+
+    Each candidate is the same season in a year around the dated rosters that
+    no dated roster already covers; the one whose neighbouring terms share the
+    most people with the undated roster wins.
+    """
+    entry_people = np.repeat(np.arange(len(store.people), dtype=np.int64), np.diff(store.person_indptr))
+    people = {name: np.unique(entry_people[store.person_semesters == semester_id])
+              for name, semester_id in store.semester_ids.items()}
+    dated = {name: parse_term(name) for name in store.semesters if parse_term(name)}
+    dated_indexes = {term_index(*term): name for name, term in dated.items()}
+    years = [year for year, _ in dated.values()]
+
+    placed = {}
+    for name in store.semesters:
+        if name in dated or not years:
+            continue
+        season = name.split()[0].capitalize() if name.split() else ""
+        best = None
+        for year in range(min(years) - 1, max(years) + 2):
+            index = term_index(year, TERM_ORDER.get(season, 0))
+            if index in dated_indexes:
+                continue
+            overlap = sum(np.intersect1d(people[name], people[dated_indexes[neighbour]], assume_unique=True).size
+                          for neighbour in (index - 1, index + 1) if neighbour in dated_indexes)
+            if best is None or overlap > best[0]:
+                best = (overlap, f"{season} {year}")
+        if best:
+            placed[name] = best[1]
+    return placed
+
+
+def semester_term_index(names: List[str], undated_terms: Optional[Dict[str, str]] = None) -> np.ndarray:
+    """Position of each roster on a Spring/Fall timeline; undated rosters use `undated_terms` ('Fall' -> 'Fall 2023')."""
+    indexes = []
+    for name in names:
+        term = parse_term(name) or parse_term((undated_terms or {}).get(name, ''))
+        if term is None:
+            raise KeyError(f"No term for undated roster '{name}'; pass --undated-term \"{name} <year>\"")
+        indexes.append(term_index(*term))
+    return np.asarray(indexes, dtype=np.int64)
+
+
+def parse_undated_terms(values: List[str], semesters: List[str]) -> Dict[str, str]:
+    """--undated-term values ('Fall 2023') keyed by the undated roster of that season ('Fall')."""
+    undated = {name.lower(): name for name in semesters if parse_term(name) is None}
+    terms = {}
+    for value in values:
+        season = value.split()[0].lower() if value.split() else ""
+        if parse_term(value) is None or season not in undated:
+            raise KeyError(f"--undated-term {value!r} must look like '<Season> <year>' for an undated roster "
+                           f"({', '.join(undated.values()) or 'there are none'})")
+        terms[undated[season]] = value
+    return terms
+
+
+class CourseRanker:
+    def __init__(self, store: RosterStore, semesters: Optional[List[str]] = None,
+                 undated_terms: Optional[Dict[str, str]] = None):
+        self.store = store
+        # Caller-given placements win; the rest are inferred from roster overlap
+        self.undated_terms = {**infer_undated_terms(store), **(undated_terms or {})}
+        people_count = len(store.people)
+        entry_people = np.repeat(np.arange(people_count, dtype=np.int64), np.diff(store.person_indptr))
+        entry_courses = store.person_courses.astype(np.int64)
+        entry_semesters = store.person_semesters
+
+        if semesters:
+            unknown = [name for name in semesters if name not in store.semester_ids]
+            if unknown:
+                raise KeyError(f"Unknown semester(s) {', '.join(unknown)}; known: {', '.join(store.semesters)}")
+            keep = np.isin(entry_semesters, [store.semester_ids[name] for name in semesters])
+            entry_people, entry_courses, entry_semesters = entry_people[keep], entry_courses[keep], entry_semesters[keep]
+
+        # Distinct (person, course) pairs: a course taken in two semesters counts once
+        pairs = np.unique(entry_people * len(store.courses) + entry_courses)
+        self.pair_people = pairs // len(store.courses)
+        self.pair_courses = pairs % len(store.courses)
+
+        self.seniority_span, self.first_seen, self.last_seen = self._semester_spans(entry_people, entry_semesters)
+        self._course_codes = [code.upper() for code in store.courses]
+        self._pattern_cache: Dict[str, np.ndarray] = {}
+
+    def _semester_spans(self, entry_people: np.ndarray, entry_semesters: np.ndarray):
+        """Terms between a person's first roster and their last (inclusive), in chronological order."""
+        roster_terms = semester_term_index(self.store.semesters, self.undated_terms)
+
+        people_count = len(self.store.people)
+        terms = roster_terms[entry_semesters]
+        first = np.full(people_count, np.iinfo(np.int64).max)
+        last = np.full(people_count, np.iinfo(np.int64).min)
+        np.minimum.at(first, entry_people, terms)
+        np.maximum.at(last, entry_people, terms)
+        seen = last >= first
+        span = np.where(seen, last - first + 1, 0)
+        return span, first, last
+
+    def seniority(self, person_id: int) -> str:
+        span = self.seniority_span[person_id]
+        if span >= SENIOR_MIN_SPAN:
+            return "senior"
+        if span >= JUNIOR_MIN_SPAN:
+            return "junior"
+        return "new" if span else "unknown"
+
+    def _course_matches(self, pattern: str) -> np.ndarray:
+        if pattern not in self._pattern_cache:
+            if any(char in pattern for char in '*?['):
+                matches = [fnmatch.fnmatchcase(code, pattern) for code in self._course_codes]
+            else:
+                matches = [code == pattern for code in self._course_codes]
+            self._pattern_cache[pattern] = np.asarray(matches, dtype=np.float64)
+        return self._pattern_cache[pattern]
+
+    def _evaluate(self, node) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (eligible mask, score) over all people."""
+        people_count = len(self.store.people)
+        if isinstance(node, Term):
+            hits = np.bincount(self.pair_people, weights=self._course_matches(node.pattern)[self.pair_courses],
+                               minlength=people_count)
+            return hits > 0, hits * node.weight
+        results = [self._evaluate(child) for child in node.children]
+        if node.op == 'NOT':
+            mask, _ = results[0]
+            return ~mask, np.zeros(people_count)
+        masks = np.vstack([mask for mask, _ in results])
+        score = np.sum([score for _, score in results], axis=0)
+        return (masks.all(axis=0) if node.op == 'AND' else masks.any(axis=0)), score
+
+    def rank(self, query: str, top_k: int = DEFAULT_TOP_K, seniority: Optional[str] = None,
+             min_span: int = 0) -> List[Dict]:
+        mask, score = self._evaluate(parse_query(query))
+        if seniority == "senior":
+            mask &= self.seniority_span >= SENIOR_MIN_SPAN
+        elif seniority == "junior":
+            mask &= (self.seniority_span >= JUNIOR_MIN_SPAN) & (self.seniority_span < SENIOR_MIN_SPAN)
+        if min_span:
+            mask &= self.seniority_span >= min_span
+
+        eligible = np.flatnonzero(mask)
+        if eligible.size == 0:
+            return []
+        # Ties broken by longer history, then by person id for stable output
+        order = np.lexsort((eligible, -self.seniority_span[eligible], -score[eligible]))[:top_k]
+        return [{
+            "name": self.store.people[person_id],
+            "score": round(float(score[person_id]), 3),
+            "seniority": self.seniority(person_id),
+            "semester_span": int(self.seniority_span[person_id]),
+            "courses": self.store.courses_of(self.store.people[person_id])
+        } for person_id in eligible[order]]
+
+
+def write_candidates(path: str, ranked: List[Dict], merge: bool = False):
+    """Write {name: [course codes]} in the candidate-file format."""
+    existing: Dict[str, List[str]] = {}
+    if merge and os.path.exists(path):
+        existing = read_roster_json(path)
+    for candidate in ranked:
+        existing[candidate["name"]] = candidate["courses"]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(existing, f, indent=4, ensure_ascii=False)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank people in the course rosters against a course query")
+    parser.add_argument("query", help='e.g. \'"COMPSCI 61" AND "STAT 110" AND "GENED *"\'')
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K, help="Candidates to return")
+    parser.add_argument("--seniority", choices=["junior", "senior"], help="Keep only people with this inferred seniority")
+    parser.add_argument("--min-span", type=int, default=0, help="Minimum number of terms between first and last roster")
+    parser.add_argument("--semesters", help="Comma-separated semesters to consider (default: all)")
+    parser.add_argument("--write", choices=sorted(CANDIDATE_FILES), help="Write results to potential_<junior|senior>_candidates.json")
+    parser.add_argument("--output", help="Write results to this candidate file instead")
+    parser.add_argument("--merge", action="store_true", help="Keep existing entries in the output file")
+    parser.add_argument("--undated-term", action="append", default=[], metavar="TERM",
+                        help='Term of the roster without a year, e.g. "Fall 2023" (default: inferred from roster overlap)')
+    parser.add_argument("--roster-dir", default=ROSTER_DIR, help="Directory containing people_dict_*.json")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Binary roster store path")
+
+    args = parser.parse_args()
+
+    try:
+        started = time.perf_counter()
+        store = RosterStore.open(args.roster_dir, args.store)
+        semesters = [name.strip() for name in args.semesters.split(',')] if args.semesters else None
+        ranker = CourseRanker(store, semesters, parse_undated_terms(args.undated_term, store.semesters))
+        loaded = time.perf_counter()
+        for name, term in ranker.undated_terms.items():
+            print(f"📅 Undated roster '{name}' placed at {term}"
+                  f"{'' if term in args.undated_term else ' (inferred from roster overlap)'}")
+        ranked = ranker.rank(args.query, args.top_k, args.seniority, args.min_span)
+        finished = time.perf_counter()
+
+        print(f"📊 Ranked {len(store.people)} people in {(finished - loaded) * 1000:.1f}ms "
+              f"(store load {(loaded - started) * 1000:.1f}ms)")
+        if not ranked:
+            print("❌ No one matches this query")
+            return
+        for rank, candidate in enumerate(ranked, start=1):
+            print(f"{rank:>3}. {candidate['name']} - score {candidate['score']}, {candidate['seniority']} "
+                  f"({candidate['semester_span']} terms)")
+
+        output = args.output or (CANDIDATE_FILES[args.write] if args.write else None)
+        if output:
+            write_candidates(output, ranked, args.merge)
+            print(f"💾 Wrote {len(ranked)} candidates to {output}")
+
+    except (QueryError, KeyError) as e:
+        print(f"❌ {e.args[0]}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Unexpected error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
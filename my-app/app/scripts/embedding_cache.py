@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Embedding Cache
+===============
+
+Content-addressed, on-disk cache for the batch embedding tooling, so repeated
+runs (a dry run followed by a live run, retries after partial failures) don't
+pay Voyage and Gemini again for identical repository text.
+
+    sha256(model + NUL + embedding text)          -> Voyage vector (float32 blob)
+    sha256(prompt version + NUL + embedding text) -> Gemini technology analysis (JSON)
+
+Keys match `embeddingCacheKey` / `analysisCacheKey` in `app/lib/github-embeddings.ts`,
+so the client sends cached entries as `precomputed` and the server only calls
+upstream for the rest. Entries live in a single SQLite file and are evicted
+least-recently-used once the file grows past its size cap.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+EMBEDDING_MODEL = "voyage-code-3"
+# Must match TECH_ANALYSIS_PROMPT_VERSION in app/lib/github-embeddings.ts
+TECH_ANALYSIS_PROMPT_VERSION = "v1"
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'embeddings.sqlite3')
+DEFAULT_CACHE_MAX_MB = 512
+
+EMBEDDING = "embedding"
+ANALYSIS = "analysis"
+
+
+def _sha256_parts(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8', 'surrogatepass'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def embedding_key(text: str) -> str:
+    return _sha256_parts(EMBEDDING_MODEL, text)
+
+
+def analysis_key(text: str) -> str:
+    return _sha256_parts(TECH_ANALYSIS_PROMPT_VERSION, text)
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_CACHE_MAX_MB * 1024 * 1024):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = {kind: {"hits": 0, "misses": 0, "stored": 0} for kind in (EMBEDDING, ANALYSIS)}
+        self.evictions = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._db.commit()
+        self.total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _get(self, kind: str, keys: List[str]) -> Dict[str, bytes]:
+        found: Dict[str, bytes] = {}
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._db.execute(f"SELECT key, value FROM entries WHERE kind = ? AND key IN ({placeholders})",
+                                    [kind, *batch]).fetchall()
+            found.update(rows)
+        if found:
+            now = time.time()
+            self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            self._db.commit()
+        self.stats[kind]["hits"] += len(found)
+        self.stats[kind]["misses"] += len(set(keys)) - len(found)
+        return found
+
+    def _put(self, kind: str, items: Dict[str, bytes]):
+        if not items:
+            return
+        now = time.time()
+        for key, value in items.items():
+            previous = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO entries (key, kind, value, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                             (key, kind, value, len(value), now))
+            self.total_bytes += len(value) - (previous[0] if previous else 0)
+            self.stats[kind]["stored"] += 1
+        self._evict()
+        self._db.commit()
+
+    def _evict(self):
+        """Drop least-recently-used entries until the cache fits under max_bytes."""
+        while self.total_bytes > self.max_bytes:
+            rows = self._db.execute("SELECT key, size FROM entries ORDER BY last_used LIMIT 100").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.total_bytes -= size
+                self.evictions += 1
+
+    def lookup(self, texts: Iterable[str]) -> Dict:
+        """Cached results for these embedding texts, in the API's `precomputed` shape."""
+        texts = list(texts)
+        embeddings = self._get(EMBEDDING, [embedding_key(text) for text in texts])
+        analyses = self._get(ANALYSIS, [analysis_key(text) for text in texts])
+        precomputed = {}
+        if embeddings:
+            precomputed["embeddings"] = {key: array('f', value).tolist() for key, value in embeddings.items()}
+        if analyses:
+            precomputed["analyses"] = {key: json.loads(value) for key, value in analyses.items()}
+        return precomputed
+
+    def store(self, computed: Optional[Dict]):
+        """Save the `computed` results returned by the API."""
+        if not computed:
+            return
+        self._put(EMBEDDING, {key: array('f', vector).tobytes()
+                              for key, vector in (computed.get("embeddings") or {}).items()})
+        self._put(ANALYSIS, {key: json.dumps(analysis).encode('utf-8')
+                             for key, analysis in (computed.get("analyses") or {}).items()})
+
+    def summary(self) -> Dict:
+        return {
+            "path": self.path,
+            "size_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            **{kind: dict(stats) for kind, stats in self.stats.items()}
+        }
+
+    def print_summary(self):
+        print(f"🗄️ Cache: {self.path} ({self.total_bytes / 1024 / 1024:.1f}/{self.max_bytes / 1024 / 1024:.0f} MB, "
+              f"{self.evictions} evicted)")
+        for kind, stats in self.stats.items():
+            lookups = stats["hits"] + stats["misses"]
+            hit_rate = f"{stats['hits'] / lookups:.0%}" if lookups else "n/a"
+            print(f"  - {kind}: {stats['hits']} hits, {stats['misses']} misses ({hit_rate}), {stats['stored']} stored")
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Embedding Text Preprocessing
+============================
+
+Optional stage (`--preprocess`) that cleans a subscriber's `github_url_data`
+before the embedding scripts upload it to `/api/github_embedding`, where
+`createRepositoryEmbeddingText` only trims each file by character count:
+
+- drops files that say nothing about the developer: lockfiles, vendored
+  dependencies, build output, generated code (by name or by an
+  "@generated" / "DO NOT EDIT" header comment), minified bundles, binaries,
+  and empty files
+- names that are also common source folders (`build/`, `vendor/`, `out/`, ...)
+  only count at the repository root, or for build artifacts (`.class`,
+  `.map`, ...) at any depth; `src/build/compiler.py` is kept
+- drops a file whose contents already appeared earlier in the subscriber's
+  repositories (copied configs, LICENSEs, forks of the same template)
+- fits each repository into `--repo-token-budget` estimated tokens: small
+  files are kept whole and the rest of the budget is shared by the larger
+  files, each cut on line boundaries to its first 70% and its end
+- applies the route's own character truncation up front, so no byte is
+  uploaded only to be cut off by the server
+
+A repository whose files would all be dropped is sent unchanged. Token counts
+are an estimate (word pieces of up to 4 characters, punctuation and newlines
+count one each), close to BPE tokenizers on source code; no tokenizer is
+needed.
+
+Stored content hashes (`--incremental`) and cache keys are computed on the
+preprocessed data, so turning `--preprocess` on or off re-embeds every
+repository once.
+
+Usage:
+    python app/scripts/embedding_prep.py github_url_data.json [--repo-token-budget 8000] [--verbose]
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from embedding_text import budget_per_file, create_repository_embedding_text, truncate_file_content
+
+DEFAULT_REPO_TOKEN_BUDGET = 8000
+
+LOCKFILES = {
+    'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml', 'bun.lockb', 'poetry.lock',
+    'pipfile.lock', 'uv.lock', 'cargo.lock', 'gemfile.lock', 'composer.lock', 'go.sum', 'mix.lock',
+    'podfile.lock', 'flake.lock', 'pubspec.lock', 'packages.lock.json', 'gradle.lockfile', 'package.resolved'
+}
+# Dependency and build directories wherever they appear
+VENDORED_DIRS = {'node_modules', 'bower_components', 'site-packages', 'jspm_packages', '.venv'}
+BUILD_DIRS = {'.next', '.nuxt', '__pycache__', '.output'}
+# Names that are also ordinary source folders (src/build/, lib/vendor/): only at the repository root
+ROOT_VENDORED_DIRS = {'vendor', 'third_party', 'third-party', 'venv', 'pods', 'carthage'}
+ROOT_BUILD_DIRS = {'dist', 'build', 'out', 'target', 'coverage'}
+# Compiler and bundler output, dropped under a build directory at any depth
+BUILD_ARTIFACT_SUFFIXES = ('.class', '.o', '.obj', '.pyc', '.so', '.dll', '.jar', '.wasm', '.map', '.d.ts',
+                           '.bundle.js', '.chunk.js', '.chunk.css')
+GENERATED_SUFFIXES = ('.min.js', '.min.css', '.map', '.pb.go', '_pb2.py', '_pb2_grpc.py', '.pb.cc', '.pb.h',
+                      '.g.dart', '.freezed.dart', '.designer.cs', '.generated.ts', '.generated.js', '.snap')
+GENERATED_MARKER = re.compile(r'@generated|code generated by|do not edit|auto-?generated|automatically generated',
+                              re.IGNORECASE)
+# Generated-code markers only count in the comment lines a file starts with, within this many characters
+MARKER_WINDOW = 2000
+COMMENT_PREFIXES = ('#', '//', '/*', '*', '--', ';', '%', '<!--', '"""', "'''")
+BLOCK_COMMENTS = (('/*', '*/'), ('<!--', '-->'), ('"""', '"""'), ("'''", "'''"))
+# Prose, where "do not edit" is an instruction to the reader and '#' starts a heading
+DOC_SUFFIXES = ('.md', '.markdown', '.rst', '.txt', '.adoc')
+# Minified: long content packed into few, very long lines
+MINIFIED_MIN_CHARS = 2000
+MINIFIED_AVG_LINE = 300
+
+TOKEN_PIECE = re.compile(r'\w{1,4}|[^\w\s]|\n')
+TRUNCATION_MARKER = '\n\n... [content truncated] ...\n\n'
+# Rough size of a token in source code, for cutting text that has no line breaks
+CHARS_PER_TOKEN = 3
+
+DROP_REASONS = ("lockfile", "vendored", "build output", "generated", "minified", "binary", "empty", "duplicate")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate BPE token count for source code."""
+    return len(TOKEN_PIECE.findall(text))
+
+
+def leading_comments(content: str) -> str:
+    """The comment lines a file starts with (blank lines and a shebang skipped), up to the first code line."""
+    header = []
+    closer = None
+    for line in content[:MARKER_WINDOW].splitlines():
+        stripped = line.strip()
+        if closer:
+            header.append(stripped)
+            if closer in stripped:
+                closer = None
+            continue
+        if not stripped or (not header and stripped.startswith('#!')):
+            continue
+        if not stripped.startswith(COMMENT_PREFIXES):
+            break
+        header.append(stripped)
+        for opener, block_closer in BLOCK_COMMENTS:
+            if stripped.startswith(opener) and block_closer not in stripped[len(opener):]:
+                closer = block_closer
+                break
+    return '\n'.join(header)
+
+
+def classify_file(path: str, content: str) -> Optional[str]:
+    """Why a file should not be embedded, or None to keep it."""
+    parts = [part.lower() for part in (path or '').replace('\\', '/').split('/') if part]
+    name = parts[-1] if parts else ''
+    dirs = parts[:-1]
+    if name in LOCKFILES or name.endswith('.lock'):
+        return "lockfile"
+    if any(part in VENDORED_DIRS for part in dirs) or (dirs and dirs[0] in ROOT_VENDORED_DIRS):
+        return "vendored"
+    if (any(part in BUILD_DIRS for part in dirs) or (dirs and dirs[0] in ROOT_BUILD_DIRS)
+            or (name.endswith(BUILD_ARTIFACT_SUFFIXES) and any(part in ROOT_BUILD_DIRS for part in dirs))):
+        return "build output"
+    if not content.strip():
+        return "empty"
+    if '\x00' in content:
+        return "binary"
+    if name.endswith(GENERATED_SUFFIXES) or (not name.endswith(DOC_SUFFIXES)
+                                              and GENERATED_MARKER.search(leading_comments(content))):
+        return "generated"
+    if len(content) >= MINIFIED_MIN_CHARS and len(content) / (content.count('\n') + 1) > MINIFIED_AVG_LINE:
+        return "minified"
+    return None
+
+
+def trim_to_tokens(content: str, budget: int) -> str:
+    """Keep whole lines from the start (70% of `budget`) and the end (the rest)."""
+    lines = content.split('\n')
+    costs = [estimate_tokens(line) + 1 for line in lines]
+    head_budget = int(budget * 0.7)
+    tail_budget = budget - head_budget
+
+    head, used = 0, 0
+    while head < len(lines) and used + costs[head] <= head_budget:
+        used += costs[head]
+        head += 1
+    tail, used = len(lines), 0
+    while tail > head and used + costs[tail - 1] <= tail_budget:
+        tail -= 1
+        used += costs[tail]
+    if tail <= head:
+        return content
+    if head == 0 and tail == len(lines):
+        # No line fits (e.g. one huge line): fall back to a character cut of about the same size
+        return truncate_file_content(content, budget * CHARS_PER_TOKEN)
+    return '\n'.join(lines[:head]) + TRUNCATION_MARKER + '\n'.join(lines[tail:])
+
+
+def allocate_budget(costs: List[int], budget: int) -> List[int]:
+    """Split `budget` over files: ones below their share stay whole, the rest share what is left equally."""
+    allocation = [0] * len(costs)
+    remaining = budget
+    order = sorted(range(len(costs)), key=lambda index: costs[index])
+    for position, index in enumerate(order):
+        share = remaining // (len(order) - position)
+        allocation[index] = min(costs[index], share)
+        remaining -= allocation[index]
+    return allocation
+
+
+def _content_key(content: str) -> str:
+    return hashlib.sha256(content.strip().encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def _group_bytes(repo_group: Dict) -> int:
+    return sum(len((file.get('content') or '').encode('utf-8', 'surrogatepass')) for file in repo_group.get('files') or [])
+
+
+def _group_tokens(repo_group: Dict) -> int:
+    return estimate_tokens(create_repository_embedding_text(repo_group))
+
+
+@dataclass
+class PrepStats:
+    subscribers: int = 0
+    repositories: int = 0
+    files: int = 0
+    kept_unchanged: int = 0  # repositories sent as they were because every file would have been dropped
+    trimmed: int = 0  # files cut to fit the repository token budget
+    dropped: Dict[str, int] = field(default_factory=dict)  # reason -> files
+    dropped_bytes: Dict[str, int] = field(default_factory=dict)  # reason -> bytes of file content
+    bytes_before: int = 0  # file content in github_url_data
+    bytes_after: int = 0  # file content uploaded
+    tokens_before: int = 0  # estimated tokens of the text the route would have embedded
+    tokens_after: int = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+class EmbeddingPreprocessor:
+    def __init__(self, repo_token_budget: Optional[int] = DEFAULT_REPO_TOKEN_BUDGET, verbose: bool = False):
+        self.repo_token_budget = repo_token_budget or None  # None/0 = no token budget
+        self.verbose = verbose
+        self.stats = PrepStats()
+
+    def apply(self, github_data: Dict) -> Dict:
+        """A copy of `github_data` with every repository group preprocessed."""
+        self.stats.subscribers += 1
+        seen: Dict[str, str] = {}  # content hash -> path of its first occurrence
+        groups = [self.prepare_group(repo_group, seen) for repo_group in github_data.get('repositoryGroups') or []]
+        return {**github_data, 'repositoryGroups': groups}
+
+    def prepare_group(self, repo_group: Dict, seen: Dict[str, str]) -> Dict:
+        stats = self.stats
+        files = repo_group.get('files') or []
+        stats.repositories += 1
+        stats.files += len(files)
+        stats.bytes_before += _group_bytes(repo_group)
+        stats.tokens_before += _group_tokens(repo_group)
+
+        kept, drops = [], []
+        for file in files:
+            content = file.get('content') or ''
+            reason = classify_file(file.get('path') or file.get('name') or '', content)
+            key = None if reason else _content_key(content)
+            if key in seen:
+                reason = "duplicate"
+            if reason:
+                drops.append((reason, file.get('path'), content))
+                continue
+            seen[key] = file.get('path')
+            kept.append(file)
+
+        if not kept:
+            # Nothing better to embed: the route would have used these files anyway
+            stats.kept_unchanged += 1
+            result = repo_group
+        else:
+            for reason, path, content in drops:
+                if self.verbose:
+                    print(f"🗑️ {repo_group.get('repositoryFullName')}/{path} ({reason})")
+                stats.dropped[reason] = stats.dropped.get(reason, 0) + 1
+                stats.dropped_bytes[reason] = (stats.dropped_bytes.get(reason, 0)
+                                               + len(content.encode('utf-8', 'surrogatepass')))
+            kept = self._fit_budget(kept)
+            # The route budgets characters by fileCount; count only what is sent
+            file_budget = budget_per_file(len(kept))
+            kept = [{**file, 'content': truncate_file_content(file.get('content') or '', file_budget)} for file in kept]
+            result = {**repo_group, 'files': kept, 'fileCount': len(kept)}
+
+        stats.bytes_after += _group_bytes(result)
+        stats.tokens_after += _group_tokens(result)
+        return result
+
+    def _fit_budget(self, files: List[Dict]) -> List[Dict]:
+        if not self.repo_token_budget:
+            return files
+        costs = [estimate_tokens(file.get('content') or '') for file in files]
+        if sum(costs) <= self.repo_token_budget:
+            return files
+        fitted = []
+        for file, cost, allocation in zip(files, costs, allocate_budget(costs, self.repo_token_budget)):
+            if allocation < cost:
+                self.stats.trimmed += 1
+                file = {**file, 'content': trim_to_tokens(file.get('content') or '', allocation)}
+            fitted.append(file)
+        return fitted
+
+    def print_summary(self):
+        stats = self.stats
+        print(f"✂️ Embedding text preprocessing: {stats.subscribers} subscribers, {stats.repositories} repositories, "
+              f"{stats.files} files")
+        dropped = ", ".join(f"{reason} {stats.dropped[reason]} ({_mb(stats.dropped_bytes[reason])})"
+                            for reason in DROP_REASONS if stats.dropped.get(reason))
+        print(f"   Dropped: {dropped or 'nothing'}")
+        print(f"   Trimmed to {self.repo_token_budget or 'no'} tokens per repository: {stats.trimmed} files"
+              f"{f', {stats.kept_unchanged} repositories sent unchanged' if stats.kept_unchanged else ''}")
+        print(f"   Uploaded file content: {_mb(stats.bytes_before)} -> {_mb(stats.bytes_after)} "
+              f"({_percent(stats.bytes_saved, stats.bytes_before)} saved)")
+        print(f"   Embedded text: ~{stats.tokens_before:,} -> ~{stats.tokens_after:,} tokens "
+              f"({_percent(stats.tokens_saved, stats.tokens_before)} saved, estimated)")
+
+
+def _mb(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f} MB" if size >= 1024 * 1024 else f"{size / 1024:.1f} KB"
+
+
+def _percent(part: int, whole: int) -> str:
+    return f"{part / whole:.0%}" if whole else "0%"
+
+
+def _load_github_data(path: str) -> List[Dict]:
+    """github_url_data from a file holding one object, a list of them, or subscriber rows."""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    items = data if isinstance(data, list) else [data]
+    github_data = [item.get('github_url_data', item) for item in items]
+    return [data for data in github_data if data and data.get('repositoryGroups')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show what --preprocess drops and trims before embedding")
+    parser.add_argument("path", help="JSON file: github_url_data, a list of it, or subscriber rows with github_url_data")
+    parser.add_argument("--repo-token-budget", type=int, default=DEFAULT_REPO_TOKEN_BUDGET, help="Estimated tokens per repository (0 = no budget)")
+    parser.add_argument("--verbose", action="store_true", help="List every dropped file")
+    args = parser.parse_args()
+
+    try:
+        preprocessor = EmbeddingPreprocessor(args.repo_token_budget, verbose=args.verbose)
+        for github_data in _load_github_data(args.path):
+            preprocessor.apply(github_data)
+        preprocessor.print_summary()
+    except KeyboardInterrupt:
+        print("\n⚠️  Interrupted by user")
+    except Exception as e:
+        print(f"\n❌ Unexpected error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Repository Embedding Text
+=========================
+
+Python port of `createRepositoryEmbeddingText` in `app/lib/github-embeddings.ts`,
+so the batch tooling can derive the exact text the server will embed (for
+cache keys and size accounting) without a round trip. Lengths and truncation
+are measured in UTF-16 code units to match JavaScript string semantics.
+"""
+
+from typing import Dict, Optional
+
+
+def _js(obj: Dict, key: str) -> str:
+    """Format obj[key] the way a JavaScript template literal would (missing -> undefined, None -> null)."""
+    if key not in obj:
+        return "undefined"
+    value = obj[key]
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _utf16_len(text: str) -> int:
+    return len(text.encode('utf-16-le', 'surrogatepass')) // 2
+
+
+def _utf16_slice(text: str, start: int, end: Optional[int] = None) -> str:
+    encoded = text.encode('utf-16-le', 'surrogatepass')
+    end_byte = None if end is None else end * 2
+    return encoded[start * 2:end_byte].decode('utf-16-le', 'surrogatepass')
+
+
+def budget_per_file(file_count) -> Optional[int]:
+    """Adaptive per-file character budget; None where JavaScript arithmetic yields NaN."""
+    if not isinstance(file_count, (int, float)) or isinstance(file_count, bool) or file_count <= 0:
+        return None
+    if file_count <= 3:
+        repo_base_budget = min(20000, file_count * 8000)  # Small repos: proportional, max 20KB
+    elif file_count <= 10:
+        repo_base_budget = 50000  # Medium repos: 50KB
+    else:
+        repo_base_budget = 75000  # Large repos: 75KB
+    return min(int(repo_base_budget // file_count), 25000)  # Max 25KB per individual file
+
+
+def truncate_file_content(file_content: str, budget: Optional[int]) -> str:
+    """Keep the first 70% and the end of a file longer than `budget` UTF-16 units."""
+    length = _utf16_len(file_content)
+    if budget is None or length <= budget:
+        return file_content
+    beginning_chars = int(budget * 0.7)
+    ending_chars = budget - beginning_chars - 50
+    return (_utf16_slice(file_content, 0, beginning_chars) +
+            '\n\n... [content truncated] ...\n\n' +
+            _utf16_slice(file_content, length - ending_chars))
+
+
+def create_repository_embedding_text(repo_group: Dict) -> str:
+    file_budget = budget_per_file(repo_group.get('fileCount'))
+
+    embedding_parts = [
+        f"Repository: {_js(repo_group, 'repositoryFullName')}",
+        f"Contribution Type: {_js(repo_group, 'contributionType')}",
+        f"Files Contributed: {_js(repo_group, 'fileCount')}",
+        ''
+    ]
+
+    for file in repo_group.get('files') or []:
+        embedding_parts.append(f"--- File: {_js(file, 'path')} ---")
+
+        # Apply per-file budget with smart truncation
+        embedding_parts.append(truncate_file_content(file.get('content') or '', file_budget))
+        embedding_parts.append('')  # Separator between files
+
+    return '\n'.join(embedding_parts)
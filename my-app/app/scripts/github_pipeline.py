@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+GitHub Analysis + Embedding Pipeline
+====================================
+
+Runs analysis (`batch_github_analysis.py`) and embedding
+(`batch_github_embeddings.py`) as one pass over the subscribers table,
+split into stages joined by bounded asyncio queues:
+
+    fetch -> validate -> analyze (GitHub) -> embed (Voyage/Gemini) -> record
+
+Every stage has its own workers and its own adaptive limiter, so a slow
+embedding upstream never holds GitHub slots: a subscriber frees its analysis
+slot as soon as the analysis is stored and waits in the embed queue instead.
+When a queue fills up, the stage feeding it blocks (backpressure) and the
+whole run takes about as long as its slowest stage rather than the sum of
+both passes.
+
+With `--follow` the pipeline runs as a daemon instead: it polls for
+subscribers changed since a saved watermark and processes them within
+seconds of the change (see `change_feed.py`).
+
+Usage:
+    python app/scripts/github_pipeline.py --service-key YOUR_SERVICE_KEY [--dry-run] [--limit N] [--skip-existing] [--cache [PATH]]
+    python app/scripts/github_pipeline.py --service-key YOUR_SERVICE_KEY --follow [--poll-seconds 5] [--follow-from now|start]
+"""
+
+import asyncio
+import aiohttp
+import argparse
+import contextlib
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from subscriber_stream import DEFAULT_PAGE_SIZE
+from run_journal import DEFAULT_JOURNAL_DIR, RunJournal
+from adaptive_limiter import AdaptiveLimiter
+from retry_policy import RetryPolicy
+from run_metrics import RunMetrics, set_current_subscriber, write_metrics_report
+from embedding_cache import DEFAULT_CACHE_MAX_MB, DEFAULT_CACHE_PATH, EmbeddingCache
+from http_transport import TransportSettings, create_session
+from work_leases import (DEFAULT_LEASE_SECONDS, DEFAULT_RANGE_SIZE, RangeWorker, create_range_worker, parse_shard,
+                         worker_journal_name)
+from change_feed import (DEFAULT_FOLLOW_ATTEMPTS, DEFAULT_OVERLAP_SECONDS, DEFAULT_POLL_SECONDS, DEFAULT_RETRY_SECONDS,
+                         DEFAULT_WATERMARK_DIR, FOLLOW_FROM, ChangeFollower, WatermarkFile)
+from batch_github_analysis import BatchGitHubProcessor
+from batch_github_embeddings import BatchGitHubEmbeddingsProcessor
+from embedding_prep import DEFAULT_REPO_TOKEN_BUDGET, EmbeddingPreprocessor
+
+
+class Stage:
+    """One pipeline step: `workers` coroutines pulling from a bounded input queue."""
+
+    def __init__(self, name: str, handler: Callable[[Dict], Awaitable[Optional[Dict]]], workers: int,
+                 queue_size: Optional[int] = None):
+        self.name = name
+        self.handler = handler  # returns the item for the next stage, or None once the item is finished
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or workers * 2)
+        self.items = 0
+        self.busy = 0.0  # seconds inside the handler, summed over workers
+        self.blocked = 0.0  # seconds waiting for room in the next stage's queue
+        self.idle = 0.0  # seconds waiting for input
+
+    def summary(self, wall: float) -> Dict:
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "avg_seconds": self.busy / self.items if self.items else 0.0,
+            "utilisation": self.busy / (wall * self.workers) if wall else 0.0,
+            "blocked_seconds": self.blocked / self.workers,
+            "idle_seconds": self.idle / self.workers
+        }
+
+
+async def run_stages(source: AsyncIterator[Dict], stages: List[Stage]) -> int:
+    """Feed `source` through `stages` in order; returns the number of items produced by `source`."""
+    produced = 0
+
+    async def producer():
+        nonlocal produced
+        try:
+            async for item in source:
+                await stages[0].queue.put(item)
+                produced += 1
+        finally:
+            for _ in range(stages[0].workers):
+                await stages[0].queue.put(None)
+
+    async def run_stage(index: int):
+        stage = stages[index]
+        downstream = stages[index + 1] if index + 1 < len(stages) else None
+
+        async def worker():
+            while True:
+                waited = time.monotonic()
+                item = await stage.queue.get()
+                started = time.monotonic()
+                stage.idle += started - waited
+                if item is None:
+                    return
+                output = await stage.handler(item)
+                finished = time.monotonic()
+                stage.busy += finished - started
+                stage.items += 1
+                if output is not None and downstream:
+                    await downstream.queue.put(output)
+                    stage.blocked += time.monotonic() - finished
+
+        try:
+            await asyncio.gather(*[worker() for _ in range(stage.workers)])
+        finally:
+            # Downstream workers stop once every upstream worker is done
+            if downstream:
+                for _ in range(downstream.workers):
+                    await downstream.queue.put(None)
+
+    await asyncio.gather(producer(), *[run_stage(index) for index in range(len(stages))])
+    return produced
+
+
+# Outcomes kept for the summary in --follow mode
+RESULT_HISTORY = 10000
+
+
+class GitHubPipeline:
+    def __init__(self, base_url: str = "http://localhost:3000", dry_run: bool = False, service_role_key: str = None,
+                 journal: Optional[RunJournal] = None, retry_policy: Optional[RetryPolicy] = None,
+                 cache: Optional[EmbeddingCache] = None, metrics: Optional[RunMetrics] = None,
+                 transport: Optional[TransportSettings] = None, work: Optional[RangeWorker] = None,
+                 follow: Optional[ChangeFollower] = None, preprocessor: Optional[EmbeddingPreprocessor] = None):
+        self.dry_run = dry_run
+        self.metrics = metrics
+        self.transport = transport
+        self.work = work
+        self.follow = follow
+        self.journal = journal
+        self.cache = cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        # The existing processors provide the per-subscriber API calls; the pipeline owns scheduling
+        self.analysis = BatchGitHubProcessor(base_url=base_url, dry_run=dry_run, service_role_key=service_role_key)
+        self.embeddings = BatchGitHubEmbeddingsProcessor(base_url=base_url, dry_run=dry_run,
+                                                         service_role_key=service_role_key, cache=cache,
+                                                         preprocessor=preprocessor)
+        self.github_limiter: Optional[AdaptiveLimiter] = None
+        self.embedding_limiter: Optional[AdaptiveLimiter] = None
+        self.stages: List[Stage] = []
+        self.skip_existing = False
+        self.fetched_count = 0
+        self.processed_count = 0
+        self.error_count = 0
+        self.skipped_count = 0
+        self.resumed_count = 0
+        # A follower runs for days; keep the summary's error list to the most recent outcomes
+        self.results = deque(maxlen=RESULT_HISTORY) if follow else []
+        self.wall_seconds = 0.0
+
+    async def validate(self, subscriber: Dict) -> Optional[Dict]:
+        """Drop subscribers finished in an earlier attempt or without a usable GitHub username"""
+        # A follower sees the same subscriber again on every change, so the journal only records there
+        if self.journal and not self.follow and self.journal.is_completed(subscriber.get('id')):
+            self.resumed_count += 1
+            if self.work:
+                self.work.done(subscriber.get('id'))
+            return None
+        skipped = self.analysis.precheck_subscriber(subscriber, self.skip_existing)
+        if skipped:
+            await self.finish_subscriber(skipped)
+            return None
+        subscriber['_username'] = self.analysis.extract_github_username(subscriber.get('github_url', ''))
+        return subscriber
+
+    async def analyze_once(self, session: aiohttp.ClientSession, subscriber: Dict) -> Dict:
+        username = subscriber['_username']
+        result = await self.analysis.analyze_github_profile(session, username, subscriber.get('id'),
+                                                            subscriber.get('first_name'), subscriber.get('last_name'),
+                                                            skip_embedding=True)
+        if not result.get("success"):
+            return {
+                "subscriber_id": subscriber.get('id'),
+                "status": "error",
+                "stage": "analysis",
+                "username": username,
+                "http_status": result.get("http_status"),
+                "retry_after": result.get("retry_after"),
+                "network_error": result.get("network_error", False),
+                "error": result.get("error")
+            }
+        return {
+            "subscriber_id": subscriber.get('id'),
+            "status": "success",
+            "username": username,
+            "repositories_analyzed": result.get("repositories_analyzed", 0),
+            "http_status": result.get("http_status"),
+            "dry_run": result.get("dry_run", False),
+            "analysis_data": result.get("analysis_data")
+        }
+
+    async def analyze(self, session: aiohttp.ClientSession, subscriber: Dict) -> Optional[Dict]:
+        """GitHub analysis, stored by the API without the inline embedding call"""
+        print(f"🔍 Analyzing {subscriber['_username']} (ID: {subscriber.get('id')})")
+        set_current_subscriber(subscriber.get('id'))
+        result = await self.retry_policy.run(self.github_limiter, BatchGitHubProcessor.UPSTREAM,
+                                             lambda: self.analyze_once(session, subscriber))
+        if result["status"] != "success":
+            await self.finish_subscriber(result)
+            return None
+
+        analysis_data = result.pop("analysis_data")
+        if not self.dry_run:
+            if analysis_data is None:
+                result.update(status="error", stage="analysis",
+                              error="analyze-github-profile did not return analysisData (server predates skip_embedding)")
+                await self.finish_subscriber(result)
+                return None
+            if not analysis_data.get('repositoryGroups'):
+                await self.finish_subscriber({**result, "embedding_generated": False, "reason": "No repositories to embed"})
+                return None
+        subscriber['github_url_data'] = analysis_data
+        self.embeddings.preprocess(subscriber)
+        subscriber['_result'] = result
+        return subscriber
+
+    async def embed_once(self, session: aiohttp.ClientSession, subscriber: Dict) -> Dict:
+        result = await self.embeddings.generate_embedding(session, subscriber.get('id'), subscriber['github_url_data'],
+                                                          precomputed=self.embeddings.precomputed_for(subscriber))
+        merged = {**subscriber['_result'], "http_status": result.get("http_status")}
+        if not result.get("success"):
+            merged.update({
+                "status": "error",
+                "stage": "embedding",
+                "retry_after": result.get("retry_after"),
+                "network_error": result.get("network_error", False),
+                "error": result.get("error"),
+                "details": result.get("details", "")
+            })
+            return merged
+        merged.update({
+            "embedding_generated": result.get("embedding_generated", False),
+            "vector_length": result.get("query_vector_length", 0),
+            "computed": result.get("computed")
+        })
+        return merged
+
+    async def embed(self, session: aiohttp.ClientSession, subscriber: Dict) -> Dict:
+        """Repository embeddings from the analysis the previous stage just stored"""
+        set_current_subscriber(subscriber.get('id'))
+        result = await self.retry_policy.run(self.embedding_limiter, BatchGitHubEmbeddingsProcessor.UPSTREAM,
+                                             lambda: self.embed_once(session, subscriber))
+        subscriber.pop('_precomputed', None)
+        return result
+
+    async def record(self, result: Dict) -> None:
+        """Journal and count a finished subscriber; the routes already stored its analysis and embeddings."""
+        await self.finish_subscriber(result)
+        return None
+
+    async def finish_subscriber(self, result: Dict):
+        """Record a final subscriber outcome and print progress"""
+        # Newly computed embeddings/analyses go to the cache, not the journal
+        computed = result.pop("computed", None)
+        if self.cache:
+            self.cache.store(computed)
+
+        if result["status"] == "success":
+            self.processed_count += 1
+        elif result["status"] == "error":
+            self.error_count += 1
+        else:
+            self.skipped_count += 1
+        self.results.append(result)
+        if self.journal:
+            self.journal.record(result)
+        if self.work:
+            self.work.done(result['subscriber_id'])
+        if self.follow:
+            self.follow.done(result['subscriber_id'], failed=result["status"] == "error")
+
+        status_emoji = "✅" if result["status"] == "success" else "⏭️" if result["status"] == "skipped" else "❌"
+        print(f"{status_emoji} User {result['subscriber_id']}: {result.get('username', 'N/A')} - {result['status']}")
+        if result["status"] == "error":
+            print(f"   Error ({result.get('stage', 'unknown')}): {result.get('error')}")
+            if result.get('details'):
+                print(f"   Details: {result.get('details')}")
+
+    async def counted(self, source: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+        async for subscriber in source:
+            self.fetched_count += 1
+            yield subscriber
+
+    async def run(self, limit: Optional[int] = None, skip_existing: bool = False, page_size: int = DEFAULT_PAGE_SIZE,
+                  analysis_concurrent: int = 5, analysis_ceiling: Optional[int] = None,
+                  embedding_concurrent: int = 5, embedding_ceiling: Optional[int] = None,
+                  rate_limit: Optional[float] = None, queue_size: Optional[int] = None):
+        """Stream every subscriber with a GitHub URL through analysis and embedding"""
+        print(f"🚀 Starting GitHub analysis + embedding pipeline...")
+        self.skip_existing = skip_existing
+        # Separate limiters: throttling on one upstream no longer shrinks the other stage
+        self.github_limiter = AdaptiveLimiter(initial_limit=analysis_concurrent,
+                                              max_limit=analysis_ceiling or analysis_concurrent * 4,
+                                              rate_per_second=rate_limit)
+        self.embedding_limiter = AdaptiveLimiter(initial_limit=embedding_concurrent,
+                                                 max_limit=embedding_ceiling or embedding_concurrent * 4,
+                                                 rate_per_second=rate_limit)
+        print(f"📊 Settings: limit={limit}, skip_existing={skip_existing}, page_size={page_size}, "
+              f"analysis={analysis_concurrent}..{self.github_limiter.max_limit}, "
+              f"embedding={embedding_concurrent}..{self.embedding_limiter.max_limit}, rate_limit={rate_limit}")
+        print(f"🏃 Mode: {'DRY RUN' if self.dry_run else 'LIVE'}{', FOLLOW' if self.follow else ''}")
+        if self.work:
+            print(f"🧩 Work: {self.work.describe()}")
+        if self.follow:
+            print(f"👀 Changes: {self.follow.describe()}")
+        print()
+
+        if self.metrics:
+            await self.metrics.start()
+        started = time.monotonic()
+        # Both stages share one pool, sized for both limiters' ceilings
+        async with create_session(self.github_limiter.max_limit + self.embedding_limiter.max_limit, self.transport,
+                                  trace_configs=[self.metrics.trace_config()] if self.metrics else None) as session, \
+                self.work or self.follow or contextlib.nullcontext():
+            # One worker per possible limiter slot; the limiters decide how many are in flight
+            self.stages = [
+                Stage("validate", self.validate, 1, queue_size),
+                Stage("analyze", lambda subscriber: self.analyze(session, subscriber), self.github_limiter.max_limit, queue_size),
+                Stage("embed", lambda subscriber: self.embed(session, subscriber), self.embedding_limiter.max_limit, queue_size),
+                Stage("record", self.record, 1, queue_size)
+            ]
+            if self.follow:
+                # Micro-batches of recently changed subscribers until stopped
+                source = self.follow.subscribers(
+                    lambda after: self.analysis.changed_subscribers(session, after, page_size),
+                    lambda: self.analysis.latest_change(session), page_size)
+            elif self.work:
+                # Claim id ranges (static shard or lease) and stream each one in turn
+                source = self.work.subscribers(
+                    lambda after_id, max_id: self.analysis.stream_subscribers_with_github_urls(
+                        session, None, skip_existing, page_size, after_id, max_id),
+                    await self.analysis.last_subscriber_id(session))
+            else:
+                source = self.analysis.stream_subscribers_with_github_urls(session, limit, skip_existing, page_size)
+            total = await run_stages(self.counted(source), self.stages)
+        self.wall_seconds = time.monotonic() - started
+
+        if not total and not self.follow:
+            print("❌ No subscribers found with GitHub URLs")
+            return
+
+        self.print_summary()
+
+    def print_summary(self):
+        """Print processing summary"""
+        print("\n" + "="*60)
+        print("📊 PIPELINE SUMMARY")
+        print("="*60)
+        print(f"📥 Fetched: {self.fetched_count}")
+        print(f"✅ Analyzed and embedded: {self.processed_count}")
+        print(f"❌ Errors: {self.error_count}")
+        for stage in ("analysis", "embedding"):
+            failed = sum(1 for r in self.results if r["status"] == "error" and r.get("stage") == stage)
+            if failed:
+                print(f"  - failed in {stage}: {failed}")
+        print(f"⏭️ Skipped: {self.skipped_count}")
+        if self.resumed_count:
+            print(f"♻️ Already completed in earlier attempts: {self.resumed_count}")
+
+        if self.stages and self.wall_seconds:
+            print(f"\n⏱️ Stages ({self.wall_seconds:.1f}s wall):")
+            summaries = {stage.name: stage.summary(self.wall_seconds) for stage in self.stages}
+            for name, summary in summaries.items():
+                print(f"  - {name:<10} workers={summary['workers']:<3} items={summary['items']:<6} "
+                      f"avg={summary['avg_seconds']:.2f}s busy={summary['utilisation']:.0%} "
+                      f"blocked={summary['blocked_seconds']:.1f}s idle={summary['idle_seconds']:.1f}s")
+            bottleneck = max(summaries, key=lambda name: summaries[name]['utilisation'])
+            print(f"  🐢 Bottleneck: {bottleneck}")
+
+        if self.error_count > 0:
+            print("\n❌ ERRORS:")
+            for result in self.results:
+                if result["status"] == "error":
+                    print(f"  - User {result['subscriber_id']} ({result.get('username', 'N/A')}, {result.get('stage')}): {result.get('error')}")
+
+        for label, limiter in (("GitHub", self.github_limiter), ("Embedding", self.embedding_limiter)):
+            if limiter:
+                print(f"\n{label} limiter:")
+                limiter.print_summary()
+        self.retry_policy.print_summary()
+        if self.work:
+            self.work.print_summary()
+        if self.follow:
+            self.follow.print_summary()
+        if self.embeddings.preprocessor:
+            self.embeddings.preprocessor.print_summary()
+        if self.cache:
+            self.cache.print_summary()
+        if self.metrics:
+            print()
+            self.metrics.print_summary()
+
+        if self.journal:
+            print(f"\n📝 Run journal: {self.journal.path}")
+            if not self.follow:
+                print(f"   Retry failed/pending subscribers with: --resume {self.journal.run_id}")
+
+        print(f"\n🕐 Completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze GitHub profiles and embed them in one pipelined pass")
+    parser.add_argument("--dry-run", action="store_true", help="Preview what would be processed without making changes")
+    parser.add_argument("--limit", type=int, help="Limit number of subscribers to process")
+    parser.add_argument("--skip-existing", action="store_true", help="Skip subscribers who already have GitHub embeddings")
+    parser.add_argument("--base-url", default="http://localhost:3000", help="Base URL for API calls")
+    parser.add_argument("--service-key", required=True, help="Supabase service role key for authentication")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Subscribers per page")
+    parser.add_argument("--analysis-concurrent", type=int, default=5, help="Initial concurrent GitHub analyses (adapts to upstream health)")
+    parser.add_argument("--analysis-ceiling", type=int, help="Upper bound for analysis concurrency (default: 4x --analysis-concurrent)")
+    parser.add_argument("--embedding-concurrent", type=int, default=5, help="Initial concurrent embedding calls (adapts to upstream health)")
+    parser.add_argument("--embedding-ceiling", type=int, help="Upper bound for embedding concurrency (default: 4x --embedding-concurrent)")
+    parser.add_argument("--rate-limit", type=float, help="Max requests per second to each upstream (token bucket)")
+    parser.add_argument("--queue-size", type=int, help="Items buffered between stages (default: 2x the next stage's workers)")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_PATH, metavar="PATH",
+                        help=f"Reuse embeddings/analyses from a local SQLite cache (default path: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_MB, help="Evict least-recently-used cache entries beyond this size")
+    parser.add_argument("--preprocess", action="store_true", help="Drop lockfiles, vendored/generated/minified and duplicate files and fit each repository to a token budget before embedding")
+    parser.add_argument("--repo-token-budget", type=int, default=DEFAULT_REPO_TOKEN_BUDGET, help="With --preprocess: estimated tokens per repository (0 = no budget)")
+    parser.add_argument("--max-attempts", type=int, default=4, help="Attempts per call for transient failures (429/502/503/504, network)")
+    parser.add_argument("--retry-budget", type=int, default=100, help="Maximum retries across the whole run")
+    parser.add_argument("--resume", metavar="RUN_ID", help="Resume a previous run, skipping subscribers it already completed")
+    parser.add_argument("--journal-dir", default=DEFAULT_JOURNAL_DIR, help="Directory for run journals")
+    parser.add_argument("--profile", action="store_true", help="Also record event-loop lag and per-subscriber timing in the run report")
+    parser.add_argument("--metrics-textfile", metavar="PATH", help="Prometheus textfile path (default: next to the run journal)")
+    parser.add_argument("--connect-timeout", type=float, default=TransportSettings.connect_timeout, help="Seconds to open a connection to the API")
+    parser.add_argument("--read-timeout", type=float, default=TransportSettings.read_timeout, help="Seconds to wait for response data before failing the call")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N", help="Process only id ranges I, I+N, I+2N, ... (static split across N workers)")
+    parser.add_argument("--leases", metavar="PATH|api", help="Claim id ranges through expiring leases in a SQLite file, or the batch_work_leases table with 'api'")
+    parser.add_argument("--lease-run", default="pipeline", help="Name shared by the workers of one coordinated run")
+    parser.add_argument("--range-size", type=int, default=DEFAULT_RANGE_SIZE, help="Subscriber ids per claimed range")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS, help="Lease length; a crashed worker's ranges are claimed again after this")
+    parser.add_argument("--follow", action="store_true", help="Run until stopped, processing subscribers as their GitHub URL or name changes")
+    parser.add_argument("--follow-name", default="pipeline", help="Name of the saved watermark (one running follower per name)")
+    parser.add_argument("--follow-from", choices=FOLLOW_FROM, default="now", help="Where a follower without a saved watermark starts: the latest change, or every subscriber")
+    parser.add_argument("--poll-seconds", type=float, default=DEFAULT_POLL_SECONDS, help="Seconds between change-feed polls while idle")
+    parser.add_argument("--follow-attempts", type=int, default=DEFAULT_FOLLOW_ATTEMPTS, help="Times a failed subscriber is processed before the watermark moves past it")
+    parser.add_argument("--follow-retry-seconds", type=float, default=DEFAULT_RETRY_SECONDS, help="Delay before a failed subscriber is processed again")
+    parser.add_argument("--follow-overlap-seconds", type=float, default=DEFAULT_OVERLAP_SECONDS, help="Window before the newest change that is re-read on every idle poll, for writes that commit late")
+    parser.add_argument("--watermark-dir", default=DEFAULT_WATERMARK_DIR, help="Directory for follow-mode watermarks")
+
+    args = parser.parse_args()
+    if args.shard and args.leases:
+        parser.error("--shard and --leases are alternatives; pick one")
+    if (args.shard or args.leases) and args.limit:
+        parser.error("--limit cannot be combined with --shard/--leases")
+    if args.follow and (args.shard or args.leases or args.limit or args.resume or args.skip_existing):
+        parser.error("--follow cannot be combined with --shard/--leases/--limit/--resume/--skip-existing")
+
+    # Open the run journal (new run, or the one being resumed)
+    try:
+        if args.resume:
+            journal = RunJournal.resume(args.resume, args.journal_dir)
+            print(f"♻️ Resuming run {journal.run_id} ({len(journal.outcomes)} subscribers already recorded)")
+        else:
+            journal = RunJournal.start(f"pipeline-follow-{args.follow_name}" if args.follow
+                                       else worker_journal_name("pipeline", args.shard, args.leases),
+                                       args.journal_dir, settings=vars(args) | {"service_key": None})
+    except Exception as e:
+        print(f"❌ Failed to open run journal: {e}")
+        sys.exit(1)
+
+    metrics = RunMetrics("pipeline", profile=args.profile)
+    cache = None
+    try:
+        cache = EmbeddingCache(args.cache, args.cache_max_mb * 1024 * 1024) if args.cache else None
+        work = create_range_worker(args.shard, args.leases, args.lease_run, args.range_size, args.lease_seconds,
+                                   args.base_url, args.service_key)
+        follow = ChangeFollower(WatermarkFile(args.follow_name, args.watermark_dir), args.poll_seconds,
+                                args.follow_from, args.follow_attempts, args.follow_retry_seconds,
+                                args.follow_overlap_seconds, dry_run=args.dry_run) if args.follow else None
+        pipeline = GitHubPipeline(base_url=args.base_url, dry_run=args.dry_run, service_role_key=args.service_key,
+                                  journal=journal, metrics=metrics, work=work, follow=follow,
+                                  preprocessor=EmbeddingPreprocessor(args.repo_token_budget) if args.preprocess else None,
+                                  transport=TransportSettings(connect_timeout=args.connect_timeout, read_timeout=args.read_timeout),
+                                  retry_policy=RetryPolicy(max_attempts=args.max_attempts, retry_budget=args.retry_budget),
+                                  cache=cache)
+    except Exception as e:
+        print(f"❌ Failed to initialize pipeline: {e}")
+        journal.close()
+        if cache:
+            cache.close()
+        sys.exit(1)
+
+    try:
+        asyncio.run(pipeline.run(
+            limit=args.limit,
+            skip_existing=args.skip_existing,
+            page_size=args.page_size,
+            analysis_concurrent=args.analysis_concurrent,
+            analysis_ceiling=args.analysis_ceiling,
+            embedding_concurrent=args.embedding_concurrent,
+            embedding_ceiling=args.embedding_ceiling,
+            rate_limit=args.rate_limit,
+            queue_size=args.queue_size
+        ))
+    except KeyboardInterrupt:
+        print("\n⚠️  Process interrupted by user")
+        pipeline.print_summary()
+    except Exception as e:
+        print(f"\n❌ Unexpected error: {e}")
+        pipeline.print_summary()
+    finally:
+        write_metrics_report(metrics, journal, args.metrics_textfile)
+        journal.close()
+        if cache:
+            cache.close()
+
+if __name__ == "__main__":
+    main()
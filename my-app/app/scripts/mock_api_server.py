@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Mock API Server
+===============
+
+Local aiohttp stand-in for the Next.js routes the batch scripts call, for
+load tests that must not touch production:
+
+    GET  /api/get_subscribers_with_github       (keyset pagination, max_id, order, include_heavy, sort=changed)
+    GET  /api/get_subscribers_with_github_data  (keyset pagination, max_id, order)
+    POST /api/analyze-github-profile            (skip_embedding -> analysisData)
+    POST /api/github_embedding                  (precomputed / returnComputed)
+    POST /api/check_github_usernames            (bulk existence check for --precheck)
+
+Subscribers are synthetic and derived from their id and the seed, so a
+100k-subscriber dataset costs no memory until a page is requested. Latency
+per endpoint is lognormal (median and p99), with a configurable error rate
+and periodic 429 bursts that carry Retry-After. Responses include the same
+Server-Timing names as the real routes. With `--change-rate` a background
+task keeps touching random subscribers, feeding `github_pipeline.py --follow`.
+
+Usage:
+    python app/scripts/mock_api_server.py [--port 3999] [--subscribers 10000] [--analyze-latency 800,6000]
+        [--embed-latency 400,3000] [--error-rate 0.01] [--burst-every 60 --burst-seconds 5] [--file-kb 2]
+        [--duplicate-ratio 0.05] [--missing-ratio 0.02] [--change-rate 2] [--junk-files]
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from embedding_cache import analysis_key, embedding_key
+from embedding_text import create_repository_embedding_text
+
+Z_99 = 2.326
+
+
+@dataclass(frozen=True)
+class Latency:
+    """Lognormal latency given its median and p99 in milliseconds."""
+    median_ms: float
+    p99_ms: float
+
+    @classmethod
+    def parse(cls, value: str) -> 'Latency':
+        median, _, p99 = value.partition(',')
+        return cls(float(median), float(p99 or median))
+
+    def sample(self, rng: random.Random) -> float:
+        if self.p99_ms <= self.median_ms:
+            return self.median_ms / 1000
+        sigma = math.log(self.p99_ms / self.median_ms) / Z_99
+        return rng.lognormvariate(math.log(self.median_ms), sigma) / 1000
+
+
+@dataclass
+class MockProfile:
+    subscribers: int = 10000
+    seed: int = 1
+    list_latency: Latency = Latency(20, 150)
+    analyze_latency: Latency = Latency(800, 6000)
+    embed_latency: Latency = Latency(400, 3000)
+    error_rate: float = 0.01  # share of analyze/embed calls answered with 500/502/503
+    burst_every: float = 0.0  # seconds between 429 bursts (0 disables them)
+    burst_seconds: float = 5.0
+    retry_after: int = 2
+    invalid_url_ratio: float = 0.05
+    existing_ratio: float = 0.0  # share of subscribers that already have embeddings
+    duplicate_ratio: float = 0.0  # share of subscribers reusing a lower id's handle (with other casing)
+    missing_ratio: float = 0.0  # share of handles with no GitHub account
+    max_repos: int = 6
+    file_kb: float = 2.0
+    dims: int = 1024
+    change_rate: float = 0.0  # subscribers touched per second (github_url_changed_at moves to now)
+    junk_files: bool = False  # add a lockfile, a minified bundle and a shared LICENSE to every repository
+
+
+class MockAPI:
+    def __init__(self, profile: MockProfile):
+        self.profile = profile
+        self.rng = random.Random(profile.seed)
+        self.started = time.monotonic()
+        self.calls: Dict[str, int] = {}
+        # id -> changed_at of subscribers touched since startup, oldest change first; the rest keep
+        # the backfilled epoch + id seconds from add_subscriber_change_watermark.sql
+        self.changes: Dict[int, float] = {}
+
+    def _subscriber_rng(self, subscriber_id: int) -> random.Random:
+        return random.Random(self.profile.seed * 1_000_003 + subscriber_id)
+
+    def _handle_rng(self, subscriber_id: int) -> random.Random:
+        # Separate stream, so handle settings leave the rest of the dataset unchanged
+        return random.Random(self.profile.seed * 7_000_003 + subscriber_id)
+
+    def github_url(self, subscriber_id: int) -> str:
+        if self._subscriber_rng(subscriber_id).random() < self.profile.invalid_url_ratio:
+            return "https://github.com/orgs"
+        rng = self._handle_rng(subscriber_id)
+        if subscriber_id > 1 and rng.random() < self.profile.duplicate_ratio:
+            return f"https://github.com/User{rng.randint(1, subscriber_id - 1)}/"
+        return f"https://github.com/user{subscriber_id}"
+
+    def handle_exists(self, handle_number: int) -> bool:
+        rng = self._handle_rng(handle_number)
+        rng.random(), rng.random()
+        return rng.random() >= self.profile.missing_ratio
+
+    def has_embeddings(self, subscriber_id: int) -> bool:
+        rng = self._subscriber_rng(subscriber_id)
+        rng.random()
+        return rng.random() < self.profile.existing_ratio
+
+    def github_url_data(self, subscriber_id: int) -> Dict:
+        rng = self._subscriber_rng(subscriber_id)
+        rng.random(), rng.random()
+        groups = []
+        for repo in range(rng.randint(1, self.profile.max_repos)):
+            files = []
+            for index in range(rng.randint(1, 3)):
+                size = max(16, int(rng.expovariate(1 / (self.profile.file_kb * 1024))))
+                line = f"def handler_{repo}_{index}(event):\n    return process(event, {subscriber_id})\n"
+                content = (line * (size // len(line) + 1))[:size]
+                files.append({"name": f"module_{index}.py", "path": f"src/module_{index}.py", "content": content, "size": size})
+            if self.profile.junk_files:
+                files.extend(self._junk_files(rng, repo))
+            groups.append({
+                "repositoryName": f"repo{repo}",
+                "repositoryFullName": f"user{subscriber_id}/repo{repo}",
+                "contributionType": "owner" if repo % 3 else "contributor",
+                "fileCount": len(files),
+                "files": files
+            })
+        return {"username": f"user{subscriber_id}", "repositoryGroups": groups}
+
+    def changed_at(self, subscriber_id: int) -> float:
+        return self.changes.get(subscriber_id, float(subscriber_id))
+
+    def change_feed(self, descending: bool):
+        """(changed_at, id) of every subscriber in change order."""
+        if descending:
+            yield from ((changed, subscriber_id) for subscriber_id, changed in reversed(self.changes.items()))
+            yield from ((float(subscriber_id), subscriber_id) for subscriber_id in range(self.profile.subscribers, 0, -1)
+                        if subscriber_id not in self.changes)
+            return
+        yield from ((float(subscriber_id), subscriber_id) for subscriber_id in range(1, self.profile.subscribers + 1)
+                    if subscriber_id not in self.changes)
+        yield from ((changed, subscriber_id) for subscriber_id, changed in list(self.changes.items()))
+
+    async def churn(self):
+        rng = random.Random(self.profile.seed * 9_000_011)
+        while True:
+            await asyncio.sleep(rng.expovariate(self.profile.change_rate))
+            subscriber_id = rng.randint(1, self.profile.subscribers)
+            self.changes.pop(subscriber_id, None)
+            self.changes[subscriber_id] = time.time()
+
+    async def start_churn(self, app: web.Application):
+        if self.profile.change_rate > 0:
+            app['churn'] = asyncio.create_task(self.churn())
+
+    @staticmethod
+    def _junk_files(rng: random.Random, repo: int) -> List[Dict]:
+        """What real repositories carry besides code, for embedding_prep.py to drop."""
+        lock = "{\n" + "".join(f'  "node_modules/pkg-{repo}-{index}": {{"version": "1.{index}.0", "integrity": "sha512-{rng.getrandbits(128):032x}"}},\n'
+                               for index in range(rng.randint(100, 300))) + "}\n"
+        bundle = "".join(f"var a{index}=function(b){{return b*{index}}};" for index in range(rng.randint(1000, 3000)))
+        license_text = "MIT License\n\nPermission is hereby granted, free of charge, to any person obtaining a copy\n" * 12
+        return [
+            {"name": "package-lock.json", "path": "package-lock.json", "content": lock, "size": len(lock)},
+            {"name": "app.min.js", "path": "dist/app.min.js", "content": bundle, "size": len(bundle)},
+            {"name": "LICENSE", "path": "LICENSE", "content": license_text, "size": len(license_text)}
+        ]
+
+    def row(self, subscriber_id: int, heavy: bool, with_data: bool) -> Dict:
+        row = {
+            "id": subscriber_id,
+            "email": f"subscriber{subscriber_id}@example.com",
+            "first_name": "Test",
+            "last_name": f"User{subscriber_id}",
+            "github_url": self.github_url(subscriber_id)
+        }
+        if heavy or with_data:
+            row["github_url_data"] = self.github_url_data(subscriber_id)
+        if heavy:
+            row["github_vector_embeddings"] = [0.1] * 8 if self.has_embeddings(subscriber_id) else None
+        return row
+
+    def _count(self, name: str):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _failure(self) -> Optional[web.Response]:
+        """A 429 during a burst window, a random 5xx at error_rate, or None."""
+        profile = self.profile
+        elapsed = time.monotonic() - self.started
+        if profile.burst_every and (elapsed % profile.burst_every) >= profile.burst_every - profile.burst_seconds:
+            return web.json_response({"error": "Rate limit exceeded (mock burst)"}, status=429,
+                                     headers={"Retry-After": str(profile.retry_after)})
+        if self.rng.random() < profile.error_rate:
+            return web.json_response({"error": "Mock upstream failure"}, status=self.rng.choice((500, 502, 503)))
+        return None
+
+    async def list_subscribers(self, request: web.Request, with_data: bool) -> web.Response:
+        self._count(request.path)
+        query = request.query
+        heavy = query.get('include_heavy') != 'false' and not with_data
+        skip_existing = query.get('skip_existing') == 'true'
+        descending = query.get('order') == 'desc'
+        if query.get('sort') == 'changed':
+            return await self.list_changes(query, heavy, with_data, descending)
+        max_id = min(int(query['max_id']), self.profile.subscribers) if 'max_id' in query else self.profile.subscribers
+        page_size = int(query['page_size']) if 'page_size' in query else None
+        limit = int(query['limit']) if 'limit' in query else None
+        take = min(filter(None, (page_size, limit)), default=self.profile.subscribers)
+
+        if descending:
+            start = min(int(query['after_id']) - 1, max_id) if 'after_id' in query else max_id
+            ids = range(start, 0, -1)
+        else:
+            ids = range(int(query.get('after_id', 0)) + 1, max_id + 1)
+        rows = []
+        for subscriber_id in ids:
+            if len(rows) >= take:
+                break
+            if skip_existing and self.has_embeddings(subscriber_id):
+                continue
+            rows.append(self.row(subscriber_id, heavy, with_data))
+
+        latency = self.profile.list_latency.sample(self.rng)
+        await asyncio.sleep(latency)
+        next_cursor = rows[-1]["id"] if page_size and len(rows) == page_size else None
+        return web.json_response({"success": True, "subscribers": rows, "next_cursor": next_cursor},
+                                 headers={"Server-Timing": f"supabase;dur={latency * 1000:.1f}"})
+
+    async def list_changes(self, query, heavy: bool, with_data: bool, descending: bool) -> web.Response:
+        page_size = int(query.get('page_size', 200))
+        after = None
+        if 'changed_since' in query:
+            after = (datetime.fromisoformat(query['changed_since']).timestamp(), int(query.get('after_id', 0)))
+        rows = []
+        for changed, subscriber_id in self.change_feed(descending):
+            if len(rows) >= page_size:
+                break
+            if after is None or (changed, subscriber_id) > after:
+                row = self.row(subscriber_id, heavy, with_data)
+                row["github_url_changed_at"] = datetime.fromtimestamp(changed, timezone.utc).isoformat()
+                rows.append(row)
+
+        latency = self.profile.list_latency.sample(self.rng)
+        await asyncio.sleep(latency)
+        next_cursor = rows[-1]["id"] if len(rows) == page_size else None
+        return web.json_response({"success": True, "subscribers": rows, "next_cursor": next_cursor},
+                                 headers={"Server-Timing": f"supabase;dur={latency * 1000:.1f}"})
+
+    async def analyze(self, request: web.Request) -> web.Response:
+        self._count(request.path)
+        body = await request.json()
+        latency = self.profile.analyze_latency.sample(self.rng)
+        await asyncio.sleep(latency)
+        failure = self._failure()
+        if failure:
+            return failure
+
+        subscriber_id = int(body.get("id") or 0)
+        data = self.github_url_data(subscriber_id)
+        result = {"success": True, "data": {"analyzedRepositories": [], "username": body.get("username")},
+                  "stored": True, "embeddingGenerated": not body.get("skip_embedding")}
+        if body.get("skip_embedding"):
+            result["analysisData"] = data
+        return web.json_response(result, headers={"Server-Timing": f"github;dur={latency * 900:.1f}, supabase;dur={latency * 100:.1f}"})
+
+    async def embed(self, request: web.Request) -> web.Response:
+        self._count(request.path)
+        body = await request.json()
+        latency = self.profile.embed_latency.sample(self.rng)
+        await asyncio.sleep(latency)
+        failure = self._failure()
+        if failure:
+            return failure
+
+        groups = (body.get("data") or {}).get("repositoryGroups") or []
+        if not groups:
+            return web.json_response({"success": False, "error": "No repository data available for embedding generation"})
+        result = {"success": True, "repositoryEmbeddingsGenerated": len(groups), "embeddingGenerated": True,
+                  "subscriberId": body.get("subscriberId")}
+        if body.get("returnComputed"):
+            precomputed = body.get("precomputed") or {}
+            computed = {"embeddings": {}, "analyses": {}}
+            for group in groups:
+                text = create_repository_embedding_text(group)
+                if embedding_key(text) not in (precomputed.get("embeddings") or {}):
+                    computed["embeddings"][embedding_key(text)] = [round(self.rng.uniform(-1, 1), 6) for _ in range(self.profile.dims)]
+                if analysis_key(text) not in (precomputed.get("analyses") or {}):
+                    computed["analyses"][analysis_key(text)] = {"technologies": {}, "assessment": {}, "summary": "mock"}
+            result["computed"] = computed
+        return web.json_response(result, headers={
+            "Server-Timing": f"voyage;dur={latency * 400:.1f}, gemini;dur={latency * 500:.1f}, supabase;dur={latency * 100:.1f}"})
+
+    async def check_usernames(self, request: web.Request) -> web.Response:
+        self._count(request.path)
+        body = await request.json()
+        latency = self.profile.list_latency.sample(self.rng)
+        await asyncio.sleep(latency)
+        users = {}
+        for username in body.get("usernames") or []:
+            number = username.lower().removeprefix("user")
+            exists = number.isdigit() and 0 < int(number) <= self.profile.subscribers and self.handle_exists(int(number))
+            users[username] = {"login": f"user{int(number)}", "type": "User"} if exists else None
+        return web.json_response({"success": True, "users": users},
+                                 headers={"Server-Timing": f"github;dur={latency * 1000:.1f}"})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.calls)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_get("/api/get_subscribers_with_github", lambda request: self.list_subscribers(request, False))
+        app.router.add_get("/api/get_subscribers_with_github_data", lambda request: self.list_subscribers(request, True))
+        app.router.add_post("/api/analyze-github-profile", self.analyze)
+        app.router.add_post("/api/github_embedding", self.embed)
+        app.router.add_post("/api/check_github_usernames", self.check_usernames)
+        app.router.add_get("/healthz", lambda request: web.json_response({"ok": True}))
+        app.router.add_get("/stats", self.stats)
+        app.on_startup.append(self.start_churn)
+        return app
+
+
+def parse_profile(argv=None) -> Tuple[MockProfile, int]:
+    parser = argparse.ArgumentParser(description="Local stand-in for the batch scripts' API routes")
+    parser.add_argument("--port", type=int, default=3999)
+    parser.add_argument("--subscribers", type=int, default=MockProfile.subscribers, help="Synthetic dataset size")
+    parser.add_argument("--seed", type=int, default=MockProfile.seed)
+    parser.add_argument("--list-latency", type=Latency.parse, default=MockProfile.list_latency, metavar="MEDIAN_MS,P99_MS")
+    parser.add_argument("--analyze-latency", type=Latency.parse, default=MockProfile.analyze_latency, metavar="MEDIAN_MS,P99_MS")
+    parser.add_argument("--embed-latency", type=Latency.parse, default=MockProfile.embed_latency, metavar="MEDIAN_MS,P99_MS")
+    parser.add_argument("--error-rate", type=float, default=MockProfile.error_rate, help="Share of calls answered with a 5xx")
+    parser.add_argument("--burst-every", type=float, default=MockProfile.burst_every, help="Seconds between 429 bursts (0 = none)")
+    parser.add_argument("--burst-seconds", type=float, default=MockProfile.burst_seconds, help="Length of each 429 burst")
+    parser.add_argument("--retry-after", type=int, default=MockProfile.retry_after, help="Retry-After sent with 429s")
+    parser.add_argument("--invalid-url-ratio", type=float, default=MockProfile.invalid_url_ratio)
+    parser.add_argument("--existing-ratio", type=float, default=MockProfile.existing_ratio)
+    parser.add_argument("--duplicate-ratio", type=float, default=MockProfile.duplicate_ratio, help="Subscribers sharing another subscriber's handle")
+    parser.add_argument("--missing-ratio", type=float, default=MockProfile.missing_ratio, help="Handles with no GitHub account")
+    parser.add_argument("--max-repos", type=int, default=MockProfile.max_repos, help="Repositories per subscriber (1..N)")
+    parser.add_argument("--file-kb", type=float, default=MockProfile.file_kb, help="Mean file size in github_url_data")
+    parser.add_argument("--dims", type=int, default=MockProfile.dims, help="Embedding dimensions in computed results")
+    parser.add_argument("--junk-files", action="store_true", help="Add a lockfile, a minified bundle and a shared LICENSE to every repository")
+    parser.add_argument("--change-rate", type=float, default=MockProfile.change_rate, help="Subscribers changed per second (for --follow)")
+    args = parser.parse_args(argv)
+    profile = MockProfile(**{name: getattr(args, name) for name in MockProfile.__dataclass_fields__})
+    return profile, args.port
+
+
+def main():
+    profile, port = parse_profile()
+    print(f"🧪 Mock API on http://localhost:{port} with {profile.subscribers} subscribers")
+    try:
+        web.run_app(MockAPI(profile).app(), port=port, print=None, access_log=None)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"\n❌ Unexpected error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Quantized Embedding Store
+=========================
+
+Compact copies of the exported embeddings (see `similarity_engine.py export`)
+for storage, transfer and scoring:
+
+    int8     one int8 code per dimension plus one float32 scale per vector
+             (symmetric scalar quantization, scale = max|x| / 127); ~4x smaller
+    float16  half precision, scale fixed at 1; 2x smaller
+
+Binary layout (`subscribers.q8`, `repositories.q8`, or `.f16`), memory-mapped on load:
+    header  b'EMBQ', version u16, format u16 (1 = int8, 2 = float16), rows u32, dim u32,
+            export fingerprint u64 (hash of the export's subscribers.json and repositories.json)
+    scales  float32[rows]
+    codes   int8/float16[rows, dim], row-major
+
+Scoring runs on the codes: `q . x ~= (q . codes) * scale`, computed block by
+block so only one block of rows is ever widened to float32. A store whose rows,
+dim or fingerprint no longer match the export is refused, so a re-export is
+never scored against stale codes or mapped to the wrong ids. `benchmark`
+compares the top-k of each format with exact float32 search so the ranking
+cost of the smaller format is measured, not assumed.
+
+Usage:
+    python app/scripts/quantized_store.py build [--format int8]
+    python app/scripts/quantized_store.py query --subscriber-id 123 [--top-k 10]
+    python app/scripts/quantized_store.py benchmark [--kind subscribers] [--top-k 10] [--queries 200]
+"""
+
+import argparse
+import hashlib
+import os
+import struct
+import sys
+import time
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+from similarity_engine import DEFAULT_CHUNK_MB, DEFAULT_EXPORT_DIR, EmbeddingExport, top_k
+
+MAGIC = b'EMBQ'
+VERSION = 2
+HEADER = struct.Struct('<4sHHIIQ')
+FORMATS = {'int8': (1, np.int8, '.q8'), 'float16': (2, np.float16, '.f16')}
+FORMAT_NAMES = {code: name for name, (code, _, _) in FORMATS.items()}
+INT8_LEVELS = 127
+
+
+def quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-row symmetric int8 codes and float32 scales; all-zero rows get scale 0."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.abs(matrix).max(axis=1) / INT8_LEVELS if matrix.size else np.zeros(matrix.shape[0], dtype=np.float32)
+    safe = np.where(scales > 0, scales, 1.0)[:, None]
+    codes = np.clip(np.rint(matrix / safe), -INT8_LEVELS, INT8_LEVELS).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class QuantizedMatrix:
+    """Row vectors stored as low-precision codes with one scale per row."""
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray, fmt: str, fingerprint: int = 0):
+        self.codes = codes
+        self.scales = np.asarray(scales, dtype=np.float32)
+        self.format = fmt
+        self.fingerprint = fingerprint  # of the export the codes were built from
+
+    @classmethod
+    def from_float(cls, matrix: np.ndarray, fmt: str = 'int8', chunk_rows: int = 65536,
+                   fingerprint: int = 0) -> 'QuantizedMatrix':
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+        rows, dim = matrix.shape
+        codes = np.empty((rows, dim), dtype=FORMATS[fmt][1])
+        scales = np.ones(rows, dtype=np.float32)
+        # Chunked, so a memory-mapped export is never loaded whole
+        for start in range(0, rows, chunk_rows):
+            block = np.asarray(matrix[start:start + chunk_rows], dtype=np.float32)
+            if fmt == 'int8':
+                codes[start:start + block.shape[0]], scales[start:start + block.shape[0]] = quantize_int8(block)
+            else:
+                codes[start:start + block.shape[0]] = block.astype(np.float16)
+        return cls(codes, scales, fmt, fingerprint)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.codes.shape
+
+    @property
+    def nbytes(self) -> int:
+        return HEADER.size + self.scales.nbytes + self.codes.nbytes
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    def __getitem__(self, rows) -> np.ndarray:
+        """Decoded float32 rows (approximate)."""
+        codes = np.asarray(self.codes[rows], dtype=np.float32)
+        scales = self.scales[rows]
+        return codes * (scales[..., None] if codes.ndim > 1 else scales)
+
+    def scores(self, queries: np.ndarray, chunk_mb: int = 32) -> np.ndarray:
+        """Dot products of float32 `queries` with every row, read straight from the codes."""
+        queries = np.asarray(queries, dtype=np.float32)
+        rows, dim = self.codes.shape
+        out = np.empty((queries.shape[0], rows), dtype=np.float32)
+        block_rows = max(1, (chunk_mb * 1024 * 1024) // (4 * max(dim, 1)))
+        for start in range(0, rows, block_rows):
+            stop = min(rows, start + block_rows)
+            block = np.asarray(self.codes[start:stop], dtype=np.float32)
+            np.matmul(queries, block.T, out=out[:, start:stop])
+            if self.format == 'int8':
+                out[:, start:stop] *= self.scales[start:stop]
+        return out
+
+    def save(self, path: str):
+        code, _, _ = FORMATS[self.format]
+        rows, dim = self.codes.shape
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, code, rows, dim, self.fingerprint))
+            f.write(self.scales.tobytes())
+            for start in range(0, rows, 65536):
+                f.write(np.ascontiguousarray(self.codes[start:start + 65536]).tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'QuantizedMatrix':
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+        magic, version = struct.unpack_from('<4sH', header) if len(header) >= 6 else (None, None)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a quantized embedding file")
+        if version != VERSION or len(header) < HEADER.size:
+            raise ValueError(f"{path} has format version {version}, expected {VERSION}; "
+                             f"rebuild with quantized_store.py build")
+        _, _, code, rows, dim, fingerprint = HEADER.unpack(header)
+        if code not in FORMAT_NAMES:
+            raise ValueError(f"{path} has unknown format {code}")
+        fmt = FORMAT_NAMES[code]
+        scales = np.memmap(path, dtype=np.float32, mode='r', offset=HEADER.size, shape=(rows,))
+        if rows == 0:
+            return cls(np.zeros((0, dim), dtype=FORMATS[fmt][1]), scales, fmt, fingerprint)
+        codes = np.memmap(path, dtype=FORMATS[fmt][1], mode='r', offset=HEADER.size + 4 * rows, shape=(rows, dim))
+        return cls(codes, scales, fmt, fingerprint)
+
+
+MatrixLike = Union[np.ndarray, QuantizedMatrix]
+
+
+def store_path(directory: str, kind: str, fmt: str = 'int8') -> str:
+    return os.path.join(directory, f"{kind}{FORMATS[fmt][2]}")
+
+
+def _export_matrix(export: EmbeddingExport, kind: str) -> np.ndarray:
+    return export.subscriber_vectors if kind == 'subscribers' else export.repository_vectors
+
+
+def export_fingerprint(export: EmbeddingExport) -> int:
+    """64-bit hash of the export's index files; every export rewrites them (ids, rows, exported_at)."""
+    digest = hashlib.blake2b(digest_size=8)
+    for filename in ('subscribers.json', 'repositories.json'):
+        with open(os.path.join(export.directory, filename), 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return int.from_bytes(digest.digest(), 'little')
+
+
+def build_stores(export: EmbeddingExport, fmt: str = 'int8') -> Dict[str, str]:
+    """Write quantized copies of both export matrices next to the float32 files."""
+    paths = {}
+    fingerprint = export_fingerprint(export)
+    for kind in ('subscribers', 'repositories'):
+        path = store_path(export.directory, kind, fmt)
+        QuantizedMatrix.from_float(_export_matrix(export, kind), fmt, fingerprint=fingerprint).save(path)
+        paths[kind] = path
+    return paths
+
+
+def load_store(export: EmbeddingExport, kind: str, fmt: str = 'int8') -> QuantizedMatrix:
+    """The quantized copy of one export matrix, refused if it was built from a different export."""
+    path = store_path(export.directory, kind, fmt)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No {fmt} store at {path}; build it with quantized_store.py build --format {fmt}")
+    store = QuantizedMatrix.load(path)
+    expected = (len(_export_matrix(export, kind)), export.dim)
+    if store.shape != expected or store.fingerprint != export_fingerprint(export):
+        raise ValueError(f"{path} ({store.shape[0]} x {store.shape[1]}) was built from a different export than "
+                         f"{export.directory} ({expected[0]} x {expected[1]}); rebuild with quantized_store.py build "
+                         f"--format {fmt}")
+    return store
+
+
+def _json_bytes(vectors: np.ndarray) -> float:
+    """Mean size of a vector as the API sends it today: a JSON/pgvector float array."""
+    sizes = [len('[' + ','.join(np.format_float_positional(value, unique=True, trim='-') for value in vector) + ']')
+             for vector in np.asarray(vectors, dtype=np.float32)]
+    return float(np.mean(sizes)) if sizes else 0.0
+
+
+def benchmark(export: EmbeddingExport, kind: str, formats: List[str], k: int = 10, queries: int = 200,
+              seed: int = 0, chunk_mb: int = DEFAULT_CHUNK_MB) -> List[Dict]:
+    """Recall@k, score error, size and scoring time of each format against exact float32 search."""
+    matrix = _export_matrix(export, kind)
+    rows, dim = matrix.shape
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(rows, min(queries, rows), replace=False))
+    query_vectors = np.asarray(matrix[sample], dtype=np.float32)
+
+    def search(target: MatrixLike) -> Tuple[np.ndarray, np.ndarray, float]:
+        started = time.perf_counter()
+        found = list(top_k(query_vectors, target, k, chunk_mb, exclude_rows=sample))
+        elapsed = (time.perf_counter() - started) * 1000
+        return np.vstack([indices for _, indices, _ in found]), np.vstack([scores for _, _, scores in found]), elapsed
+
+    exact_indices, exact_scores, exact_ms = search(matrix)
+    results = [{
+        "format": "float32", "recall": 1.0, "score_error": 0.0, "bytes_per_vector": 4 * dim,
+        "ratio": 1.0, "search_ms": exact_ms,
+        "transfer_bytes": _json_bytes(matrix[sample[:50]])
+    }]
+    for fmt in formats:
+        store = QuantizedMatrix.from_float(matrix, fmt)
+        indices, scores, elapsed = search(store)
+        hits = sum(len(set(found.tolist()) & set(expected.tolist())) for found, expected in zip(indices, exact_indices))
+        per_vector = store.nbytes / max(rows, 1)
+        results.append({
+            "format": fmt,
+            "recall": hits / max(exact_indices.size, 1),
+            # Score error at the same ranks, i.e. how far the reported similarities drift
+            "score_error": float(np.mean(np.abs(scores - exact_scores))),
+            "bytes_per_vector": per_vector,
+            "ratio": 4 * dim / per_vector,
+            "search_ms": elapsed,
+            # What ?format=int8 sends: base64 codes plus the scale
+            "transfer_bytes": 4 * ((dim + 2) // 3) + 12 if fmt == 'int8' else None
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantized (int8/float16) copies of the exported embeddings")
+    parser.add_argument("--out-dir", default=DEFAULT_EXPORT_DIR, help="Export directory (stores are written alongside)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Write quantized copies of the export matrices")
+    build_parser.add_argument("--format", choices=list(FORMATS), default="int8")
+
+    query_parser = subparsers.add_parser("query", help="Nearest subscribers to a subscriber, scored on the quantized store")
+    query_parser.add_argument("--subscriber-id", type=int, required=True, help="Subscriber to look up")
+    query_parser.add_argument("--top-k", type=int, default=10, help="Neighbours to print")
+    query_parser.add_argument("--format", choices=list(FORMATS), default="int8")
+
+    bench_parser = subparsers.add_parser("benchmark", help="Recall and size of each format against float32")
+    bench_parser.add_argument("--kind", choices=["subscribers", "repositories"], default="subscribers")
+    bench_parser.add_argument("--formats", default="int8,float16", help="Comma-separated formats to compare")
+    bench_parser.add_argument("--top-k", type=int, default=10, help="k for recall@k")
+    bench_parser.add_argument("--queries", type=int, default=200, help="Sampled query vectors")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "build":
+            export = EmbeddingExport.load(args.out_dir)
+            started = time.monotonic()
+            for kind, path in build_stores(export, args.format).items():
+                full = len(_export_matrix(export, kind)) * export.dim * 4
+                print(f"✅ {kind}: {os.path.getsize(path) / 1e6:.1f} MB ({full / max(os.path.getsize(path), 1):.1f}x "
+                      f"smaller than float32) -> {path}")
+            print(f"🕐 Built in {time.monotonic() - started:.1f}s")
+
+        elif args.command == "query":
+            export = EmbeddingExport.load(args.out_dir)
+            row = export.subscriber_index.get(args.subscriber_id)
+            if row is None:
+                print(f"❌ Subscriber {args.subscriber_id} is not in the export")
+                sys.exit(1)
+            store = load_store(export, 'subscribers', args.format)
+            for _, indices, scores in top_k(store[row:row + 1], store, args.top_k, exclude_rows=np.array([row])):
+                for rank, (index, score) in enumerate(zip(indices[0], scores[0]), start=1):
+                    print(f"{rank:>3}. subscriber {export.subscriber_ids[index]} ({score:.4f}, "
+                          f"{export.repository_counts[index]} repositories)")
+
+        elif args.command == "benchmark":
+            export = EmbeddingExport.load(args.out_dir)
+            formats = [fmt.strip() for fmt in args.formats.split(',') if fmt.strip()]
+            unknown = [fmt for fmt in formats if fmt not in FORMATS]
+            if unknown:
+                print(f"❌ Unknown formats: {', '.join(unknown)}")
+                sys.exit(1)
+            count = len(export.subscriber_ids if args.kind == 'subscribers' else export.repository_rows)
+            print(f"📊 Benchmarking {args.kind} ({count} vectors, dim {export.dim}, recall@{args.top_k}, {args.queries} queries)")
+            print(f"{'format':>8} {'recall':>7} {'score err':>9} {'B/vector':>9} {'smaller':>7} {'search ms':>9} {'API B/vector':>12}")
+            for row in benchmark(export, args.kind, formats, args.top_k, args.queries):
+                transfer = f"{row['transfer_bytes']:.0f}" if row['transfer_bytes'] is not None else "-"
+                print(f"{row['format']:>8} {row['recall']:>7.3f} {row['score_error']:>9.5f} {row['bytes_per_vector']:>9.0f} "
+                      f"{row['ratio']:>6.1f}x {row['search_ms']:>9.1f} {transfer:>12}")
+
+    except KeyboardInterrupt:
+        print("\n⚠️  Process interrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Unexpected error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
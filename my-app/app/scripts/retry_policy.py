@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Retry Policy
+============
+
+Per-error-class retries for the batch scripts. Transient failures (network
+errors and HTTP 429/502/503/504) are retried with capped exponential backoff
+and full jitter; everything else (e.g. 404 "GitHub user not found") fails
+immediately. A per-run retry budget stops a systemic outage from turning
+into thousands of retries, and the retry stats feed `print_summary`.
+"""
+
+import asyncio
+import random
+from typing import Awaitable, Callable, Dict, Optional
+
+from adaptive_limiter import AdaptiveLimiter, parse_retry_after
+
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 30.0,
+                 retry_budget: Optional[int] = 100):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_budget = retry_budget  # None means unlimited
+        self.retries = 0
+        self.recovered = 0
+        self.exhausted = 0
+        self.budget_denied = 0
+        self.time_lost = 0.0
+        self.by_reason: Dict[str, int] = {}
+
+    @staticmethod
+    def classify(result: Dict) -> Optional[str]:
+        """Return a retry reason for a transient failure, or None if it is final."""
+        if result.get("status") != "error":
+            return None
+        if result.get("network_error"):
+            return "network"
+        status = result.get("http_status")
+        if status in RETRYABLE_STATUSES:
+            return str(status)
+        return None
+
+    def next_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full-jitter backoff for the given attempt (1-based), never shorter than Retry-After."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+        server_delay = parse_retry_after(retry_after)
+        if server_delay is not None:
+            delay = max(delay, min(server_delay, self.max_delay))
+        return delay
+
+    def should_retry(self, result: Dict, attempt: int) -> Optional[str]:
+        """Decide whether to retry after `attempt` attempts; returns the reason if so."""
+        reason = self.classify(result)
+        if reason is None:
+            return None
+        if attempt >= self.max_attempts:
+            self.exhausted += 1
+            return None
+        if self.retry_budget is not None and self.retries >= self.retry_budget:
+            self.budget_denied += 1
+            return None
+        self.retries += 1
+        self.by_reason[reason] = self.by_reason.get(reason, 0) + 1
+        return reason
+
+    async def run(self, limiter: AdaptiveLimiter, upstream: str, attempt: Callable[[], Awaitable[Dict]]) -> Dict:
+        """Run `attempt` in limiter slots until it succeeds or fails for good; backoff waits outside the slot."""
+        attempts = 0
+        while True:
+            attempts += 1
+            async with limiter.slot(upstream) as slot:
+                result = await attempt()
+                slot.record(result.get("http_status"), result.get("retry_after"), result.get("network_error", False))
+
+            reason = self.should_retry(result, attempts)
+            if not reason:
+                break
+            delay = self.next_delay(attempts, result.get("retry_after"))
+            self.record_wait(delay)
+            print(f"🔁 User {result['subscriber_id']}: {reason} on attempt {attempts}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        if attempts > 1:
+            result["attempts"] = attempts
+            if result["status"] == "success":
+                self.record_recovery()
+        return result
+
+    def record_wait(self, seconds: float):
+        self.time_lost += seconds
+
+    def record_recovery(self):
+        self.recovered += 1
+
+    def summary(self) -> Dict:
+        return {
+            "retries": self.retries,
+            "recovered": self.recovered,
+            "exhausted": self.exhausted,
+            "budget": self.retry_budget,
+            "budget_denied": self.budget_denied,
+            "time_lost_seconds": round(self.time_lost, 2),
+            "by_reason": dict(self.by_reason)
+        }
+
+    def print_summary(self):
+        if not self.retries and not self.budget_denied:
+            return
+        reasons = ", ".join(f"{reason}: {count}" for reason, count in self.by_reason.items())
+        budget = "unlimited" if self.retry_budget is None else self.retry_budget
+        print(f"🔁 Retries: {self.retries} ({reasons}), {self.time_lost:.1f}s spent backing off")
+        print(f"  - Recovered after retry: {self.recovered}")
+        print(f"  - Gave up after {self.max_attempts} attempts: {self.exhausted}")
+        print(f"  - Retry budget: {self.retries}/{budget} used, {self.budget_denied} retries denied")
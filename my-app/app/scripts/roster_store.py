@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Course Roster Store
+===================
+
+Compact, indexed store for the `harvard-classes/people_dict_*.json` rosters
+(name -> list of course codes, one file per semester). Names and course
+codes are interned to integer ids, and repeated enrolments (e.g. "MATH MA"
+listed 17 times for one person) collapse to one entry with a count.
+Enrolments are kept as two CSR incidence structures:
+
+    person -> (course, semester, count)   person_indptr / person_courses / ...
+    course -> (person, semester)          course_indptr / course_people / ...
+
+The store persists to a single .npz of flat arrays, so it loads in
+milliseconds instead of re-parsing ~4 MB of JSON. `RosterStore.open()`
+rebuilds it automatically when any roster file is newer than the cache.
+
+Usage:
+    python app/scripts/roster_store.py build
+    python app/scripts/roster_store.py person "Karina Chung"
+    python app/scripts/roster_store.py course "COMPSCI 61" [--semester "Fall 2024"]
+    python app/scripts/roster_store.py stats
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+ROSTER_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'harvard-classes'))
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports', 'rosters.npz')
+ROSTER_PATTERN = 'people_dict_*.json'
+
+_TRAILING_COMMA = re.compile(r',(\s*[}\]])')
+
+
+def read_roster_json(path: str) -> Dict[str, List[str]]:
+    """Parse a roster file, tolerating the trailing commas some hand-edited files have."""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(_TRAILING_COMMA.sub(r'\1', text))
+
+
+def semester_name(path: str) -> str:
+    """'people_dict_Fall 2024.json' -> 'Fall 2024'"""
+    return os.path.basename(path)[len('people_dict_'):-len('.json')]
+
+
+def _encode_strings(values: List[str]) -> np.ndarray:
+    return np.frombuffer('\n'.join(values).encode('utf-8'), dtype=np.uint8)
+
+
+def _decode_strings(blob: np.ndarray) -> List[str]:
+    return blob.tobytes().decode('utf-8').split('\n') if blob.size else []
+
+
+def _csr(rows: np.ndarray, row_count: int, *columns: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Sort entries by row and return (indptr, *columns in row order)."""
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(row_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=row_count), out=indptr[1:])
+    return (indptr, *(column[order] for column in columns))
+
+
+class RosterStore:
+    def __init__(self, people: List[str], courses: List[str], semesters: List[str], arrays: Dict[str, np.ndarray]):
+        self.people = people
+        self.courses = courses
+        self.semesters = semesters
+        self.person_ids = {name: person_id for person_id, name in enumerate(people)}
+        self.course_ids = {code: course_id for course_id, code in enumerate(courses)}
+        self.semester_ids = {name: semester_id for semester_id, name in enumerate(semesters)}
+        # person -> (course, semester, count) and course -> (person, semester), both CSR
+        self.person_indptr = arrays['person_indptr']
+        self.person_courses = arrays['person_courses']
+        self.person_semesters = arrays['person_semesters']
+        self.person_counts = arrays['person_counts']
+        self.course_indptr = arrays['course_indptr']
+        self.course_people = arrays['course_people']
+        self.course_semesters = arrays['course_semesters']
+
+    @classmethod
+    def from_entries(cls, people: List[str], courses: List[str], semesters: List[str],
+                     entry_people: np.ndarray, entry_courses: np.ndarray, entry_semesters: np.ndarray,
+                     entry_counts: np.ndarray) -> 'RosterStore':
+        person_indptr, person_courses, person_semesters, person_counts = _csr(
+            entry_people, len(people), entry_courses, entry_semesters, entry_counts)
+        course_indptr, course_people, course_semesters = _csr(
+            entry_courses, len(courses), entry_people, entry_semesters)
+        return cls(people, courses, semesters, {
+            'person_indptr': person_indptr,
+            'person_courses': person_courses,
+            'person_semesters': person_semesters,
+            'person_counts': person_counts,
+            'course_indptr': course_indptr,
+            'course_people': course_people,
+            'course_semesters': course_semesters
+        })
+
+    @classmethod
+    def build(cls, directory: str = ROSTER_DIR) -> 'RosterStore':
+        """Parse every people_dict_*.json in `directory` into a deduplicated store."""
+        paths = sorted(glob.glob(os.path.join(directory, ROSTER_PATTERN)))
+        if not paths:
+            raise FileNotFoundError(f"No {ROSTER_PATTERN} files found in {directory}")
+
+        people: Dict[str, int] = {}
+        courses: Dict[str, int] = {}
+        semesters: List[str] = []
+        # (person, course, semester) -> times listed
+        counts: Dict[Tuple[int, int, int], int] = {}
+
+        for semester_id, path in enumerate(paths):
+            semesters.append(semester_name(path))
+            for name, codes in read_roster_json(path).items():
+                person_id = people.setdefault(sys.intern(name.strip()), len(people))
+                for code in codes or []:
+                    course_id = courses.setdefault(sys.intern(code.strip()), len(courses))
+                    key = (person_id, course_id, semester_id)
+                    counts[key] = counts.get(key, 0) + 1
+
+        entries = np.array(list(counts.keys()), dtype=np.int32).reshape(-1, 3)
+        return cls.from_entries(list(people), list(courses), semesters,
+                                entries[:, 0], entries[:, 1], entries[:, 2].astype(np.int16),
+                                np.fromiter(counts.values(), dtype=np.uint16, count=len(counts)))
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in (
+            'person_indptr', 'person_courses', 'person_semesters', 'person_counts',
+            'course_indptr', 'course_people', 'course_semesters')}
+
+    def save(self, path: str = DEFAULT_STORE_PATH):
+        """Write names and both CSR structures as flat arrays, so load() is a straight read."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path,
+                 people=_encode_strings(self.people),
+                 courses=_encode_strings(self.courses),
+                 semesters=_encode_strings(self.semesters),
+                 **self._arrays())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_STORE_PATH) -> 'RosterStore':
+        with np.load(path) as data:
+            return cls(_decode_strings(data['people']), _decode_strings(data['courses']),
+                       _decode_strings(data['semesters']),
+                       {name: data[name] for name in data.files if name not in ('people', 'courses', 'semesters')})
+
+    @classmethod
+    def open(cls, directory: str = ROSTER_DIR, path: str = DEFAULT_STORE_PATH) -> 'RosterStore':
+        """Load the binary store, rebuilding it first if a roster file changed since it was saved."""
+        roster_paths = glob.glob(os.path.join(directory, ROSTER_PATTERN))
+        if os.path.exists(path) and all(os.path.getmtime(p) <= os.path.getmtime(path) for p in roster_paths):
+            return cls.load(path)
+        store = cls.build(directory)
+        store.save(path)
+        return store
+
+    def _semester_mask(self, semesters: np.ndarray, semester: Optional[str]) -> np.ndarray:
+        if semester is None:
+            return np.ones(semesters.shape[0], dtype=bool)
+        if semester not in self.semester_ids:
+            raise KeyError(f"Unknown semester {semester!r}; known: {', '.join(self.semesters)}")
+        return semesters == self.semester_ids[semester]
+
+    def course_ids_of(self, person_id: int, semester: Optional[str] = None) -> np.ndarray:
+        """Distinct course ids a person took (in any semester, or one)."""
+        start, end = self.person_indptr[person_id], self.person_indptr[person_id + 1]
+        courses = self.person_courses[start:end][self._semester_mask(self.person_semesters[start:end], semester)]
+        return np.unique(courses)
+
+    def person_ids_in(self, course_id: int, semester: Optional[str] = None) -> np.ndarray:
+        """Distinct person ids enrolled in a course (in any semester, or one)."""
+        start, end = self.course_indptr[course_id], self.course_indptr[course_id + 1]
+        people = self.course_people[start:end][self._semester_mask(self.course_semesters[start:end], semester)]
+        return np.unique(people)
+
+    def courses_of(self, name: str, semester: Optional[str] = None) -> List[str]:
+        person_id = self.person_ids.get(name)
+        if person_id is None:
+            return []
+        return [self.courses[course_id] for course_id in self.course_ids_of(person_id, semester)]
+
+    def people_in(self, code: str, semester: Optional[str] = None) -> List[str]:
+        course_id = self.course_ids.get(code)
+        if course_id is None:
+            return []
+        return [self.people[person_id] for person_id in self.person_ids_in(course_id, semester)]
+
+    def stats(self) -> Dict:
+        listed = int(self.person_counts.sum())
+        return {
+            "semesters": self.semesters,
+            "people": len(self.people),
+            "courses": len(self.courses),
+            "enrolments": int(self.person_courses.shape[0]),
+            "listed_enrolments": listed,
+            "duplicates_removed": listed - int(self.person_courses.shape[0])
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the compact course roster store")
+    parser.add_argument("--roster-dir", default=ROSTER_DIR, help="Directory containing people_dict_*.json")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Binary store path")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("build", help="Parse the roster JSON files and write the binary store")
+    subparsers.add_parser("stats", help="Print store size and deduplication stats")
+    person_parser = subparsers.add_parser("person", help="Courses a person took")
+    person_parser.add_argument("name")
+    person_parser.add_argument("--semester", help="Limit to one semester (e.g. \"Fall 2024\")")
+    course_parser = subparsers.add_parser("course", help="People enrolled in a course")
+    course_parser.add_argument("code")
+    course_parser.add_argument("--semester", help="Limit to one semester (e.g. \"Fall 2024\")")
+
+    args = parser.parse_args()
+
+    try:
+        started = time.perf_counter()
+        if args.command == "build":
+            store = RosterStore.build(args.roster_dir)
+            store.save(args.store)
+            print(f"✅ Built {args.store} in {(time.perf_counter() - started) * 1000:.0f}ms")
+            started = time.perf_counter()
+            RosterStore.load(args.store)
+            print(f"⚡ Reloads in {(time.perf_counter() - started) * 1000:.1f}ms")
+            return
+
+        store = RosterStore.open(args.roster_dir, args.store)
+        print(f"📂 Loaded roster store in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        if args.command == "stats":
+            stats = store.stats()
+            print(f"📅 Semesters: {', '.join(stats['semesters'])}")
+            print(f"👥 People: {stats['people']}")
+            print(f"📚 Courses: {stats['courses']}")
+            print(f"🔗 Enrolments: {stats['enrolments']} ({stats['duplicates_removed']} duplicate listings removed)")
+        elif args.command == "person":
+            courses = store.courses_of(args.name, args.semester)
+            print(f"📚 {args.name}: {', '.join(courses) if courses else 'no courses found'}")
+        elif args.command == "course":
+            people = store.people_in(args.code, args.semester)
+            print(f"👥 {args.code}: {len(people)} people")
+            for name in people:
+                print(f"  - {name}")
+
+    except KeyError as e:
+        print(f"❌ {e.args[0]}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Unexpected error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
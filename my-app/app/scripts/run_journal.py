@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Batch Run Journal
+=================
+
+Append-only JSONL journal of per-subscriber outcomes for the batch scripts.
+Every finished subscriber is written (and flushed) as soon as it completes,
+so a crash or Ctrl+C loses at most the in-flight requests. Passing
+`--resume <run-id>` replays the journal, skips subscribers that already
+succeeded and retries only failed or pending ones.
+
+Journal layout (one JSON object per line):
+    {"type": "run", "run_id": ..., "script": ..., "started_at": ..., "settings": {...}}
+    {"type": "result", "subscriber_id": ..., "status": "success", ..., "recorded_at": ...}
+"""
+
+import json
+import os
+from datetime import datetime
+from typing import Dict, Optional
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'runs')
+
+
+class RunJournal:
+    def __init__(self, path: str, run_id: str):
+        self.path = path
+        self.run_id = run_id
+        self.outcomes: Dict[str, Dict] = {}  # subscriber_id -> latest recorded result
+        self._file = None
+
+    @classmethod
+    def start(cls, script: str, journal_dir: str = DEFAULT_JOURNAL_DIR, settings: Optional[Dict] = None) -> 'RunJournal':
+        """Create a fresh journal for a new run."""
+        os.makedirs(journal_dir, exist_ok=True)
+        run_id = f"{script}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        journal = cls(os.path.join(journal_dir, f"{run_id}.jsonl"), run_id)
+        journal._open()
+        journal._write({
+            "type": "run",
+            "run_id": run_id,
+            "script": script,
+            "started_at": datetime.now().isoformat(),
+            "settings": settings or {}
+        })
+        return journal
+
+    @classmethod
+    def resume(cls, run_id: str, journal_dir: str = DEFAULT_JOURNAL_DIR) -> 'RunJournal':
+        """Reopen an existing journal and load the outcomes recorded so far."""
+        path = os.path.join(journal_dir, f"{run_id}.jsonl")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No journal found for run {run_id} at {path}")
+
+        journal = cls(path, run_id)
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-write can leave a truncated last line
+                    continue
+                if entry.get("type") == "result":
+                    journal.outcomes[str(entry.get("subscriber_id"))] = entry
+
+        journal._open()
+        journal._write({"type": "resume", "run_id": run_id, "resumed_at": datetime.now().isoformat()})
+        return journal
+
+    def _open(self):
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _write(self, entry: Dict):
+        self._file.write(json.dumps(entry, default=str) + "\n")
+        self._file.flush()
+
+    def is_completed(self, subscriber_id) -> bool:
+        """True if a previous attempt in this run already finished this subscriber for good."""
+        outcome = self.outcomes.get(str(subscriber_id))
+        if not outcome:
+            return False
+        if outcome.get("status") == "success":
+            return not outcome.get("dry_run", False)
+        return outcome.get("status") == "skipped"
+
+    def record(self, result: Dict):
+        """Append a subscriber outcome to the journal."""
+        entry = {"type": "result", **result, "recorded_at": datetime.now().isoformat()}
+        self.outcomes[str(result.get("subscriber_id"))] = entry
+        self._write(entry)
+
+    def counts(self) -> Dict[str, int]:
+        """Latest status counts across the whole run, including earlier attempts."""
+        counts: Dict[str, int] = {}
+        for outcome in self.outcomes.values():
+            status = outcome.get("status", "unknown")
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Run Metrics
+===========
+
+Instrumentation for the batch scripts. `RunMetrics.trace_config()` plugs into
+the aiohttp session, so every outbound call is measured without touching the
+call sites:
+
+- per-endpoint latency histograms (p50/p95/p99), status codes, bytes in/out
+- in-flight requests per endpoint, and throughput over time
+- per-upstream time (github, voyage, gemini, supabase) from the routes'
+  `Server-Timing` headers, which separates Next.js overhead from the upstreams
+
+With `profile=True` it also samples event-loop lag and keeps a per-subscriber
+breakdown of where each subscriber's time went. `write_report()` saves a JSON
+run report plus a Prometheus textfile (node_exporter textfile collector format).
+"""
+
+import asyncio
+import contextvars
+import json
+import math
+import os
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+# Prometheus histogram buckets in seconds; upstream calls range from ms (Supabase) to minutes (GitHub)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+LOOP_LAG_INTERVAL = 0.1
+
+# Subscriber the current task is working on, for per-subscriber breakdowns in profile mode
+_current_subscriber: contextvars.ContextVar = contextvars.ContextVar('current_subscriber', default=None)
+
+
+def set_current_subscriber(subscriber_id) -> None:
+    """Attribute requests made from the current task to `subscriber_id` (profile mode)."""
+    _current_subscriber.set(subscriber_id)
+
+
+def parse_server_timing(value: Optional[str]) -> Dict[str, float]:
+    """'voyage;dur=812.4, gemini;dur=2301' -> {'voyage': 0.8124, 'gemini': 2.301} (seconds)"""
+    timings: Dict[str, float] = {}
+    for entry in (value or '').split(','):
+        parts = [part.strip() for part in entry.split(';')]
+        if not parts[0]:
+            continue
+        for param in parts[1:]:
+            if param.startswith('dur='):
+                try:
+                    timings[parts[0]] = timings.get(parts[0], 0.0) + float(param[4:]) / 1000
+                except ValueError:
+                    pass
+    return timings
+
+
+class LatencyHistogram:
+    """Keeps raw samples (runs are at most ~100k calls) for exact quantiles plus Prometheus buckets."""
+
+    def __init__(self):
+        self.samples: List[float] = []
+        self._sorted = True
+
+    def observe(self, seconds: float):
+        if self.samples and seconds < self.samples[-1]:
+            self._sorted = False
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        if not self._sorted:
+            self.samples.sort()
+            self._sorted = True
+        return self.samples[min(len(self.samples) - 1, max(0, math.ceil(q * len(self.samples)) - 1))]
+
+    def buckets(self) -> List[int]:
+        """Cumulative counts per LATENCY_BUCKETS bound (the +Inf bucket is the total count)."""
+        self.quantile(0.5)  # sorts
+        counts, index = [], 0
+        for bound in LATENCY_BUCKETS:
+            while index < len(self.samples) and self.samples[index] <= bound:
+                index += 1
+            counts.append(index)
+        return counts
+
+    def summary(self) -> Dict:
+        return {
+            "count": len(self.samples),
+            "sum": round(sum(self.samples), 4),
+            "p50": round(self.quantile(0.50), 4),
+            "p95": round(self.quantile(0.95), 4),
+            "p99": round(self.quantile(0.99), 4),
+            "max": round(self.quantile(1.0), 4)
+        }
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.statuses: Dict[str, int] = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def summary(self) -> Dict:
+        return {
+            "latency": self.latency.summary(),
+            "statuses": dict(self.statuses),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "max_in_flight": self.max_in_flight
+        }
+
+
+class RunMetrics:
+    def __init__(self, script: str, profile: bool = False, window: float = 10.0):
+        self.script = script
+        self.profile = profile
+        self.window = window  # seconds per throughput bucket
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.upstreams: Dict[str, LatencyHistogram] = {}
+        # window index -> endpoint -> {"completed": n, "max_in_flight": n}
+        self.timeline: Dict[int, Dict[str, Dict[str, int]]] = {}
+        self.loop_lag = LatencyHistogram()
+        self.subscribers: Dict[str, Dict] = {}
+        self.started_at = time.time()
+        self._started = time.monotonic()
+        self._finished: Optional[float] = None
+        self._lag_task: Optional[asyncio.Task] = None
+
+    def _endpoint(self, name: str) -> EndpointStats:
+        if name not in self.endpoints:
+            self.endpoints[name] = EndpointStats()
+        return self.endpoints[name]
+
+    def _tick(self, endpoint: str, stats: EndpointStats, completed: int = 0):
+        bucket = self.timeline.setdefault(int((time.monotonic() - self._started) // self.window), {})
+        entry = bucket.setdefault(endpoint, {"completed": 0, "max_in_flight": 0})
+        entry["completed"] += completed
+        entry["max_in_flight"] = max(entry["max_in_flight"], stats.in_flight)
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """aiohttp hooks that record every request made through the session."""
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            ctx.endpoint = params.url.path
+            ctx.started = time.monotonic()
+            ctx.subscriber = _current_subscriber.get()
+            stats = self._endpoint(ctx.endpoint)
+            stats.in_flight += 1
+            stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+            self._tick(ctx.endpoint, stats)
+
+        async def on_request_chunk_sent(session, ctx, params):
+            self._endpoint(ctx.endpoint).bytes_out += len(params.chunk)
+
+        async def on_response_chunk_received(session, ctx, params):
+            self._endpoint(ctx.endpoint).bytes_in += len(params.chunk)
+
+        async def on_request_end(session, ctx, params):
+            # Fires when the response headers arrive; Next.js routes only send them once the work is done
+            self._finish(ctx, str(params.response.status), params.response.headers.get('Server-Timing'))
+
+        async def on_request_exception(session, ctx, params):
+            self._finish(ctx, type(params.exception).__name__, None)
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
+        trace_config.on_response_chunk_received.append(on_response_chunk_received)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        return trace_config
+
+    def _finish(self, ctx, status: str, server_timing: Optional[str]):
+        latency = time.monotonic() - ctx.started
+        stats = self._endpoint(ctx.endpoint)
+        stats.in_flight -= 1
+        stats.latency.observe(latency)
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        self._tick(ctx.endpoint, stats, completed=1)
+
+        upstream_times = parse_server_timing(server_timing)
+        for upstream, seconds in upstream_times.items():
+            self.upstreams.setdefault(upstream, LatencyHistogram()).observe(seconds)
+
+        if self.profile and ctx.subscriber is not None:
+            breakdown = self.subscribers.setdefault(str(ctx.subscriber), {"requests": 0, "endpoints": {}, "upstreams": {}})
+            breakdown["requests"] += 1
+            breakdown["endpoints"][ctx.endpoint] = breakdown["endpoints"].get(ctx.endpoint, 0.0) + latency
+            for upstream, seconds in upstream_times.items():
+                breakdown["upstreams"][upstream] = breakdown["upstreams"].get(upstream, 0.0) + seconds
+
+    async def start(self):
+        """Start event-loop lag sampling (profile mode only); call from inside the running loop."""
+        if self.profile and self._lag_task is None:
+            self._lag_task = asyncio.create_task(self._sample_loop_lag())
+
+    def finish(self):
+        """Freeze the run duration; the lag sampler is cancelled here or when the event loop shuts down."""
+        if self._finished is None:
+            self._finished = time.monotonic()
+        if self._lag_task:
+            self._lag_task.cancel()
+            self._lag_task = None
+
+    async def _sample_loop_lag(self):
+        while True:
+            scheduled = time.monotonic()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lag.observe(max(0.0, time.monotonic() - scheduled - LOOP_LAG_INTERVAL))
+
+    def duration(self) -> float:
+        return (self._finished or time.monotonic()) - self._started
+
+    def report(self) -> Dict:
+        duration = self.duration()
+        report = {
+            "script": self.script,
+            "started_at": self.started_at,
+            "duration_seconds": round(duration, 3),
+            "endpoints": {name: stats.summary() | {
+                "requests_per_second": round(stats.latency.summary()["count"] / duration, 3) if duration else 0.0
+            } for name, stats in self.endpoints.items()},
+            "upstreams": {name: histogram.summary() for name, histogram in self.upstreams.items()},
+            "throughput": [{
+                "t": index * self.window,
+                "requests_per_second": {name: round(entry["completed"] / self.window, 3) for name, entry in bucket.items()},
+                "max_in_flight": {name: entry["max_in_flight"] for name, entry in bucket.items()}
+            } for index, bucket in sorted(self.timeline.items())]
+        }
+        if self.profile:
+            report["event_loop_lag"] = self.loop_lag.summary()
+            report["subscribers"] = {
+                subscriber: {
+                    "requests": breakdown["requests"],
+                    "endpoints": {name: round(seconds, 4) for name, seconds in breakdown["endpoints"].items()},
+                    "upstreams": {name: round(seconds, 4) for name, seconds in breakdown["upstreams"].items()}
+                } for subscriber, breakdown in self.subscribers.items()
+            }
+        return report
+
+    def prometheus(self) -> str:
+        """The run in Prometheus text exposition format."""
+        script = self.script
+        lines = []
+
+        def histogram(metric: str, help_text: str, label: str, histograms: Dict[str, LatencyHistogram]):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for name, values in histograms.items():
+                labels = f'script="{script}",{label}="{name}"'
+                for bound, count in zip(LATENCY_BUCKETS, values.buckets()):
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {len(values.samples)}')
+                lines.append(f'{metric}_sum{{{labels}}} {sum(values.samples):.6f}')
+                lines.append(f'{metric}_count{{{labels}}} {len(values.samples)}')
+
+        histogram("batch_request_duration_seconds", "Outbound request latency by API endpoint.", "endpoint",
+                  {name: stats.latency for name, stats in self.endpoints.items()})
+        histogram("batch_upstream_duration_seconds", "Time spent in each upstream, from Server-Timing.", "upstream",
+                  self.upstreams)
+
+        lines.append("# HELP batch_requests_total Outbound requests by endpoint and status.")
+        lines.append("# TYPE batch_requests_total counter")
+        for name, stats in self.endpoints.items():
+            for status, count in stats.statuses.items():
+                lines.append(f'batch_requests_total{{script="{script}",endpoint="{name}",status="{status}"}} {count}')
+
+        lines.append("# HELP batch_request_bytes_total Request and response body bytes by endpoint.")
+        lines.append("# TYPE batch_request_bytes_total counter")
+        for name, stats in self.endpoints.items():
+            lines.append(f'batch_request_bytes_total{{script="{script}",endpoint="{name}",direction="out"}} {stats.bytes_out}')
+            lines.append(f'batch_request_bytes_total{{script="{script}",endpoint="{name}",direction="in"}} {stats.bytes_in}')
+
+        lines.append("# HELP batch_max_in_flight Peak concurrent requests by endpoint.")
+        lines.append("# TYPE batch_max_in_flight gauge")
+        for name, stats in self.endpoints.items():
+            lines.append(f'batch_max_in_flight{{script="{script}",endpoint="{name}"}} {stats.max_in_flight}')
+
+        if self.profile:
+            lines.append("# HELP batch_event_loop_lag_seconds Event-loop scheduling delay.")
+            lines.append("# TYPE batch_event_loop_lag_seconds summary")
+            for q in (0.5, 0.95, 0.99):
+                lines.append(f'batch_event_loop_lag_seconds{{script="{script}",quantile="{q}"}} {self.loop_lag.quantile(q):.6f}')
+            lines.append(f'batch_event_loop_lag_seconds_sum{{script="{script}"}} {sum(self.loop_lag.samples):.6f}')
+            lines.append(f'batch_event_loop_lag_seconds_count{{script="{script}"}} {len(self.loop_lag.samples)}')
+
+        lines.append("# HELP batch_run_duration_seconds Wall time of the run.")
+        lines.append("# TYPE batch_run_duration_seconds gauge")
+        lines.append(f'batch_run_duration_seconds{{script="{script}"}} {self.duration():.3f}')
+        lines.append("# HELP batch_run_start_timestamp_seconds Unix time the run started.")
+        lines.append("# TYPE batch_run_start_timestamp_seconds gauge")
+        lines.append(f'batch_run_start_timestamp_seconds{{script="{script}"}} {self.started_at:.0f}')
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, json_path: str, prom_path: Optional[str] = None):
+        """Write the JSON report and, if given, the Prometheus textfile (both atomically)."""
+        for path, content in ((json_path, json.dumps(self.report(), indent=2)), (prom_path, self.prometheus())):
+            if not path:
+                continue
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+    def print_summary(self):
+        if not self.endpoints:
+            return
+        print(f"⏱️ Request latency ({self.duration():.1f}s run):")
+        for name, stats in sorted(self.endpoints.items()):
+            summary = stats.latency.summary()
+            print(f"  - {name}: {summary['count']} requests, p50 {summary['p50']:.3f}s, p95 {summary['p95']:.3f}s, "
+                  f"p99 {summary['p99']:.3f}s, peak in-flight {stats.max_in_flight}, "
+                  f"{stats.bytes_out / 1024:.0f} KB out / {stats.bytes_in / 1024:.0f} KB in")
+        if self.upstreams:
+            print("  Upstream time (Server-Timing):")
+            for name, histogram in sorted(self.upstreams.items()):
+                summary = histogram.summary()
+                print(f"  - {name}: p50 {summary['p50']:.3f}s, p95 {summary['p95']:.3f}s, total {summary['sum']:.1f}s")
+        if self.profile:
+            lag = self.loop_lag.summary()
+            print(f"  Event-loop lag: p50 {lag['p50'] * 1000:.1f}ms, p99 {lag['p99'] * 1000:.1f}ms, max {lag['max'] * 1000:.1f}ms")
+
+
+def write_metrics_report(metrics: RunMetrics, journal, textfile: Optional[str] = None):
+    """Save the run report next to the run journal (<run-id>.metrics.json / .prom) and say where."""
+    metrics.finish()
+    base = journal.path[:-len('.jsonl')] if journal.path.endswith('.jsonl') else journal.path
+    json_path = f"{base}.metrics.json"
+    try:
+        metrics.write_report(json_path, textfile or f"{base}.prom")
+        print(f"📈 Run report: {json_path}")
+    except OSError as e:
+        print(f"⚠️ Failed to write run report: {e}")
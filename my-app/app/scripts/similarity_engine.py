@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Offline Similarity Engine
+=========================
+
+Exports `github_repository_embeddings` to local memory-mapped float32 matrices
+and computes every subscriber's top-k GitHub neighbours in one local job,
+instead of one Supabase similarity query per subscriber.
+
+Export layout (`--out-dir`, default `app/scripts/exports/embeddings`):
+    repositories.f32   L2-normalised repository vectors, one row per repository
+    repositories.json  {"dim": D, "rows": [[subscriber_id, repository_name], ...]}
+    subscribers.f32    L2-normalised mean of each subscriber's repository vectors
+    subscribers.json   {"dim": D, "ids": [...], "repository_counts": [...]}
+
+Neighbours are found with chunked matrix multiplies (cosine similarity on
+normalised rows), so memory stays bounded by `--chunk-mb` however many
+subscribers there are, and are written back in bulk to
+`subscriber_github_neighbours` through `/api/store_subscriber_neighbours`.
+
+Usage:
+    python app/scripts/similarity_engine.py export --service-key YOUR_SERVICE_KEY [--limit N]
+    python app/scripts/similarity_engine.py neighbours [--top-k 20] [--write-back --service-key YOUR_SERVICE_KEY] [--dry-run]
+    python app/scripts/similarity_engine.py query --subscriber-id 123 [--top-k 10]
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import aiohttp
+import numpy as np
+
+from batch_endpoint import iter_chunks
+from http_transport import create_session, read_json
+from retry_policy import RetryPolicy
+from subscriber_stream import DEFAULT_PAGE_SIZE, iter_subscriber_pages
+
+DEFAULT_EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports', 'embeddings')
+DEFAULT_TOP_K = 20
+DEFAULT_CHUNK_MB = 256
+# Subscribers per /api/get_repository_embeddings call (the route's maximum)
+EMBEDDING_LOOKUP_BATCH = 200
+# Rows per /api/store_subscriber_neighbours call (the route's maximum)
+WRITE_BACK_BATCH = 5000
+
+
+def parse_vector(value) -> Optional[np.ndarray]:
+    """pgvector columns arrive as JSON arrays or as '[0.1,0.2,...]' strings."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return None
+    if not isinstance(value, list) or not value:
+        return None
+    return np.asarray(value, dtype=np.float32)
+
+
+def parse_quantized_vector(codes: str, scale: float) -> Optional[np.ndarray]:
+    """Decode a row from /api/get_repository_embeddings?format=int8 (base64 int8 codes x scale)."""
+    try:
+        vector = np.frombuffer(base64.b64decode(codes), dtype=np.int8).astype(np.float32)
+    except (TypeError, ValueError):
+        return None
+    return vector * np.float32(scale) if vector.size else None
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalise rows in place; all-zero rows stay zero."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def _write_json(path: str, payload: Dict):
+    # Write-then-rename so a crashed export never leaves a half-written index next to good vectors
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+class EmbeddingExport:
+    """Memory-mapped view of an export directory."""
+
+    def __init__(self, directory: str, dim: int, repository_rows: List[List], subscriber_ids: List[int],
+                 repository_counts: List[int]):
+        self.directory = directory
+        self.dim = dim
+        self.repository_rows = repository_rows
+        self.subscriber_ids = subscriber_ids
+        self.repository_counts = repository_counts
+        self.subscriber_index = {subscriber_id: row for row, subscriber_id in enumerate(subscriber_ids)}
+        self.repository_vectors = self._memmap('repositories.f32', len(repository_rows))
+        self.subscriber_vectors = self._memmap('subscribers.f32', len(subscriber_ids))
+
+    def _memmap(self, filename: str, rows: int) -> np.ndarray:
+        if rows == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(os.path.join(self.directory, filename), dtype=np.float32, mode='r', shape=(rows, self.dim))
+
+    @classmethod
+    def load(cls, directory: str = DEFAULT_EXPORT_DIR) -> 'EmbeddingExport':
+        subscribers_path = os.path.join(directory, 'subscribers.json')
+        if not os.path.exists(subscribers_path):
+            raise FileNotFoundError(f"No embedding export found in {directory}; run the export command first")
+        with open(os.path.join(directory, 'repositories.json'), 'r', encoding='utf-8') as f:
+            repositories = json.load(f)
+        with open(subscribers_path, 'r', encoding='utf-8') as f:
+            subscribers = json.load(f)
+        return cls(directory, subscribers['dim'], repositories['rows'], subscribers['ids'],
+                   subscribers['repository_counts'])
+
+
+async def export_embeddings(base_url: str, service_role_key: str, out_dir: str = DEFAULT_EXPORT_DIR,
+                            page_size: int = DEFAULT_PAGE_SIZE, limit: Optional[int] = None,
+                            transfer: str = 'json') -> EmbeddingExport:
+    """Stream every subscriber's repository vectors from the API into the export files.
+
+    `transfer='int8'` asks the route for int8 codes and a scale per vector
+    instead of JSON float arrays, roughly 9x less to download at 1024 dims;
+    the vectors are rebuilt from the codes, so the export carries int8 precision.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    headers = {
+        "Content-Type": "application/json",
+        "authorization": f"Bearer {service_role_key}"
+    }
+    dim: Optional[int] = None
+    repository_rows: List[List] = []
+    subscriber_ids: List[int] = []
+    repository_counts: List[int] = []
+    skipped_vectors = 0
+
+    with open(os.path.join(out_dir, 'repositories.f32'), 'wb') as repo_file, \
+            open(os.path.join(out_dir, 'subscribers.f32'), 'wb') as subscriber_file:
+        async with create_session(1) as session:
+            subscribers = iter_subscriber_pages(session, f"{base_url}/api/get_subscribers_with_github", headers,
+                                                {"include_heavy": "false"}, page_size, limit)
+            async for batch in iter_chunks(subscribers, EMBEDDING_LOOKUP_BATCH):
+                params = {"subscriber_ids": ",".join(str(subscriber.get('id')) for subscriber in batch)}
+                if transfer == 'int8':
+                    params["format"] = "int8"
+                async with session.get(f"{base_url}/api/get_repository_embeddings",
+                                       params=params, headers=headers) as response:
+                    if response.status != 200:
+                        raise RuntimeError(f"Failed to fetch repository embeddings: HTTP {response.status}")
+                    rows = (await read_json(response)).get('embeddings', [])
+
+                # Rows come back ordered by subscriber_id, so each subscriber's repositories are contiguous
+                by_subscriber: Dict[int, List[np.ndarray]] = {}
+                for row in rows:
+                    vector = (parse_quantized_vector(row['embedding_q8'], row.get('scale', 0)) if 'embedding_q8' in row
+                              else parse_vector(row.get('embedding')))
+                    if vector is None or (dim is not None and vector.shape[0] != dim):
+                        skipped_vectors += 1
+                        continue
+                    dim = dim or vector.shape[0]
+                    by_subscriber.setdefault(row['subscriber_id'], []).append(vector)
+                    repository_rows.append([row['subscriber_id'], row['repository_name']])
+
+                for subscriber_id, vectors in by_subscriber.items():
+                    matrix = normalize_rows(np.vstack(vectors))
+                    repo_file.write(matrix.tobytes())
+                    subscriber_file.write(normalize_rows(matrix.mean(axis=0, keepdims=True)).tobytes())
+                    subscriber_ids.append(subscriber_id)
+                    repository_counts.append(len(vectors))
+
+                print(f"📦 Exported {len(repository_rows)} repositories for {len(subscriber_ids)} subscribers")
+
+    dim = dim or 0
+    _write_json(os.path.join(out_dir, 'repositories.json'), {"dim": dim, "rows": repository_rows})
+    _write_json(os.path.join(out_dir, 'subscribers.json'), {
+        "dim": dim,
+        "ids": subscriber_ids,
+        "repository_counts": repository_counts,
+        "exported_at": datetime.now().isoformat()
+    })
+    if skipped_vectors:
+        print(f"⚠️ Skipped {skipped_vectors} missing or mismatched vectors")
+    return EmbeddingExport.load(out_dir)
+
+
+def top_k(queries: np.ndarray, matrix: np.ndarray, k: int, chunk_mb: int = DEFAULT_CHUNK_MB,
+          exclude_rows: Optional[np.ndarray] = None) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """Exact cosine top-k of normalised `queries` against normalised `matrix`.
+
+    Queries are processed in chunks sized so the chunk x N similarity block
+    fits in `chunk_mb`. `exclude_rows[i]` is a matrix row query i must not
+    match (itself, for all-pairs). Yields (first query row, indices, scores)
+    per chunk, with each row's neighbours sorted best first.
+    """
+    total = matrix.shape[0]
+    k = min(k, total - (1 if exclude_rows is not None else 0))
+    if k <= 0 or queries.shape[0] == 0:
+        return
+    chunk_size = max(1, (chunk_mb * 1024 * 1024) // (4 * total))
+
+    for start in range(0, queries.shape[0], chunk_size):
+        block = np.asarray(queries[start:start + chunk_size], dtype=np.float32)
+        # Quantized stores (quantized_store.py) score straight from their int8/float16 codes
+        scores = matrix.scores(block) if hasattr(matrix, 'scores') else block @ np.asarray(matrix).T
+        if exclude_rows is not None:
+            scores[np.arange(block.shape[0]), exclude_rows[start:start + block.shape[0]]] = -np.inf
+        # argpartition is O(N) per row; only the k survivors get sorted
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1)
+        yield start, np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+
+def all_pairs_neighbours(export: EmbeddingExport, k: int = DEFAULT_TOP_K,
+                         chunk_mb: int = DEFAULT_CHUNK_MB, vectors=None) -> Iterator[Dict]:
+    """Yield neighbour rows ({subscriber_id, rank, neighbour_id, score}) for every subscriber.
+
+    `vectors` replaces the float32 subscriber matrix, e.g. with a quantized store.
+    """
+    vectors = export.subscriber_vectors if vectors is None else vectors
+    ids = np.asarray(export.subscriber_ids)
+    for start, indices, scores in top_k(vectors, vectors, k, chunk_mb, exclude_rows=np.arange(len(ids))):
+        for offset in range(indices.shape[0]):
+            subscriber_id = int(ids[start + offset])
+            for rank, (index, score) in enumerate(zip(indices[offset], scores[offset]), start=1):
+                yield {
+                    "subscriber_id": subscriber_id,
+                    "rank": rank,
+                    "neighbour_id": int(ids[index]),
+                    "score": round(float(score), 6)
+                }
+
+
+async def write_back(base_url: str, service_role_key: str, rows: Iterator[Dict],
+                     retry_policy: Optional[RetryPolicy] = None) -> int:
+    """POST neighbour rows to /api/store_subscriber_neighbours in bulk batches."""
+    retry_policy = retry_policy or RetryPolicy()
+    headers = {
+        "Content-Type": "application/json",
+        "authorization": f"Bearer {service_role_key}"
+    }
+    stored = 0
+
+    async def post(session: aiohttp.ClientSession, batch: List[Dict]) -> Dict:
+        try:
+            async with session.post(f"{base_url}/api/store_subscriber_neighbours",
+                                    json={"neighbours": batch}, headers=headers) as response:
+                if response.status == 200:
+                    return {"status": "success"}
+                return {"status": "error", "http_status": response.status,
+                        "retry_after": response.headers.get('Retry-After'), "error": await response.text()}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return {"status": "error", "network_error": True, "error": str(e)}
+
+    async def send(session: aiohttp.ClientSession, batch: List[Dict]):
+        nonlocal stored
+        attempt = 0
+        while True:
+            attempt += 1
+            result = await post(session, batch)
+            if result["status"] == "success":
+                stored += len(batch)
+                print(f"💾 Stored {stored} neighbour rows")
+                return
+            if not retry_policy.should_retry(result, attempt):
+                raise RuntimeError(f"Failed to store neighbours: {result.get('error')}")
+            delay = retry_policy.next_delay(attempt, result.get("retry_after"))
+            retry_policy.record_wait(delay)
+            await asyncio.sleep(delay)
+
+    async with create_session(1) as session:
+        batch: List[Dict] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= WRITE_BACK_BATCH:
+                await send(session, batch)
+                batch = []
+        if batch:
+            await send(session, batch)
+    return stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline GitHub embedding similarity over a local export")
+    parser.add_argument("--out-dir", default=DEFAULT_EXPORT_DIR, help="Directory for the exported matrices")
+    parser.add_argument("--base-url", default="http://localhost:3000", help="Base URL for API calls")
+    parser.add_argument("--service-key", help="Supabase service role key (export and --write-back)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export github_repository_embeddings to memory-mapped matrices")
+    export_parser.add_argument("--limit", type=int, help="Limit number of subscribers to export")
+    export_parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Subscribers per page")
+    export_parser.add_argument("--transfer", choices=["json", "int8"], default="json",
+                               help="Download vectors as JSON floats or as int8 codes (about 9x smaller at 1024 dims)")
+
+    neighbours_parser = subparsers.add_parser("neighbours", help="Compute every subscriber's top-k neighbours")
+    neighbours_parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K, help="Neighbours per subscriber")
+    neighbours_parser.add_argument("--chunk-mb", type=int, default=DEFAULT_CHUNK_MB, help="Memory budget for each similarity block")
+    neighbours_parser.add_argument("--write-back", action="store_true", help="Store neighbours in subscriber_github_neighbours")
+    neighbours_parser.add_argument("--dry-run", action="store_true", help="Compute neighbours and print a sample without storing")
+    neighbours_parser.add_argument("--quantized", choices=["int8", "float16"],
+                                   help="Score on the quantized store from quantized_store.py build instead of float32")
+
+    query_parser = subparsers.add_parser("query", help="Print one subscriber's nearest neighbours")
+    query_parser.add_argument("--subscriber-id", type=int, required=True, help="Subscriber to look up")
+    query_parser.add_argument("--top-k", type=int, default=10, help="Neighbours to print")
+
+    args = parser.parse_args()
+
+    if args.command == "export" or (args.command == "neighbours" and args.write_back and not args.dry_run):
+        if not args.service_key:
+            print("❌ --service-key is required for this command")
+            sys.exit(1)
+
+    try:
+        if args.command == "export":
+            started = time.monotonic()
+            export = asyncio.run(export_embeddings(args.base_url, args.service_key, args.out_dir,
+                                                   args.page_size, args.limit, args.transfer))
+            print(f"✅ Exported {len(export.repository_rows)} repositories / {len(export.subscriber_ids)} subscribers "
+                  f"(dim {export.dim}) to {args.out_dir} in {time.monotonic() - started:.1f}s")
+
+        elif args.command == "neighbours":
+            export = EmbeddingExport.load(args.out_dir)
+            print(f"📋 Loaded {len(export.subscriber_ids)} subscribers (dim {export.dim}) from {args.out_dir}")
+            vectors = None
+            if args.quantized:
+                # Imported here: quantized_store builds on this module
+                from quantized_store import load_store
+                vectors = load_store(export, 'subscribers', args.quantized)
+                print(f"🗜️ Scoring on {args.quantized} codes ({vectors.nbytes / 1e6:.1f} MB)")
+            started = time.monotonic()
+            rows = all_pairs_neighbours(export, args.top_k, args.chunk_mb, vectors)
+            if args.write_back and not args.dry_run:
+                stored = asyncio.run(write_back(args.base_url, args.service_key, rows))
+                print(f"✅ Stored {stored} neighbour rows in {time.monotonic() - started:.1f}s")
+            else:
+                count = 0
+                for row in rows:
+                    if count < args.top_k:
+                        print(f"  {row['subscriber_id']} #{row['rank']}: {row['neighbour_id']} ({row['score']:.4f})")
+                    count += 1
+                elapsed = time.monotonic() - started
+                if args.dry_run:
+                    print(f"🔍 [DRY RUN] Computed {count} neighbour rows in {elapsed:.1f}s")
+                else:
+                    print(f"🔍 Computed {count} neighbour rows in {elapsed:.1f}s (pass --write-back to store them)")
+
+        elif args.command == "query":
+            export = EmbeddingExport.load(args.out_dir)
+            row = export.subscriber_index.get(args.subscriber_id)
+            if row is None:
+                print(f"❌ Subscriber {args.subscriber_id} is not in the export")
+                sys.exit(1)
+            exclude = np.array([row])
+            for _, indices, scores in top_k(export.subscriber_vectors[row:row + 1], export.subscriber_vectors,
+                                            args.top_k, exclude_rows=exclude):
+                for rank, (index, score) in enumerate(zip(indices[0], scores[0]), start=1):
+                    print(f"{rank:>3}. subscriber {export.subscriber_ids[index]} ({score:.4f}, "
+                          f"{export.repository_counts[index]} repositories)")
+
+    except KeyboardInterrupt:
+        print("\n⚠️  Process interrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Unexpected error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
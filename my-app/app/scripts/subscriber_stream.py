@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Subscriber Streaming Helpers
+============================
+
+Shared helpers for the batch scripts to page through the subscribers table
+by `id` (keyset pagination) and feed a bounded work queue, so processing can
+start while later pages are still loading.
+
+The backing routes (`/api/get_subscribers_with_github` and
+`/api/get_subscribers_with_github_data`) accept:
+    after_id=<last id seen>   keyset cursor, results are ordered by id
+    page_size=<N>             rows per page
+    include_heavy=false       leave out the large JSON/vector columns
+    max_id=<N>                stop at this id (one id range per sharded worker)
+    order=desc                newest first (page_size=1 finds the last id)
+    sort=changed              order by (github_url_changed_at, id) instead of id,
+                              with changed_since=<timestamp> + after_id=<id> as the
+                              cursor (the change feed of `github_pipeline.py --follow`)
+and return `next_cursor` (null once the last page has been served).
+"""
+
+import asyncio
+import aiohttp
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from http_transport import read_json
+
+DEFAULT_PAGE_SIZE = 200
+
+
+async def iter_subscriber_pages(session: aiohttp.ClientSession, url: str, headers: Dict,
+                                params: Optional[Dict] = None, page_size: int = DEFAULT_PAGE_SIZE,
+                                limit: Optional[int] = None, after_id: Optional[int] = None) -> AsyncIterator[Dict]:
+    """Yield subscribers one at a time, fetching the next page by id cursor."""
+    fetched = 0
+    pages = 0
+
+    while True:
+        page_limit = page_size if limit is None else min(page_size, limit - fetched)
+        if page_limit <= 0:
+            break
+
+        page_params = dict(params or {})
+        page_params['page_size'] = page_limit
+        if after_id is not None:
+            page_params['after_id'] = after_id
+
+        async with session.get(url, params=page_params, headers=headers) as response:
+            if response.status != 200:
+                raise RuntimeError(f"Failed to fetch subscriber page after id {after_id}: HTTP {response.status}")
+            data = await read_json(response)
+
+        subscribers = data.get('subscribers', [])
+        pages += 1
+        print(f"📄 Page {pages}: fetched {len(subscribers)} subscribers (after id {after_id})")
+
+        for subscriber in subscribers:
+            fetched += 1
+            yield subscriber
+
+        after_id = data.get('next_cursor')
+        if after_id is None or not subscribers:
+            break
+
+
+async def fetch_last_subscriber_id(session: aiohttp.ClientSession, url: str, headers: Dict,
+                                   params: Optional[Dict] = None) -> int:
+    """Highest subscriber id the route would return (0 if none), for splitting work into id ranges."""
+    async with session.get(url, params={**(params or {}), 'page_size': 1, 'order': 'desc'}, headers=headers) as response:
+        if response.status != 200:
+            raise RuntimeError(f"Failed to fetch the last subscriber id: HTTP {response.status}")
+        subscribers = (await read_json(response)).get('subscribers', [])
+    return int(subscribers[0]['id']) if subscribers else 0
+
+
+async def fetch_changed_subscribers(session: aiohttp.ClientSession, url: str, headers: Dict,
+                                    params: Optional[Dict] = None, page_size: int = DEFAULT_PAGE_SIZE,
+                                    after: Optional[Tuple[str, int]] = None) -> List[Dict]:
+    """One page of subscribers changed after the (github_url_changed_at, id) key `after`, oldest first."""
+    page_params = {**(params or {}), 'sort': 'changed', 'page_size': page_size}
+    if after is not None:
+        page_params['changed_since'], page_params['after_id'] = after
+    async with session.get(url, params=page_params, headers=headers) as response:
+        if response.status != 200:
+            raise RuntimeError(f"Failed to fetch subscribers changed after {after}: HTTP {response.status}")
+        return (await read_json(response)).get('subscribers', [])
+
+
+async def fetch_latest_change(session: aiohttp.ClientSession, url: str, headers: Dict,
+                              params: Optional[Dict] = None) -> Optional[Tuple[str, int]]:
+    """(github_url_changed_at, id) of the most recent change, or None if no row has one."""
+    async with session.get(url, params={**(params or {}), 'sort': 'changed', 'order': 'desc', 'page_size': 1},
+                           headers=headers) as response:
+        if response.status != 200:
+            raise RuntimeError(f"Failed to fetch the latest subscriber change: HTTP {response.status}")
+        subscribers = (await read_json(response)).get('subscribers', [])
+    return (subscribers[0]['github_url_changed_at'], int(subscribers[0]['id'])) if subscribers else None
+
+
+async def run_bounded_queue(source: AsyncIterator[Dict], handler: Callable[[Dict], Awaitable[None]],
+                            max_concurrent: int = 5, queue_size: Optional[int] = None) -> int:
+    """Drain `source` through a bounded queue into `max_concurrent` workers.
+
+    The producer blocks once the queue is full, so memory stays bounded by
+    `queue_size` regardless of how many subscribers the table holds.
+    Returns the number of items handed to workers.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or max_concurrent * 2)
+    produced = 0
+
+    async def producer():
+        nonlocal produced
+        try:
+            async for item in source:
+                await queue.put(item)
+                produced += 1
+        finally:
+            for _ in range(max_concurrent):
+                await queue.put(None)
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            await handler(item)
+
+    await asyncio.gather(producer(), *[worker() for _ in range(max_concurrent)])
+    return produced
@@ -0,0 +1,26 @@
+"""Malformed queries and undated roster placement for course_ranking.py."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from course_ranking import QueryError, parse_query, semester_term_index  # noqa: E402
+
+
+@pytest.mark.parametrize("query", ['("STAT 110"', '"STAT 110" AND', '()'])
+def test_malformed_query_raises_query_error(query):
+    with pytest.raises(QueryError):
+        parse_query(query)
+
+
+def test_undated_roster_uses_given_term():
+    indexes = semester_term_index(["Fall 2024", "Fall", "Spring 2024"], {"Fall": "Fall 2023"})
+    assert list(indexes) == [2024 * 2 + 1, 2023 * 2 + 1, 2024 * 2]
+
+
+def test_undated_roster_without_term_is_refused():
+    with pytest.raises(KeyError):
+        semester_term_index(["Fall 2024", "Fall"])
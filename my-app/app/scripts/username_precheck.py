@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+GitHub Username Precheck
+========================
+
+Pre-processing stage that `batch_github_analysis.py --precheck` runs over each
+window of subscribers before any analysis:
+
+- normalizes the handle in every `github_url` (trailing `.git`, `@`, `#...`)
+  and drops handles GitHub would never accept as a login
+- groups subscribers who share a handle (case-insensitively); each handle is
+  analyzed once and the analysis is stored for every subscriber in the group
+- checks that the remaining handles exist with a single
+  `/api/check_github_usernames` call per window (GitHub GraphQL, 100 logins
+  per query) and drops deleted/renamed accounts up front; organization
+  accounts are analyzed like users unless `--skip-organizations` drops them too
+
+`--username-fixture PATH` replaces the API lookup with a local file of known
+logins, for tests and for runs against `mock_api_server.py` or a dev server
+without a GitHub App. A JSON file may be a list of logins or an object mapping
+login -> "User" | "Organization"; any other file is read as one login per line.
+
+Usage:
+    python app/scripts/username_precheck.py --fixture logins.txt https://github.com/octocat octocat/ @ghost
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from http_transport import read_json
+
+CHECK_ENDPOINT = "/api/check_github_usernames"
+# The route accepts up to 1000 logins per call
+LOOKUP_BATCH = 1000
+
+# 1-39 characters, alphanumerics and hyphens, no leading hyphen (older accounts may
+# still have double or trailing hyphens)
+GITHUB_LOGIN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9-]{0,38}$')
+
+
+def extract_github_username(github_url: str) -> Optional[str]:
+    """Extract username from GitHub URL"""
+    if not github_url:
+        return None
+        
+    # Clean up the URL and extract username
+    github_url = github_url.strip()
+    
+    # Handle various GitHub URL formats
+    patterns = [
+        r'https?://github\.com/([^/\?]+)',
+        r'github\.com/([^/\?]+)',
+        r'^([^/\?]+)$'  # Just username
+    ]
+    
+    for pattern in patterns:
+        match = re.search(pattern, github_url, re.IGNORECASE)
+        if match:
+            username = match.group(1).strip()
+            # Filter out common non-username paths
+            if username.lower() not in ['orgs', 'organizations', 'explore', 'settings', 'notifications']:
+                return username
+    
+    return None
+
+
+def normalize_github_username(username: Optional[str]) -> Optional[str]:
+    """Clean a handle taken from a GitHub URL; None if it cannot be a login."""
+    if not username:
+        return None
+    username = username.strip().split('#')[0].lstrip('@')
+    if username.lower().endswith('.git'):
+        username = username[:-4]
+    return username if GITHUB_LOGIN.match(username) else None
+
+
+def handle_key(username: str) -> str:
+    """GitHub logins are case-insensitive."""
+    return username.lower()
+
+
+class ApiUsernameLookup:
+    """Existence check through /api/check_github_usernames."""
+
+    def __init__(self, base_url: str, service_role_key: Optional[str] = None):
+        self.url = f"{base_url}{CHECK_ENDPOINT}"
+        self.headers = {"Content-Type": "application/json"}
+        if service_role_key:
+            self.headers['authorization'] = f'Bearer {service_role_key}'
+
+    async def lookup(self, session: aiohttp.ClientSession, usernames: List[str]) -> Dict[str, Optional[Dict]]:
+        """Map each handle key to {"login", "type"}, or None when no account has it."""
+        owners = {}
+        for start in range(0, len(usernames), LOOKUP_BATCH):
+            batch = usernames[start:start + LOOKUP_BATCH]
+            async with session.post(self.url, json={"usernames": batch}, headers=self.headers) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"username lookup failed: HTTP {response.status}")
+                users = (await read_json(response)).get('users') or {}
+            for username in batch:
+                owners[handle_key(username)] = users.get(username)
+        return owners
+
+
+class FixtureUsernameLookup:
+    """Existence check against a local file of known logins."""
+
+    def __init__(self, path: str):
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        if path.endswith('.json'):
+            known = json.loads(text)
+            if isinstance(known, list):
+                known = {login: "User" for login in known}
+        else:
+            known = {line.strip(): "User" for line in text.splitlines() if line.strip()}
+        self.owners = {handle_key(login): {"login": login, "type": owner_type} for login, owner_type in known.items()}
+
+    async def lookup(self, session: Optional[aiohttp.ClientSession], usernames: List[str]) -> Dict[str, Optional[Dict]]:
+        return {handle_key(username): self.owners.get(handle_key(username)) for username in usernames}
+
+
+@dataclass
+class PrecheckStats:
+    subscribers: int = 0  # subscribers that reached the precheck with a username
+    unique_handles: int = 0  # handles sent on to analysis
+    duplicates: int = 0  # subscribers folded into another subscriber's analysis
+    invalid: int = 0  # handles that cannot be GitHub logins
+    missing: int = 0  # no account with that login (deleted, renamed, typo)
+    organizations: int = 0  # organization accounts dropped with skip_organizations
+    lookups: int = 0  # existence checks sent (one per window)
+
+    @property
+    def calls_saved(self) -> int:
+        """Analysis calls the precheck made unnecessary."""
+        return self.duplicates + self.invalid + self.missing + self.organizations
+
+
+class UsernamePrecheck:
+    def __init__(self, lookup=None, skip_organizations: bool = False):
+        self.lookup = lookup  # None = dedupe only, no existence check
+        self.skip_organizations = skip_organizations  # off: organizations are analyzed like users
+        self.stats = PrecheckStats()
+
+    async def prepare(self, session: Optional[aiohttp.ClientSession], subscribers: List[Dict],
+                      usernames: List[str]) -> Tuple[List[Dict], List[Dict]]:
+        """Split a window into one leader per live handle and skipped results for the rest.
+
+        `usernames` holds the raw handle extracted from each subscriber's URL.
+        Leaders are copies carrying `_username` (canonical login when the lookup
+        knows it) and `_shared_with`, the other subscribers with that handle.
+        """
+        self.stats.subscribers += len(subscribers)
+        skipped = []
+        groups: Dict[str, List[Dict]] = {}
+        for subscriber, raw in zip(subscribers, usernames):
+            username = normalize_github_username(raw)
+            if not username:
+                self.stats.invalid += 1
+                skipped.append(self._skipped(subscriber, raw, "Not a valid GitHub username"))
+                continue
+            groups.setdefault(handle_key(username), []).append(dict(subscriber, _username=username))
+
+        owners = None
+        if self.lookup and groups:
+            try:
+                owners = await self.lookup.lookup(session, [group[0]['_username'] for group in groups.values()])
+                self.stats.lookups += 1
+            except Exception as e:
+                # Analysis finds dead accounts anyway; only the savings are lost
+                print(f"⚠️ Username lookup failed, analyzing this window unchecked: {e}")
+
+        leaders = []
+        for key, group in groups.items():
+            if owners is not None:
+                owner = owners.get(key)
+                reason = ("GitHub account not found" if owner is None
+                          else "GitHub organization, not a user"
+                          if self.skip_organizations and owner.get('type') == 'Organization' else None)
+                if reason:
+                    if owner is None:
+                        self.stats.missing += len(group)
+                    else:
+                        self.stats.organizations += len(group)
+                    skipped.extend(self._skipped(subscriber, subscriber['_username'], reason) for subscriber in group)
+                    continue
+                for subscriber in group:
+                    subscriber['_username'] = owner['login']
+
+            leader = group[0]
+            leader['_shared_with'] = group[1:]
+            self.stats.duplicates += len(group) - 1
+            self.stats.unique_handles += 1
+            leaders.append(leader)
+        return leaders, skipped
+
+    @staticmethod
+    def _skipped(subscriber: Dict, username: Optional[str], reason: str) -> Dict:
+        return {
+            "subscriber_id": subscriber.get('id'),
+            "status": "skipped",
+            "reason": reason,
+            "username": username,
+            "prechecked": True
+        }
+
+    def print_summary(self):
+        stats = self.stats
+        print(f"🧮 Username precheck: {stats.subscribers} subscribers -> {stats.unique_handles} unique handles")
+        print(f"   Duplicates folded: {stats.duplicates}, invalid: {stats.invalid}, not on GitHub: {stats.missing}"
+              f"{f', organizations: {stats.organizations}' if self.skip_organizations else ''}")
+        print(f"   Analysis calls saved: {stats.calls_saved}"
+              f"{f' ({stats.lookups} existence lookups)' if self.lookup else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how the username precheck groups and filters GitHub handles")
+    parser.add_argument("handles", nargs="+", help="GitHub URLs or usernames")
+    parser.add_argument("--fixture", help="File of known logins (JSON list/object or one per line)")
+    parser.add_argument("--skip-organizations", action="store_true", help="Drop organization accounts instead of analyzing them")
+    args = parser.parse_args()
+
+    try:
+        precheck = UsernamePrecheck(FixtureUsernameLookup(args.fixture) if args.fixture else None,
+                                    args.skip_organizations)
+        subscribers = [{"id": index + 1, "github_url": handle} for index, handle in enumerate(args.handles)]
+        usernames = [extract_github_username(handle) or handle for handle in args.handles]
+        leaders, skipped = asyncio.run(precheck.prepare(None, subscribers, usernames))
+        for leader in leaders:
+            shared = [subscriber['github_url'] for subscriber in leader['_shared_with']]
+            print(f"✅ {leader['_username']}: {leader['github_url']}{f' (shared with {shared})' if shared else ''}")
+        for result in skipped:
+            print(f"⏭️ {result['username']}: {result['reason']}")
+        precheck.print_summary()
+    except KeyboardInterrupt:
+        print("\n⚠️  Interrupted by user")
+    except Exception as e:
+        print(f"\n❌ Unexpected error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Sharded Work Leases
+===================
+
+Lets several batch workers (processes or hosts) split one run. Subscribers
+are divided into id ranges of `--range-size` ids. Range k covers ids
+(k * size, (k + 1) * size] and is fetched with `after_id` / `max_id`.
+
+Two ways to divide the ranges:
+- `--shard i/N`: static. Worker i takes ranges i, i + N, i + 2N, ...
+  No coordination is needed, but a crashed worker's ranges stay undone
+  until that shard is run again.
+- `--leases PATH|api`: coordinated.
+  - Workers claim the lowest free range through a lease that expires
+    after `--lease-seconds`. A background heartbeat renews the leases of
+    ranges still in progress.
+  - A range is marked done only once every subscriber in it has been
+    recorded.
+  - If a worker crashes, its leases expire and the next worker to ask
+    claims those ranges again. The partly-finished range restarts from
+    its first id; writes are idempotent.
+  - Leases live in a local SQLite file (workers on one host or a shared
+    disk) or in the `batch_work_leases` Postgres table behind
+    `/api/batch_work_leases` (see `add_batch_work_leases.sql`).
+
+Each worker keeps its own limiter, journal and metrics, so throughput grows
+with the worker count until the upstream rate limits are reached.
+
+Usage:
+    python app/scripts/batch_github_embeddings.py --service-key KEY --shard 0/4
+    python app/scripts/batch_github_embeddings.py --service-key KEY --leases runs/leases.sqlite3 --lease-run nightly
+    python app/scripts/work_leases.py status --leases runs/leases.sqlite3 --lease-run nightly
+    python app/scripts/work_leases.py reset --leases api --lease-run nightly --service-key KEY
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sqlite3
+import sys
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+import aiohttp
+
+from http_transport import create_session, read_json
+
+DEFAULT_RANGE_SIZE = 1000
+DEFAULT_LEASE_SECONDS = 300
+LEASE_API = "api"
+PENDING, LEASED, DONE = "pending", "leased", "done"
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """'i/N' -> (i, N) with 0 <= i < N."""
+    index, _, count = value.partition('/')
+    try:
+        shard = (int(index), int(count))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like i/N, got {value!r}")
+    if shard[1] < 1 or not 0 <= shard[0] < shard[1]:
+        raise argparse.ArgumentTypeError(f"Shard index must be in 0..N-1, got {value!r}")
+    return shard
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def worker_journal_name(script: str, shard: Optional[Tuple[int, int]], leases: Optional[str]) -> str:
+    """Journal/run-id prefix that keeps workers started in the same second apart."""
+    if shard:
+        return f"{script}-shard{shard[0]}of{shard[1]}"
+    if leases:
+        return f"{script}-{default_worker_id()}"
+    return script
+
+
+class SqliteLeaseStore:
+    """Leases in a local SQLite file; claims are serialised by an immediate transaction."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                run TEXT NOT NULL,
+                range_index INTEGER NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                expires_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL,
+                PRIMARY KEY (run, range_index)
+            )
+        """)
+
+    async def plan(self, run: str, range_count: int):
+        """Create any ranges that don't exist yet; existing ones keep their state."""
+        self._db.execute("BEGIN IMMEDIATE")
+        self._db.executemany("INSERT OR IGNORE INTO leases (run, range_index) VALUES (?, ?)",
+                             ((run, index) for index in range(range_count)))
+        self._db.execute("COMMIT")
+
+    async def claim(self, run: str, worker: str, lease_seconds: float) -> Optional[int]:
+        """Lease the lowest pending or expired range, or None if there is none."""
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute("""
+                SELECT range_index FROM leases
+                WHERE run = ? AND (state = 'pending' OR (state = 'leased' AND expires_at < ?))
+                ORDER BY range_index LIMIT 1
+            """, (run, now)).fetchone()
+            if row:
+                self._db.execute("""
+                    UPDATE leases SET state = 'leased', worker = ?, expires_at = ?, attempts = attempts + 1, updated_at = ?
+                    WHERE run = ? AND range_index = ?
+                """, (worker, now + lease_seconds, now, run, row[0]))
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return row[0] if row else None
+
+    def _update_held(self, run: str, index: int, worker: str, assignments: str, values: Tuple) -> bool:
+        cursor = self._db.execute(f"""
+            UPDATE leases SET {assignments}, updated_at = ?
+            WHERE run = ? AND range_index = ? AND worker = ? AND state = 'leased'
+        """, (*values, time.time(), run, index, worker))
+        return cursor.rowcount == 1
+
+    async def renew(self, run: str, index: int, worker: str, lease_seconds: float) -> bool:
+        """Extend a lease; False if it expired and another worker took the range."""
+        return self._update_held(run, index, worker, "expires_at = ?", (time.time() + lease_seconds,))
+
+    async def complete(self, run: str, index: int, worker: str) -> bool:
+        return self._update_held(run, index, worker, "state = 'done', expires_at = NULL", ())
+
+    async def release(self, run: str, index: int, worker: str) -> bool:
+        """Hand an unfinished range back to the pool right away instead of waiting for expiry."""
+        return self._update_held(run, index, worker, "state = 'pending', worker = NULL, expires_at = NULL", ())
+
+    async def status(self, run: str) -> Dict:
+        now = time.time()
+        status = {PENDING: 0, LEASED: 0, "expired": 0, DONE: 0, "workers": {}}
+        for state, worker, expires_at in self._db.execute(
+                "SELECT state, worker, expires_at FROM leases WHERE run = ?", (run,)):
+            if state == LEASED and expires_at < now:
+                status["expired"] += 1
+            else:
+                status[state] += 1
+                if state == LEASED:
+                    status["workers"][worker] = status["workers"].get(worker, 0) + 1
+        return status
+
+    async def reset(self, run: str) -> int:
+        return self._db.execute("DELETE FROM leases WHERE run = ?", (run,)).rowcount
+
+    async def close(self):
+        self._db.close()
+
+
+class ApiLeaseStore:
+    """Leases in the batch_work_leases Postgres table, via /api/batch_work_leases."""
+
+    def __init__(self, base_url: str, service_role_key: str):
+        self.url = f"{base_url}/api/batch_work_leases"
+        self.headers = {"Content-Type": "application/json", "authorization": f"Bearer {service_role_key}"}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _call(self, action: str, **fields) -> Dict:
+        if self._session is None:
+            self._session = create_session(1)
+        async with self._session.post(self.url, json={"action": action, **fields}, headers=self.headers) as response:
+            result = await read_json(response)
+            if response.status != 200:
+                raise RuntimeError(f"Lease {action} failed: HTTP {response.status} {result.get('error', '')}")
+            return result
+
+    async def plan(self, run: str, range_count: int):
+        await self._call("plan", run=run, range_count=range_count)
+
+    async def claim(self, run: str, worker: str, lease_seconds: float) -> Optional[int]:
+        return (await self._call("claim", run=run, worker=worker, lease_seconds=lease_seconds)).get("range_index")
+
+    async def renew(self, run: str, index: int, worker: str, lease_seconds: float) -> bool:
+        result = await self._call("renew", run=run, range_index=index, worker=worker, lease_seconds=lease_seconds)
+        return result.get("held", False)
+
+    async def complete(self, run: str, index: int, worker: str) -> bool:
+        return (await self._call("complete", run=run, range_index=index, worker=worker)).get("held", False)
+
+    async def release(self, run: str, index: int, worker: str) -> bool:
+        return (await self._call("release", run=run, range_index=index, worker=worker)).get("held", False)
+
+    async def status(self, run: str) -> Dict:
+        return (await self._call("status", run=run))["status"]
+
+    async def reset(self, run: str) -> int:
+        return (await self._call("reset", run=run)).get("deleted", 0)
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+
+def open_lease_store(leases: str, base_url: str, service_role_key: Optional[str]):
+    """`api` for the Postgres table behind the Next.js app, anything else is a SQLite path."""
+    if leases == LEASE_API:
+        if not service_role_key:
+            raise ValueError("--leases api needs --service-key")
+        return ApiLeaseStore(base_url, service_role_key)
+    return SqliteLeaseStore(leases)
+
+
+class RangeWorker:
+    """Claims id ranges (statically or by lease), streams their subscribers and reports finished ranges."""
+
+    def __init__(self, range_size: int = DEFAULT_RANGE_SIZE, shard: Optional[Tuple[int, int]] = None,
+                 store=None, run: Optional[str] = None, worker_id: Optional[str] = None,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        if (shard is None) == (store is None):
+            raise ValueError("RangeWorker needs exactly one of shard or store")
+        self.range_size = range_size
+        self.shard = shard
+        self.store = store
+        self.run = run
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.outstanding: Dict[int, int] = {}  # range -> subscribers handed out but not yet recorded
+        self.fetched: Set[int] = set()  # held ranges whose pages have all been read
+        self.held: Set[int] = set()
+        self.finished: List[int] = []  # ranges ready to be marked done in the store
+        self.completed_count = 0
+        self.reclaimed_count = 0
+        self.lost_count = 0
+        self._heartbeat: Optional[asyncio.Task] = None
+        # The heartbeat and the claim loop both flush; one at a time, so each range is completed once
+        self._flush_lock = asyncio.Lock()
+
+    def describe(self) -> str:
+        if self.shard:
+            return f"shard {self.shard[0]}/{self.shard[1]}, {self.range_size} ids per range"
+        return (f"lease run '{self.run}' as {self.worker_id}, {self.range_size} ids per range, "
+                f"{self.lease_seconds:.0f}s leases")
+
+    def range_of(self, subscriber_id) -> int:
+        return (int(subscriber_id) - 1) // self.range_size
+
+    def done(self, subscriber_id):
+        """A subscriber's outcome was recorded; finishes its range once nothing in it is outstanding."""
+        index = self.range_of(subscriber_id)
+        if index not in self.outstanding:
+            return
+        self.outstanding[index] -= 1
+        self._maybe_finish(index)
+
+    def _maybe_finish(self, index: int):
+        if index in self.fetched and self.outstanding.get(index) == 0:
+            del self.outstanding[index]
+            self.fetched.discard(index)
+            self.finished.append(index)
+
+    async def _flush(self):
+        async with self._flush_lock:
+            while self.finished:
+                index = self.finished[0]
+                if self.store and not await self.store.complete(self.run, index, self.worker_id):
+                    self.lost_count += 1
+                    print(f"⚠️ Range {index} finished after its lease expired; another worker may have redone it")
+                # Only once the store has it: if complete() raised, the range stays finished and held,
+                # so the heartbeat keeps renewing it and the next flush retries
+                self.finished.remove(index)
+                self.held.discard(index)
+                self.completed_count += 1
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self._flush()
+                for index in list(self.held):
+                    if not await self.store.renew(self.run, index, self.worker_id, self.lease_seconds):
+                        self.held.discard(index)
+                        print(f"⚠️ Lost the lease on range {index}; finishing its in-flight subscribers anyway")
+            except Exception as e:
+                # A missed renewal only risks duplicate work; keep processing
+                print(f"⚠️ Lease heartbeat failed: {e}")
+
+    async def _claim(self, range_count: int, next_static: List[int]) -> Optional[int]:
+        if self.shard:
+            index = next_static[0]
+            next_static[0] += self.shard[1]
+            return index if index < range_count else None
+
+        poll = min(self.lease_seconds / 3, 10)
+        while True:
+            await self._flush()
+            index = await self.store.claim(self.run, self.worker_id, self.lease_seconds)
+            if index is not None:
+                return index
+            # Wait on ranges other workers still hold: if one of them crashes, its lease expires here
+            status = await self.store.status(self.run)
+            if not any(count for worker, count in status["workers"].items() if worker != self.worker_id) \
+                    and not status["expired"]:
+                return None
+            await asyncio.sleep(poll)
+
+    async def subscribers(self, fetch_range: Callable[[int, int], AsyncIterator[Dict]],
+                          last_id: int) -> AsyncIterator[Dict]:
+        """Yield the subscribers of every range this worker claims, in id order within a range."""
+        range_count = (last_id + self.range_size - 1) // self.range_size
+        next_static = [self.shard[0]] if self.shard else []
+        if self.store:
+            await self.store.plan(self.run, range_count)
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+        while True:
+            index = await self._claim(range_count, next_static)
+            if index is None:
+                break
+            self.held.add(index)
+            self.outstanding[index] = 0
+            print(f"🧩 Range {index}: ids {index * self.range_size + 1}..{(index + 1) * self.range_size}")
+            async for subscriber in fetch_range(index * self.range_size, (index + 1) * self.range_size):
+                self.outstanding[index] += 1
+                yield subscriber
+            self.fetched.add(index)
+            self._maybe_finish(index)
+
+    async def __aenter__(self) -> 'RangeWorker':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Mark finished ranges done and hand unfinished ones back (e.g. after Ctrl+C)."""
+        if self._heartbeat:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        if not self.store:
+            await self._flush()
+            return
+        try:
+            await self._flush()
+            for index in list(self.held):
+                await self.store.release(self.run, index, self.worker_id)
+                print(f"↩️ Released unfinished range {index}")
+            self.held.clear()
+        finally:
+            await self.store.close()
+
+    def print_summary(self):
+        print(f"🧩 Work ranges ({self.describe()}): {self.completed_count} completed by this worker"
+              f"{f', {self.lost_count} lease(s) lost' if self.lost_count else ''}")
+
+
+def create_range_worker(shard: Optional[Tuple[int, int]], leases: Optional[str], lease_run: str,
+                        range_size: int, lease_seconds: float, base_url: str,
+                        service_role_key: Optional[str]) -> Optional[RangeWorker]:
+    """The RangeWorker for a script's --shard/--leases flags, or None for a single-worker run."""
+    if shard:
+        return RangeWorker(range_size, shard=shard)
+    if leases:
+        return RangeWorker(range_size, store=open_lease_store(leases, base_url, service_role_key),
+                           run=lease_run, lease_seconds=lease_seconds)
+    return None
+
+
+async def _run_command(args) -> int:
+    store = open_lease_store(args.leases, args.base_url, args.service_key)
+    try:
+        if args.command == "status":
+            status = await store.status(args.lease_run)
+            total = sum(status[state] for state in (PENDING, LEASED, "expired", DONE))
+            print(f"🧩 Run '{args.lease_run}': {total} ranges")
+            print(f"   ✅ done {status[DONE]}, 🔒 leased {status[LEASED]}, ⌛ expired {status['expired']}, "
+                  f"⏳ pending {status[PENDING]}")
+            for worker, count in sorted(status["workers"].items()):
+                print(f"   - {worker}: {count} range(s)")
+        else:
+            print(f"🧹 Deleted {await store.reset(args.lease_run)} range(s) of run '{args.lease_run}'")
+        return 0
+    finally:
+        await store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or reset coordinated batch runs")
+    parser.add_argument("command", choices=["status", "reset"])
+    parser.add_argument("--leases", required=True, help=f"SQLite lease file, or '{LEASE_API}' for the Postgres table")
+    parser.add_argument("--lease-run", required=True, help="Name the workers were started with")
+    parser.add_argument("--base-url", default="http://localhost:3000", help="Base URL for API calls (--leases api)")
+    parser.add_argument("--service-key", help="Supabase service role key (--leases api)")
+    args = parser.parse_args()
+
+    try:
+        sys.exit(asyncio.run(_run_command(args)))
+    except KeyboardInterrupt:
+        print("\n⚠️  Interrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Unexpected error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()